@@ -2,10 +2,13 @@
 Run on target machine (same folder as executable or source) with:
     python ai_diagnostic.py
 Outputs detailed status and exits 0 on success, non-zero on failure.
+
+Performance mode measures this machine and writes tuned settings into config.json:
+    python ai_diagnostic.py --perf [--config config.json] [--dry-run] [--quick]
 """
 import sys, os, time, traceback
-
-RESULT = 1
+import argparse, gc, json, statistics, tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 def log(msg):
     print(f"[DIAG] {msg}")
@@ -38,81 +41,304 @@ def find_model_files():
         log("No model files found in standard cache locations")
     return found_models
 
-try:
-    log(f"Python: {sys.version.split()[0]} ({sys.executable})")
-    log(f"Platform: {sys.platform}")
-    log(f"Working directory: {os.getcwd()}")
+def run_checks() -> int:
+    """Import, session and tiny-image checks; returns the process exit code."""
+    try:
+        log(f"Python: {sys.version.split()[0]} ({sys.executable})")
+        log(f"Platform: {sys.platform}")
+        log(f"Working directory: {os.getcwd()}")
     
-    # Check for model files before importing
-    log("Searching for existing model files...")
-    find_model_files()
+        # Check for model files before importing
+        log("Searching for existing model files...")
+        find_model_files()
     
-    start = time.time()
-    try:
-        import onnxruntime as ort
-        log(f"onnxruntime version: {ort.__version__}")
-        log(f"onnxruntime providers: {ort.get_available_providers()}")
-    except Exception as e:
-        log(f"onnxruntime import failed: {e}")
-        if "DLL load failed" in str(e):
-            log("This likely indicates missing Visual C++ Redistributable")
-            log("Install from: https://aka.ms/vs/17/release/vc_redist.x64.exe")
-        raise
+        start = time.time()
+        try:
+            import onnxruntime as ort
+            log(f"onnxruntime version: {ort.__version__}")
+            log(f"onnxruntime providers: {ort.get_available_providers()}")
+        except Exception as e:
+            log(f"onnxruntime import failed: {e}")
+            if "DLL load failed" in str(e):
+                log("This likely indicates missing Visual C++ Redistributable")
+                log("Install from: https://aka.ms/vs/17/release/vc_redist.x64.exe")
+            raise
 
-    try:
-        import rembg
-        log(f"rembg version: {getattr(rembg, '__version__', 'unknown')}")
-        log(f"rembg location: {rembg.__file__}")
-    except Exception as e:
-        log(f"rembg import failed: {e}")
-        raise
+        try:
+            import rembg
+            log(f"rembg version: {getattr(rembg, '__version__', 'unknown')}")
+            log(f"rembg location: {rembg.__file__}")
+        except Exception as e:
+            log(f"rembg import failed: {e}")
+            raise
 
-    # Attempt session creation (this may download model)
-    try:
-        log("Creating rembg session (u2net)... This may download ~175MB model on first run")
-        session_start = time.time()
-        session = rembg.new_session('u2net')
-        session_time = time.time() - session_start
-        log(f"Session created in {session_time:.1f}s")
+        # Attempt session creation (this may download model)
+        try:
+            log("Creating rembg session (u2net)... This may download ~175MB model on first run")
+            session_start = time.time()
+            session = rembg.new_session('u2net')
+            session_time = time.time() - session_start
+            log(f"Session created in {session_time:.1f}s")
         
-        # Check for model files after session creation
-        log("Model files after session creation:")
-        find_model_files()
+            # Check for model files after session creation
+            log("Model files after session creation:")
+            find_model_files()
         
-    except Exception as e:
-        log(f"Session creation failed: {e}\n{traceback.format_exc()}")
-        if "HTTP" in str(e) or "download" in str(e).lower() or "network" in str(e).lower():
-            log("This appears to be a network/download issue")
-            log("The model may need to be bundled with the application for offline use")
-        raise
+        except Exception as e:
+            log(f"Session creation failed: {e}\n{traceback.format_exc()}")
+            if "HTTP" in str(e) or "download" in str(e).lower() or "network" in str(e).lower():
+                log("This appears to be a network/download issue")
+                log("The model may need to be bundled with the application for offline use")
+            raise
+
+        # Minimal test image (4x4 opaque PNG)
+        from io import BytesIO
+        from PIL import Image
+        test_img = Image.new('RGBA', (4, 4), (255, 0, 0, 255))
+        buf = BytesIO()
+        test_img.save(buf, format='PNG')
+        data = buf.getvalue()
+        buf.close()
+
+        try:
+            log("Running background removal on tiny test image...")
+            removal_start = time.time()
+            out_bytes = rembg.remove(data, session=session)
+            removal_time = time.time() - removal_start
+        
+            if not out_bytes:
+                raise RuntimeError("No output bytes returned")
+            out_img = Image.open(BytesIO(out_bytes))
+            log(f"Output mode: {out_img.mode}, size: {out_img.size} (took {removal_time:.1f}s)")
+        except Exception as e:
+            log(f"Removal failed: {e}\n{traceback.format_exc()}")
+            raise
 
-    # Minimal test image (4x4 opaque PNG)
+        elapsed = time.time() - start
+        log(f"All diagnostics passed in {elapsed:.1f}s")
+        return 0
+    except Exception:
+        log("DIAGNOSTIC FAILED")
+        return 1
+
+# --- Performance mode -------------------------------------------------------
+
+PERF_SIZES = (256, 512, 1024, 2048)
+MAX_AI_STREAMS = 4  # Each concurrent stream holds its own ~175MB model copy
+CLOSE_ENOUGH = 0.05  # Prefer fewer workers/threads unless more is >5% faster
+
+def _synthetic_image(width, height, alpha=False):
+    """Photo-like test image: smooth gradients plus a subject with hard edges."""
+    from PIL import Image, ImageDraw
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.ROTATE_90).resize((width, height)),
+                              Image.new('L', (width, height), 140)))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((width // 4, height // 5, width * 3 // 4, height * 4 // 5), fill=(190, 60, 40))
+    if alpha:
+        img = img.convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize((width, height)))
+    return img
+
+def _encoded(img, fmt):
     from io import BytesIO
-    from PIL import Image
-    test_img = Image.new('RGBA', (4, 4), (255, 0, 0, 255))
     buf = BytesIO()
-    test_img.save(buf, format='PNG')
-    data = buf.getvalue()
-    buf.close()
+    img.save(buf, format=fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    return buf.getvalue()
+
+def _median_seconds(func, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
 
+def _throughput(func, items, workers):
+    """Items per second running func over items on `workers` threads."""
+    t0 = time.perf_counter()
+    if workers <= 1:
+        for item in items:
+            func(item)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(func, items))
+    return len(items) / (time.perf_counter() - t0)
+
+def _pick(results):
+    """Smallest key whose value is within CLOSE_ENOUGH of the best (higher is better)."""
+    best = max(results.values())
+    return min(k for k, v in results.items() if v >= best * (1 - CLOSE_ENOUGH))
+
+def _thread_candidates(cpus):
+    return sorted({n for n in (1, 2, 4, cpus // 2, cpus) if 1 <= n <= cpus})
+
+def measure_non_ai(config, quick):
+    """Decode/resize/encode throughput without AI, by worker count."""
+    from dataclasses import replace
+    from conversion_pipeline import ConversionSettings, convert_bytes
+    settings = replace(ConversionSettings.from_config(config), remove_background=False)
+    samples = [_encoded(_synthetic_image(3000, 2000), 'JPEG'),
+               _encoded(_synthetic_image(1200, 1200, alpha=True), 'PNG')]
+    latency_ms = {}
+    for data, label in zip(samples, ('jpeg_3000x2000', 'png_rgba_1200x1200')):
+        latency_ms[label] = round(_median_seconds(lambda: convert_bytes(data, settings), 2 if quick else 3) * 1000, 1)
+        log(f"Non-AI {label}: {latency_ms[label]:.0f} ms per image ({settings.output_format})")
+
+    cpus = os.cpu_count() or 1
+    per_worker = 2 if quick else 4
+    throughput = {}
+    for workers in _thread_candidates(cpus):
+        items = samples * (workers * per_worker // len(samples) + 1)
+        throughput[workers] = round(_throughput(lambda d: convert_bytes(d, settings), items, workers), 2)
+        log(f"Non-AI throughput with {workers} worker(s): {throughput[workers]:.1f} images/s")
+    return {"latency_ms": latency_ms, "throughput": throughput, "recommended_workers": _pick(throughput)}
+
+def _new_session(rembg, threads, provider=None):
+    os.environ["OMP_NUM_THREADS"] = str(threads)  # rembg reads this when the session is created
+    if provider:
+        return rembg.new_session('u2net', providers=[provider])
+    return rembg.new_session('u2net')
+
+def measure_ai(quick):
+    """Session creation, warm latency by size, thread count, stream count and provider."""
     try:
-        log("Running background removal on tiny test image...")
-        removal_start = time.time()
-        out_bytes = rembg.remove(data, session=session)
-        removal_time = time.time() - removal_start
-        
-        if not out_bytes:
-            raise RuntimeError("No output bytes returned")
-        out_img = Image.open(BytesIO(out_bytes))
-        log(f"Output mode: {out_img.mode}, size: {out_img.size} (took {removal_time:.1f}s)")
+        import onnxruntime as ort
+        import rembg
     except Exception as e:
-        log(f"Removal failed: {e}\n{traceback.format_exc()}")
-        raise
-
-    elapsed = time.time() - start
-    log(f"All diagnostics passed in {elapsed:.1f}s")
-    RESULT = 0
-except Exception:
-    log("DIAGNOSTIC FAILED")
-finally:
-    sys.exit(RESULT)
+        log(f"AI stack unavailable ({e}); skipping AI measurements")
+        return None
+
+    cpus = os.cpu_count() or 1
+    repeats = 2 if quick else 3
+    sample = _encoded(_synthetic_image(1024, 1024), 'PNG')
+    original_threads = os.environ.get("OMP_NUM_THREADS")
+    report = {"session_create_s": {}, "latency_ms_1024": {}, "throughput": {}, "providers": {}}
+    try:
+        # Thread count: single-stream latency, then as many streams as the cores allow
+        for threads in _thread_candidates(cpus):
+            t0 = time.perf_counter()
+            session = _new_session(rembg, threads)
+            report["session_create_s"][threads] = round(time.perf_counter() - t0, 2)
+            rembg.remove(sample, session=session)  # Warm-up
+            latency = _median_seconds(lambda: rembg.remove(sample, session=session), repeats)
+            report["latency_ms_1024"][threads] = round(latency * 1000, 1)
+            log(f"AI threads={threads}: session {report['session_create_s'][threads]:.1f}s, "
+                f"warm latency {latency * 1000:.0f} ms @1024px")
+
+            streams = max(1, min(MAX_AI_STREAMS, cpus // threads))
+            sessions = [session] + [_new_session(rembg, threads) for _ in range(streams - 1)]
+            for extra in sessions[1:]:
+                rembg.remove(sample, session=extra)
+            jobs = [(sessions[i % streams], sample) for i in range(streams * repeats)]
+            ips = _throughput(lambda job: rembg.remove(job[1], session=job[0]), jobs, streams)
+            report["throughput"][f"{streams}x{threads}"] = round(ips, 3)
+            log(f"AI {streams} stream(s) x {threads} thread(s): {ips:.2f} images/s")
+            del sessions, session
+            gc.collect()
+
+        best_combo = max(report["throughput"], key=report["throughput"].get)
+        best_streams, best_threads = (int(v) for v in best_combo.split("x"))
+
+        # Latency by input size with the chosen thread count
+        session = _new_session(rembg, best_threads)
+        rembg.remove(sample, session=session)
+        report["latency_ms_by_size"] = {}
+        for size in (PERF_SIZES[:3] if quick else PERF_SIZES):
+            data = _encoded(_synthetic_image(size, size), 'PNG')
+            report["latency_ms_by_size"][size] = round(
+                _median_seconds(lambda: rembg.remove(data, session=session), repeats) * 1000, 1)
+            log(f"AI latency @{size}px: {report['latency_ms_by_size'][size]:.0f} ms")
+        del session
+        gc.collect()
+
+        # Execution providers (GPU/DirectML where installed)
+        available = ort.get_available_providers()
+        log(f"onnxruntime providers: {available}")
+        for provider in available:
+            if provider in ("TensorrtExecutionProvider",):
+                continue  # Engine build takes minutes; not worth it for a diagnostic
+            try:
+                session = _new_session(rembg, best_threads, provider)
+                rembg.remove(sample, session=session)
+                latency = _median_seconds(lambda: rembg.remove(sample, session=session), repeats)
+                report["providers"][provider] = round(latency * 1000, 1)
+                log(f"Provider {provider}: {latency * 1000:.0f} ms @1024px")
+                del session
+                gc.collect()
+            except Exception as e:
+                log(f"Provider {provider} failed: {e}")
+    finally:
+        if original_threads is None:
+            os.environ.pop("OMP_NUM_THREADS", None)
+        else:
+            os.environ["OMP_NUM_THREADS"] = original_threads
+
+    providers = None
+    if report["providers"]:
+        fastest = min(report["providers"], key=report["providers"].get)
+        if fastest != "CPUExecutionProvider":
+            providers = [fastest, "CPUExecutionProvider"]
+    report["recommended"] = {"ai_workers": best_streams, "ai_threads": best_threads, "ai_providers": providers}
+    return report
+
+def write_config(config_path, updates):
+    """Merge updates into config.json, keeping every other key (atomic replace)."""
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    config.update(updates)
+    directory = os.path.dirname(os.path.abspath(config_path))
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(config, f, indent=4)
+    os.replace(temp_path, config_path)
+
+def run_perf(config_path, dry_run=False, quick=False):
+    log(f"Performance mode on {os.cpu_count()} CPU(s), {sys.platform}")
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    non_ai = measure_non_ai(config, quick)
+    ai = measure_ai(quick)
+
+    updates = {"workers": non_ai["recommended_workers"]}
+    if ai is not None:
+        updates.update(ai["recommended"])
+    updates["perf_profile"] = {
+        "measured_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "cpu_count": os.cpu_count(),
+        "platform": sys.platform,
+        "non_ai": non_ai,
+        "ai": ai,
+    }
+    for key in ("workers", "ai_workers", "ai_threads", "ai_providers"):
+        if key in updates:
+            log(f"Recommended {key}: {updates[key]}")
+    if dry_run:
+        log("Dry run: config not written")
+    else:
+        write_config(config_path, updates)
+        log(f"Recommendations written to {config_path}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the AI background removal environment.")
+    parser.add_argument("--perf", action="store_true",
+                        help="Measure conversion/AI performance and write tuned settings into the config")
+    parser.add_argument("--config", default="config.json", help="Config file to update in --perf mode")
+    parser.add_argument("--dry-run", action="store_true", help="Measure only; do not write the config")
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and sizes")
+    args = parser.parse_args(argv)
+    if args.perf:
+        try:
+            return run_perf(args.config, args.dry_run, args.quick)
+        except Exception as e:
+            log(f"Performance run failed: {e}\n{traceback.format_exc()}")
+            return 1
+    return run_checks()
+
+if __name__ == "__main__":
+    sys.exit(main())
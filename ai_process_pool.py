@@ -0,0 +1,423 @@
+"""
+SHH Image Converter - AI Process Pool
+Background removal in worker processes, with pixels passed through shared memory.
+
+Each worker process owns one rembg session. The parent keeps a ring of
+SharedMemory slots (two per worker); for every image it copies the decoded
+pixels into a free slot and sends only a small FrameDescriptor over the
+request queue. The worker reads the pixels straight from the slot, runs the model and
+writes the 'L' mask back into the same slot after the pixels, so neither the
+image nor the mask is ever pickled or PNG-encoded. The parent builds the
+cut-out from the mask exactly as rembg does.
+
+AIProcessPool is a drop-in for AIManager (get_session / remove_background /
+last_error / release) and for AISessionPool in the HTTP service (size /
+warm / warm_count / acquire).
+"""
+
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
+from multiprocessing import shared_memory
+from typing import Optional
+
+from PIL import Image
+
+from conversion_pipeline import AIManager, ai_options_from_config, cutout_from_mask, without_orientation
+
+TRANSFER_MODES = ("L", "RGB", "RGBA")  # Anything else is converted to RGBA before the copy
+SLOTS_PER_PROCESS = 2  # One being filled/read by the parent while the other is in inference
+SLOT_ROUNDING = 1 << 20  # Slots grow in 1 MB steps so similar image sizes reuse them
+READY_TIMEOUT_SEC = AIManager.SESSION_TIMEOUT_SEC + 30  # Process start-up plus model load
+SLOT_WAIT_SEC = AIManager.REMOVAL_TIMEOUT_SEC  # Every slot frees within one removal; longer means the pool is stuck
+
+@dataclass(frozen=True)
+class FrameDescriptor:
+    """What actually crosses the process boundary for one image (a few dozen bytes)."""
+    request_id: int
+    slot: int
+    shm_name: str
+    width: int
+    height: int
+    mode: str
+
+    @property
+    def pixel_bytes(self) -> int:
+        return self.width * self.height * len(self.mode)
+
+    @property
+    def mask_bytes(self) -> int:
+        return self.width * self.height
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Open an existing segment without handing its lifetime to this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        return shm
+
+def write_frame(shm: shared_memory.SharedMemory, img: Image.Image) -> int:
+    """Copy img's raw pixels to the start of shm; returns the byte count."""
+    data = img.tobytes()
+    shm.buf[:len(data)] = data
+    return len(data)
+
+def read_frame(shm: shared_memory.SharedMemory, desc: FrameDescriptor) -> Image.Image:
+    """Image over the pixels in shm (L/RGBA are mapped, not copied; drop it before the slot is reused)."""
+    return Image.frombuffer(desc.mode, (desc.width, desc.height), shm.buf[:desc.pixel_bytes],
+                            "raw", desc.mode, 0, 1)
+
+def write_mask(shm: shared_memory.SharedMemory, desc: FrameDescriptor, mask: Image.Image):
+    shm.buf[desc.pixel_bytes:desc.pixel_bytes + desc.mask_bytes] = mask.convert("L").tobytes()
+
+def read_mask(shm: shared_memory.SharedMemory, desc: FrameDescriptor) -> Image.Image:
+    """Copy of the mask the worker wrote after the pixels (safe to keep after the slot is reused)."""
+    start = desc.pixel_bytes
+    return Image.frombytes("L", (desc.width, desc.height), bytes(shm.buf[start:start + desc.mask_bytes]))
+
+def _ai_worker(worker_id: int, requests, results, threads: int, providers: Optional[list[str]]):
+    """Worker process: one warm session, masks written straight back into the caller's slot."""
+    manager = AIManager(threads, providers)
+    results.put(("ready", worker_id, manager.get_session() is not None, manager.last_error))
+    attached: dict[int, shared_memory.SharedMemory] = {}
+    while True:
+        desc = requests.get()
+        if desc is None:
+            break
+        results.put(("taken", desc.request_id, worker_id, None))  # Lets the parent fail it if this process dies
+        ok, error = False, None
+        try:
+            shm = attached.get(desc.slot)
+            if shm is None or shm.name.lstrip("/") != desc.shm_name.lstrip("/"):
+                if shm is not None:
+                    _close_quietly(shm)  # The parent grew this slot; the old segment is gone
+                shm = attached[desc.slot] = attach_shared_memory(desc.shm_name)
+            frame = read_frame(shm, desc)
+            try:
+                mask = manager.remove_background_mask(frame)
+            finally:
+                del frame  # Release the exported buffer before anything can close the segment
+            if mask is not None:
+                write_mask(shm, desc, mask)
+                ok = True
+            else:
+                error = manager.last_error or "Background removal failed or timed out"
+        except Exception as e:
+            error = str(e)
+        results.put(("done", desc.request_id, ok, error))
+    for shm in attached.values():
+        _close_quietly(shm)
+
+def _close_quietly(shm: shared_memory.SharedMemory):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # A timed-out inference thread still holds a view; the OS frees it with the process
+
+class _Slot:
+    """Parent-side shared memory segment, grown (re-created) when an image does not fit."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    def ensure(self, nbytes: int) -> shared_memory.SharedMemory:
+        if self.shm is None or self.shm.size < nbytes:
+            self.close()
+            size = -(-nbytes // SLOT_ROUNDING) * SLOT_ROUNDING
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        return self.shm
+
+    def close(self):
+        """Drop the segment; a worker still attached keeps its own mapping, and the next ensure() makes a new one."""
+        if self.shm is not None:
+            self.shm.close()
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+
+class AIProcessPool:
+    """Background removal across worker processes; see the module docstring."""
+    REMOVAL_TIMEOUT_SEC = AIManager.REMOVAL_TIMEOUT_SEC  # From when a worker takes the request
+    # Waiting for a worker to take it: with two slots per process at most one request per
+    # process queues ahead, so this also covers one removal
+    QUEUE_WAIT_SEC = AIManager.REMOVAL_TIMEOUT_SEC
+
+    def __init__(self, processes: int = 2, threads: int = 0, providers: Optional[list[str]] = None):
+        self.processes = max(1, processes)
+        self.threads = max(0, threads)
+        self.providers = list(providers) if providers else None
+        self._ctx = multiprocessing.get_context("spawn")  # Same behaviour on Windows, macOS and Linux
+        self._lock = threading.Lock()
+        self._workers: list = []
+        self._requests = None
+        self._results = None
+        self._collector: Optional[threading.Thread] = None
+        self._slots: list[_Slot] = []
+        self._free_slots: queue.Queue = queue.Queue()
+        self._pending: dict[int, dict] = {}
+        self._ids = itertools.count(1)
+        self._ready = 0
+        self._started = False
+        self._stopping = False
+        self._last_error: Optional[str] = None
+        self._fallback: Optional[AIManager] = None  # In-process session used when no slot frees up
+
+    def _log(self, msg: str):
+        print(f"[AI] {time.strftime('%H:%M:%S')} {msg}")
+
+    # --- AIManager-compatible API ---
+    @property
+    def last_error(self) -> Optional[str]:
+        return self._last_error
+
+    @property
+    def has_session(self) -> bool:
+        return self._ready > 0
+
+    def get_session(self):
+        """Start the worker processes on first use and wait for their sessions; None if none came up."""
+        with self._lock:
+            if not self._started:
+                self._start()
+        return self if self._ready > 0 else None
+
+    def remove_background(self, image, cancel_event: Optional[threading.Event] = None):
+        """Cut-out for a PIL image (or PNG bytes for encoded input); None on failure or timeout."""
+        if isinstance(image, (bytes, bytearray)):
+            with Image.open(BytesIO(image)) as img:
+                cutout = self.remove_background(without_orientation(img), cancel_event)
+            if cutout is None:
+                return None
+            buffer = BytesIO()
+            cutout.save(buffer, "PNG")
+            return buffer.getvalue()
+        mask = self.remove_background_mask(image, cancel_event)
+        return cutout_from_mask(image, mask) if mask is not None else None
+
+    def remove_background_mask(self, image: Image.Image,
+                               cancel_event: Optional[threading.Event] = None) -> Optional[Image.Image]:
+        if self.get_session() is None:
+            return None
+        img = image if image.mode in TRANSFER_MODES else image.convert("RGBA")
+        try:
+            slot = self._free_slots.get(timeout=SLOT_WAIT_SEC)
+        except queue.Empty:
+            return self._fallback_mask(img, cancel_event)
+        desc = None
+        try:
+            shm = slot.ensure(img.width * img.height * (len(img.mode) + 1))
+            write_frame(shm, img)
+            desc = FrameDescriptor(next(self._ids), slot.index, shm.name, img.width, img.height, img.mode)
+            # The request owns the slot until it returns; "worker" is filled in once a process takes it
+            waiter = {"event": threading.Event(), "ok": False, "error": None, "slot": slot, "worker": None,
+                      "taken_at": None}
+            with self._lock:
+                self._pending[desc.request_id] = waiter
+            self._requests.put(desc)
+            queued_at = time.monotonic()
+            while not waiter["event"].wait(0.1):
+                reason = self._abandon_reason(waiter, queued_at, cancel_event)
+                if reason is not None:
+                    with self._lock:
+                        if not waiter["event"].is_set():
+                            # A worker may still write into this segment, so it is retired with the
+                            # request; the slot goes back to the pool with a fresh segment
+                            self._pending.pop(desc.request_id, None)
+                            slot.close()
+                            self._log(f"Background removal abandoned: {reason}")
+                            return None
+                    break
+            if not waiter["ok"]:
+                self._last_error = waiter["error"]
+                return None
+            return read_mask(shm, desc)
+        finally:
+            self._return_slot(slot)
+
+    def _abandon_reason(self, waiter: dict, queued_at: float,
+                        cancel_event: Optional[threading.Event]) -> Optional[str]:
+        """Why a waiting caller should give up now, or None to keep waiting.
+
+        The removal timeout runs from the worker's "taken" message, so requests queued
+        behind a busy worker are not timed out for time they spent waiting.
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return "job cancelled"
+        taken_at = waiter["taken_at"]
+        if taken_at is None:
+            if time.monotonic() - queued_at >= self.QUEUE_WAIT_SEC:
+                return f"no worker took it within {self.QUEUE_WAIT_SEC}s"
+        elif time.monotonic() - taken_at >= self.REMOVAL_TIMEOUT_SEC:
+            return f"timed out after {self.REMOVAL_TIMEOUT_SEC}s"
+        return None
+
+    def _return_slot(self, slot: _Slot):
+        with self._lock:
+            if slot in self._slots:  # Slots from before a release() are closed and dropped
+                self._free_slots.put(slot)
+
+    def _fallback_mask(self, img: Image.Image,
+                       cancel_event: Optional[threading.Event]) -> Optional[Image.Image]:
+        """No slot freed within SLOT_WAIT_SEC: run this image on an in-process session instead of waiting."""
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = AIManager(self.threads, self.providers)
+        self._log(f"No shared-memory slot free within {SLOT_WAIT_SEC}s; using an in-process session")
+        mask = self._fallback.remove_background_mask(img, cancel_event)
+        if mask is None:
+            self._last_error = self._fallback.last_error
+        return mask
+
+    def release(self):
+        """Stop the worker processes and free the shared memory; the next use starts them again."""
+        with self._lock:
+            if not self._started:
+                return
+            self._stopping = True
+            workers, requests = self._workers, self._requests
+        self._log("Stopping AI worker processes")
+        for _ in workers:
+            requests.put(None)
+        for process in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._collector.join(2)
+        with self._lock:
+            for waiter in self._pending.values():
+                waiter["error"] = "AI worker processes stopped"
+                waiter["event"].set()
+            self._pending.clear()
+            for slot in self._slots:
+                slot.close()
+            self._slots = []
+            # Drain rather than replace the queue: callers blocked in get() keep waiting on this
+            # one and receive the next start's slots (or fall back after SLOT_WAIT_SEC)
+            while True:
+                try:
+                    self._free_slots.get_nowait()
+                except queue.Empty:
+                    break
+            self._workers = []
+            self._ready = 0
+            self._started = False
+            self._stopping = False
+            fallback, self._fallback = self._fallback, None
+        if fallback is not None:
+            fallback.release()
+
+    # --- AISessionPool-compatible API (HTTP service) ---
+    @property
+    def size(self) -> int:
+        return self.processes
+
+    @property
+    def warm_count(self) -> int:
+        return self._ready
+
+    def warm(self) -> int:
+        self.get_session()
+        return self._ready
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """The pool schedules across its processes itself, so every caller shares it."""
+        yield self
+
+    # --- Internals ---
+    def _spawn(self, worker_id: int):
+        process = self._ctx.Process(target=_ai_worker, name=f"ai-worker-{worker_id}", daemon=True,
+                                    args=(worker_id, self._requests, self._results, self.threads, self.providers))
+        process.start()
+        return process
+
+    def _start(self):
+        """Under the lock: launch workers and block until each reports its session (or fails)."""
+        self._started = True
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._slots = [_Slot(i) for i in range(self.processes * SLOTS_PER_PROCESS)]
+        for slot in self._slots:
+            self._free_slots.put(slot)
+        self._log(f"Starting {self.processes} AI worker processes")
+        start = time.time()
+        self._workers = [self._spawn(i) for i in range(self.processes)]
+        reported = 0
+        while reported < self.processes:
+            try:
+                kind, _worker_id, ok, error = self._results.get(timeout=READY_TIMEOUT_SEC)
+            except queue.Empty:
+                self._last_error = f"AI worker processes did not start within {READY_TIMEOUT_SEC}s"
+                break
+            if kind != "ready":
+                continue
+            reported += 1
+            if ok:
+                self._ready += 1
+            elif error:
+                self._last_error = error
+        self._log(f"{self._ready}/{self.processes} AI worker processes ready in {time.time() - start:.1f}s")
+        self._collector = threading.Thread(target=self._collect, daemon=True, name="ai-results")
+        self._collector.start()
+
+    def _collect(self):
+        """Route results to waiting callers; restart workers that died."""
+        results, workers = self._results, self._workers
+        while not self._stopping:
+            try:
+                kind, key, ok, error = results.get(timeout=0.5)
+            except queue.Empty:
+                self._restart_dead(workers)
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "ready":
+                continue  # A restarted worker
+            with self._lock:
+                if kind == "taken":
+                    waiter = self._pending.get(key)
+                    if waiter is not None:
+                        waiter["worker"] = ok  # The worker id travels in the 'ok' field
+                        waiter["taken_at"] = time.monotonic()
+                    continue
+                waiter = self._pending.pop(key, None)
+                if waiter is None:
+                    continue  # Abandoned; its segment was already retired
+                waiter["ok"], waiter["error"] = ok, error
+                waiter["event"].set()
+
+    def _restart_dead(self, workers: list):
+        """Respawn dead workers and fail the request each was running, so its caller returns its slot."""
+        for i, process in enumerate(workers):
+            if not process.is_alive() and not self._stopping:
+                self._last_error = f"AI worker process {i} exited with code {process.exitcode}; restarting it"
+                self._log(self._last_error)
+                with self._lock:
+                    for request_id, waiter in list(self._pending.items()):
+                        if waiter["worker"] == i:
+                            del self._pending[request_id]
+                            waiter["error"] = self._last_error
+                            waiter["event"].set()
+                workers[i] = self._spawn(i)
+
+def ai_backend_from_config(settings: dict):
+    """AIProcessPool when config.json sets 'ai_processes' > 0, otherwise an in-process AIManager."""
+    processes = max(0, int(settings.get("ai_processes", 0)))
+    if processes:
+        return AIProcessPool(processes, **ai_options_from_config(settings))
+    return AIManager.from_config(settings)
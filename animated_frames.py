@@ -0,0 +1,113 @@
+"""
+SHH Image Converter - Animated Frames
+Frame-by-frame helpers for animated GIF, APNG and WebP sources.
+
+Frames are decoded one at a time with seek(); callers only ever hold the
+current source frame plus output-sized results. Frame-rate / frame-count
+reduction happens while iterating, so dropped frames are never processed.
+"""
+
+import math
+from typing import Callable, Iterator, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+DEFAULT_FRAME_MS = 100  # Browsers treat missing/zero GIF delays as ~100ms
+MASK_REUSE_MAX_DIFF = 2.0  # Mean 0-255 difference on a 64x64 grey thumbnail
+MASK_REUSE_PROBE = (64, 64)
+
+def is_animated(img: Image.Image) -> bool:
+    return bool(getattr(img, "is_animated", False)) and getattr(img, "n_frames", 1) > 1
+
+def frame_has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+
+def iter_frames(img: Image.Image, max_fps: float = 0.0,
+                max_frames: int = 0) -> Iterator[tuple[Image.Image, int]]:
+    """Yield (frame, duration_ms) for the frames to keep, decoding them one at a time.
+
+    Each frame is a standalone RGBA (or RGB for opaque sources) copy of the fully
+    composited frame. A dropped frame's duration is added to the kept frame before
+    it, so total playback time is unchanged.
+    """
+    total = getattr(img, "n_frames", 1)
+    stride = math.ceil(total / max_frames) if max_frames and total > max_frames else 1
+    min_interval = 1000.0 / max_fps if max_fps > 0 else 0.0
+    mode = "RGBA" if frame_has_alpha(img) else "RGB"
+
+    pending: Optional[Image.Image] = None
+    pending_ms = 0
+    elapsed = 0.0
+    next_slot = 0.0
+    for index in range(total):
+        img.seek(index)
+        img.load()  # WebP only fills in the frame's duration once it is loaded
+        duration = int(img.info.get("duration") or DEFAULT_FRAME_MS)
+        start = elapsed
+        elapsed += duration
+        if index % stride or start + 1e-6 < next_slot:
+            pending_ms += duration
+            continue
+        if pending is not None:
+            yield pending, pending_ms
+        # Later GIF frames may switch mode (P -> RGB/RGBA); normalise so every frame matches
+        pending = img.convert(mode)
+        pending_ms = duration
+        next_slot = start + min_interval
+    if pending is not None:
+        yield pending, pending_ms
+
+def merge_identical_frames(frames: Iterator[tuple[Image.Image, int]]) -> Iterator[tuple[Image.Image, int]]:
+    """Collapse consecutive frames that came out pixel-identical (common after downscaling)."""
+    previous: Optional[Image.Image] = None
+    previous_ms = 0
+    for frame, duration in frames:
+        if previous is not None and previous.mode == frame.mode and previous.size == frame.size \
+                and ImageChops.difference(previous, frame).getbbox() is None:
+            previous_ms += duration
+            continue
+        if previous is not None:
+            yield previous, previous_ms
+        previous, previous_ms = frame, duration
+    if previous is not None:
+        yield previous, previous_ms
+
+class FrameMaskCache:
+    """Runs background removal per frame but reuses the last mask for near-identical frames.
+
+    Frames are compared against the frame that produced the current mask (not the
+    previous frame), so slow drift still triggers a fresh inference.
+    """
+
+    def __init__(self, remove_background: Callable[[Image.Image], Image.Image],
+                 max_diff: float = MASK_REUSE_MAX_DIFF):
+        self.remove_background = remove_background
+        self.max_diff = max_diff
+        self.inferences = 0
+        self.reused = 0
+        self._mask: Optional[Image.Image] = None
+        self._reference: Optional[Image.Image] = None
+
+    @staticmethod
+    def _probe(frame: Image.Image) -> Image.Image:
+        return frame.convert("L").resize(MASK_REUSE_PROBE, Image.Resampling.BILINEAR)
+
+    def apply(self, frame: Image.Image) -> Image.Image:
+        """Return frame with the background removed (RGBA)."""
+        probe = self._probe(frame)
+        if self._mask is not None and self._mask.size == frame.size:
+            diff = ImageStat.Stat(ImageChops.difference(probe, self._reference)).mean[0]
+            if diff <= self.max_diff:
+                self.reused += 1
+                cut = frame.convert("RGBA")
+                alpha = cut.getchannel("A")
+                cut.putalpha(ImageChops.multiply(alpha, self._mask))
+                return cut
+        cut = self.remove_background(frame)
+        if cut is frame:
+            return frame  # AI unavailable or failed; nothing to cache
+        cut = cut.convert("RGBA")
+        self.inferences += 1
+        self._mask = cut.getchannel("A")
+        self._reference = probe
+        return cut
@@ -0,0 +1,219 @@
+"""
+SHH Image Converter - Archive I/O
+Streams sources out of ZIP/TAR archives and outputs into new ones, with no temp extraction.
+
+Readers hand out one entry at a time in archive order. TAR is read forward-only
+('r|*'), so a .tar.gz is decompressed exactly once and never seeked; ZIP entries
+are read from the central directory one by one. Writers append each output as it
+finishes and rename the archive into place on close, like atomic_save() does for
+single files. A reader or writer is shared by all workers of a job, so at most
+one entry per worker is ever held in memory, whatever the archive size.
+
+Supported: .zip, .tar, .tar.gz/.tgz, .tar.bz2/.tbz2, .tar.xz/.txz
+"""
+
+import os
+import posixpath
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+
+TAR_COMPRESSION = {
+    ".tar": "",
+    ".tar.gz": "gz", ".tgz": "gz",
+    ".tar.bz2": "bz2", ".tbz2": "bz2",
+    ".tar.xz": "xz", ".txz": "xz",
+}
+ARCHIVE_SUFFIXES = (".zip",) + tuple(TAR_COMPRESSION)
+TEMP_PREFIX = ".shh-partial-"  # Same marker as conversion_pipeline's temp files
+JUNK_PREFIXES = ("__MACOSX/",)  # Resource-fork folders macOS adds to zips it creates
+
+def archive_partial_prefix(path: str) -> str:
+    """Name prefix of the temp file an ArchiveWriter for path writes beside it.
+
+    Derived from the archive's own name, so cleaning up after a crash never touches
+    temp files of other jobs writing to the same folder.
+    """
+    return os.path.basename(path) + TEMP_PREFIX
+
+def is_archive_path(path: str) -> bool:
+    """True for a ZIP/TAR file name (existing folders never count, whatever their name)."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and not os.path.isdir(path)
+
+def _tar_compression(path: str) -> Optional[str]:
+    lower = path.lower()
+    for suffix in sorted(TAR_COMPRESSION, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return TAR_COMPRESSION[suffix]
+    return None
+
+def safe_entry_name(name: str) -> str:
+    """Relative '/'-separated path for an entry name; '' for names that cannot be written safely.
+
+    Drops drive letters, leading slashes and '.'/'..' parts, so no entry can escape
+    the destination folder (zip-slip).
+    """
+    parts = []
+    for part in name.replace("\\", "/").split("/"):
+        if part in ("", ".", "..") or part.endswith(":"):
+            continue
+        parts.append(part)
+    return "/".join(parts)
+
+def _is_junk(name: str) -> bool:
+    return name.startswith(JUNK_PREFIXES) or posixpath.basename(name).startswith("._")
+
+class EntryReadError(Exception):
+    """One entry could not be read (a ZIP member failing its CRC, a file gone from a folder).
+
+    The entries after it can still be read, so the job reports this one as failed and goes on.
+    """
+
+    def __init__(self, name: str, reason: Exception):
+        super().__init__(f"{name}: {reason}")
+        self.name = name
+
+@dataclass
+class ArchiveEntry:
+    """One source file; data is None when the caller did not want its bytes (see next_entry)."""
+    name: str
+    size: int
+    mtime_ns: int
+    data: Optional[bytes] = None
+
+class ArchiveReader:
+    """Thread-safe, forward-only reader over the image entries of one archive.
+
+    accept(name) picks the entries to return; directories, macOS resource forks
+    and names that are empty once made safe are always skipped.
+    """
+
+    def __init__(self, path: str, accept: Callable[[str], bool]):
+        self.path = path
+        self.accept = accept
+        self._lock = threading.Lock()
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._zip_infos: list[zipfile.ZipInfo] = []
+        if _tar_compression(path) is not None:
+            self._tar = tarfile.open(path, "r|*")
+        else:
+            self._zip = zipfile.ZipFile(path)
+            self._zip_infos = [info for info in self._zip.infolist()
+                               if not info.is_dir() and self._wanted(info.filename)]
+        self._zip_pending = iter(self._zip_infos)
+        self._ended = False
+
+    def _wanted(self, name: str) -> bool:
+        name = safe_entry_name(name)
+        return bool(name) and not _is_junk(name) and self.accept(name)
+
+    def count(self) -> Optional[int]:
+        """Number of entries for ZIP (from the central directory); None for TAR, which is not seekable."""
+        return len(self._zip_infos) if self._zip is not None else None
+
+    def next_entry(self, want_data: Callable[[ArchiveEntry], bool] = lambda entry: True) -> Optional[ArchiveEntry]:
+        """The next accepted entry, or None at the end of the archive.
+
+        Its bytes are read only if want_data(entry) is true (resume checks skip the rest).
+        A ZIP member that cannot be read raises EntryReadError and is passed over; a
+        corrupt TAR stream raises whatever tarfile raised, as nothing after it can be read.
+        """
+        with self._lock:
+            if self._zip is not None:
+                info = next(self._zip_pending, None)
+                if info is None:
+                    return None
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                entry = ArchiveEntry(safe_entry_name(info.filename), info.file_size, int(mtime) * 1_000_000_000)
+                if want_data(entry):
+                    try:
+                        entry.data = self._zip.read(info)
+                    except Exception as e:  # BadZipFile (CRC), zlib.error, unsupported compression...
+                        raise EntryReadError(entry.name, e) from e
+                return entry
+            while not self._ended:
+                member = self._tar.next()
+                self._tar.members = []  # TarFile keeps every header it has seen; memory must not grow with the archive
+                if member is None:
+                    self._ended = True  # A stream cannot be asked again once it has ended
+                    break
+                if not member.isfile() or not self._wanted(member.name):
+                    continue
+                entry = ArchiveEntry(safe_entry_name(member.name), member.size, int(member.mtime) * 1_000_000_000)
+                if want_data(entry):
+                    with self._tar.extractfile(member) as f:
+                        entry.data = f.read()
+                return entry
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            if self._tar is not None:
+                self._tar.close()
+
+class ArchiveWriter:
+    """Thread-safe writer that appends finished outputs to a new archive.
+
+    Entries go to a temp file next to the target; close() renames it into place,
+    abort() deletes it. Images are stored, not deflated: WebP/PNG/JPEG are already
+    compressed, so deflate would only burn CPU.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(prefix=archive_partial_prefix(path), suffix=".tmp", dir=directory)
+        self._file = os.fdopen(fd, 'wb')
+        compression = _tar_compression(path)
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        if compression is None:
+            self._zip = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_STORED)
+        else:
+            self._tar = tarfile.open(fileobj=self._file, mode=f"w|{compression}")
+        self.entries = 0
+
+    def add(self, name: str, data: bytes, mtime: Optional[float] = None):
+        mtime = time.time() if mtime is None else mtime
+        with self._lock:
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, time.localtime(mtime)[:6])
+                self._zip.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(mtime)
+                info.mode = 0o644
+                self._tar.addfile(info, BytesIO(data))
+                self._tar.members = []  # Not needed to finish a TAR stream (unlike a ZIP's central directory)
+            self.entries += 1
+
+    def close(self):
+        with self._lock:
+            (self._zip or self._tar).close()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        with self._lock:
+            try:
+                (self._zip or self._tar).close()
+                self._file.close()
+            except Exception:
+                pass
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
@@ -0,0 +1,105 @@
+"""
+SHH Image Converter - Background Pre-check
+Decides, before any AI runs, whether a source needs background removal at all.
+
+Sources that are already cut out (transparent border, real alpha coverage)
+keep their alpha. Studio shots on a flat backdrop get a colour-key mask
+restricted to the region connected to the image border. Everything else
+goes to the AI model. All measurements use Pillow's C-level operations on a
+reduced probe image, so the check costs a few milliseconds.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+PROBE_MAX_SIDE = 512
+CONNECTIVITY_MAX_SIDE = 256  # Flood fill runs at this size; the colour key itself is full resolution
+ALPHA_TRANSPARENT_MAX = 16  # Alpha at or below this counts as transparent
+MIN_TRANSPARENT_FRACTION = 0.05  # An existing alpha channel must hide at least this share of the image
+MIN_BORDER_MATCH = 0.97  # Share of border pixels that must be transparent / match the backdrop colour
+KEY_TOLERANCE = 12  # Max per-channel distance from the backdrop colour; edges fade out over the same range
+
+@dataclass
+class BackgroundCheck:
+    """Result of analyze_background(); route is 'alpha', 'flat' or 'ai'."""
+    route: str
+    border_match: float = 0.0
+    transparent_fraction: float = 0.0
+    key_colour: Optional[tuple[int, int, int]] = None
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+def _probe(img: Image.Image) -> Image.Image:
+    probe = img.convert("RGBA" if _has_alpha(img) else "RGB")
+    probe.thumbnail((PROBE_MAX_SIDE, PROBE_MAX_SIDE), Image.Resampling.BILINEAR)
+    return probe
+
+def _border(img: Image.Image) -> Image.Image:
+    """The four edge strips of img laid end to end in one image."""
+    w, h = img.size
+    s = max(1, min(w, h) // 50)
+    strips = [img.crop((0, 0, w, s)), img.crop((0, h - s, w, h)),
+              img.crop((0, 0, s, h)).transpose(Image.Transpose.ROTATE_90),
+              img.crop((w - s, 0, w, h)).transpose(Image.Transpose.ROTATE_90)]
+    border = Image.new(img.mode, (sum(strip.width for strip in strips), s))
+    x = 0
+    for strip in strips:
+        border.paste(strip, (x, 0))
+        x += strip.width
+    return border
+
+def _fraction_at_most(channel: Image.Image, threshold: int) -> float:
+    hist = channel.histogram()
+    return sum(hist[:threshold + 1]) / max(1, sum(hist))
+
+def _distance(rgb: Image.Image, colour: tuple[int, int, int]) -> Image.Image:
+    """Per-pixel max channel distance to colour, as an L image."""
+    r, g, b = ImageChops.difference(rgb, Image.new("RGB", rgb.size, colour)).split()
+    return ImageChops.lighter(ImageChops.lighter(r, g), b)
+
+def analyze_background(img: Image.Image) -> BackgroundCheck:
+    probe = _probe(img)
+    if probe.mode == "RGBA":
+        alpha = probe.getchannel("A")
+        transparent = _fraction_at_most(alpha, ALPHA_TRANSPARENT_MAX)
+        border_match = _fraction_at_most(_border(alpha), ALPHA_TRANSPARENT_MAX)
+        if transparent >= MIN_TRANSPARENT_FRACTION and border_match >= MIN_BORDER_MATCH:
+            return BackgroundCheck("alpha", border_match, transparent)
+        probe = probe.convert("RGB")
+
+    border = _border(probe)
+    key = tuple(int(v) for v in ImageStat.Stat(border).median)
+    border_match = _fraction_at_most(_distance(border, key), KEY_TOLERANCE)
+    if border_match >= MIN_BORDER_MATCH:
+        return BackgroundCheck("flat", border_match, key_colour=key)
+    return BackgroundCheck("ai", border_match)
+
+def _border_connected(background: Image.Image) -> Image.Image:
+    """Mask (255) of background-candidate pixels reachable from the image border."""
+    small = background.copy()
+    small.thumbnail((CONNECTIVITY_MAX_SIDE, CONNECTIVITY_MAX_SIDE), Image.Resampling.BILINEAR)
+    small = small.point(lambda v: 255 if v >= 128 else 0)
+    w, h = small.size
+    edge = [(x, y) for x in range(w) for y in (0, h - 1)] + [(x, y) for y in range(h) for x in (0, w - 1)]
+    for xy in edge:
+        if small.getpixel(xy) == 255:
+            ImageDraw.floodfill(small, xy, 128)
+    connected = small.point(lambda v: 255 if v == 128 else 0)
+    # Grow by one pixel so the soft edge band next to the backdrop is not clipped after upscaling
+    connected = connected.filter(ImageFilter.MaxFilter(3))
+    return connected.resize(background.size, Image.Resampling.NEAREST)
+
+def apply_colour_key(img: Image.Image, key_colour: tuple[int, int, int],
+                     tolerance: int = KEY_TOLERANCE) -> Image.Image:
+    """Make the border-connected backdrop transparent; returns RGBA."""
+    rgba = img.convert("RGBA")
+    distance = _distance(rgba.convert("RGB"), key_colour)
+    # 255 = backdrop, fading to 0 between 1x and 2x tolerance for an anti-aliased edge
+    background = distance.point(lambda v: 255 if v <= tolerance
+                                else max(0, 255 - (v - tolerance) * 255 // max(1, tolerance)))
+    background = ImageChops.multiply(background, _border_connected(background))
+    rgba.putalpha(ImageChops.subtract(rgba.getchannel("A"), background))
+    return rgba
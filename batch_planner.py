@@ -0,0 +1,118 @@
+"""
+SHH Image Converter - Batch Planner
+Orders a batch so parallel workers finish together instead of waiting on one straggler.
+
+Each file's cost is estimated from its size on disk and its header dimensions
+(Image.open reads only the header; nothing is decoded). Tasks are handed out
+largest first (LPT scheduling), so giant TIFFs start early while small files
+fill the gaps at the end. Files much cheaper than a fair share of the batch
+are packed into chunks that one worker converts back to back, cutting
+per-task dispatch overhead on folders with thousands of thumbnails.
+"""
+
+import heapq
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection
+
+from PIL import Image
+
+# Costs are in "decoded megapixel" units; only their ratios matter
+PER_FILE_COST = 0.5  # Open, output encode and journal write; roughly a 500x500 WebP encode
+PER_MB_COST = 0.5  # Entropy decoding and I/O of the compressed source
+MAX_FRAME_FACTOR = 100  # Cap for animated sources (frame dropping usually applies anyway)
+CHUNKS_PER_WORKER = 16  # Chunk cost target = total / (workers * this); keeps the tail balanced
+MAX_CHUNK_FILES = 32
+HEADER_THREADS = 8  # Header reads are I/O bound (network shares); overlap them
+
+def estimate_cost(path: str) -> float:
+    """Relative conversion cost of one file without decoding it."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return PER_FILE_COST
+    cost = PER_FILE_COST + size / 1_000_000 * PER_MB_COST
+    try:
+        with Image.open(path) as img:
+            frames = 1
+            if getattr(img, "is_animated", False):
+                # Header field for APNG/WebP; GIF walks block headers without decoding pixels
+                frames = min(MAX_FRAME_FACTOR, getattr(img, "n_frames", 1))
+            cost += img.size[0] * img.size[1] / 1_000_000 * frames
+    except Exception:
+        pass  # Unreadable files are skipped quickly; the size-based estimate is enough
+    return cost
+
+def estimate_costs(source: str, names: list[str]) -> dict[str, float]:
+    if len(names) < 2:
+        return {name: estimate_cost(os.path.join(source, name)) for name in names}
+    with ThreadPoolExecutor(max_workers=HEADER_THREADS, thread_name_prefix="plan") as pool:
+        costs = pool.map(lambda name: estimate_cost(os.path.join(source, name)), names)
+        return dict(zip(names, costs))
+
+def plan_tasks(costs: dict[str, float], workers: int) -> list[list[str]]:
+    """Group files into tasks and order them largest first.
+
+    Files costing less than half the chunk target are packed into chunks of about
+    that target; everything else is its own task.
+    """
+    if not costs:
+        return []
+    order = sorted(costs, key=lambda name: (-costs[name], name))
+    target = sum(costs.values()) / (max(1, workers) * CHUNKS_PER_WORKER)
+    tasks: list[tuple[float, list[str]]] = []
+    chunk: list[str] = []
+    chunk_cost = 0.0
+    for name in order:
+        if costs[name] >= target / 2:
+            tasks.append((costs[name], [name]))
+            continue
+        chunk.append(name)
+        chunk_cost += costs[name]
+        if chunk_cost >= target or len(chunk) >= MAX_CHUNK_FILES:
+            tasks.append((chunk_cost, chunk))
+            chunk, chunk_cost = [], 0.0
+    if chunk:
+        tasks.append((chunk_cost, chunk))
+    tasks.sort(key=lambda task: -task[0])
+    return [names for _, names in tasks]
+
+def plan_batch(source: str, names: list[str], workers: int, done: Collection[str] = ()) -> list[list[str]]:
+    """Tasks for a batch run: one file per task in the given order for a single worker.
+
+    Names in done (already finished in an earlier run) are not costed, so resuming
+    a mostly converted batch reads no headers for them. They go first, in chunks
+    of MAX_CHUNK_FILES, since each is only a stat and a journal lookup.
+    """
+    if workers <= 1:
+        return [[name] for name in names]
+    finished = [name for name in names if name in done]
+    resumed = [finished[i:i + MAX_CHUNK_FILES] for i in range(0, len(finished), MAX_CHUNK_FILES)]
+    return resumed + plan_tasks(estimate_costs(source, [name for name in names if name not in done]), workers)
+
+def plan_shards(costs: dict[str, float], shard_files: int) -> list[list[str]]:
+    """Split a batch into shards of about shard_files files each with near-equal total cost.
+
+    Files go largest first to the currently cheapest shard, so no shard collects all
+    the giant scans. Shards are returned most expensive first.
+    """
+    if not costs:
+        return []
+    count = max(1, math.ceil(len(costs) / max(1, shard_files)))
+    shards: list[list[str]] = [[] for _ in range(count)]
+    loads = [(0.0, i) for i in range(count)]
+    for name in sorted(costs, key=lambda name: (-costs[name], name)):
+        load, i = heapq.heappop(loads)
+        shards[i].append(name)
+        heapq.heappush(loads, (load + costs[name], i))
+    totals = {i: load for load, i in loads}
+    return [shards[i] for i in sorted(range(count), key=lambda i: -totals[i])]
+
+def simulate_makespan(task_costs: list[float], workers: int) -> float:
+    """Finish time of greedy dispatch (next task to the first free worker) in cost units."""
+    finish = [0.0] * max(1, workers)
+    for cost in task_costs:
+        i = finish.index(min(finish))
+        finish[i] += cost
+    return max(finish)
@@ -0,0 +1,183 @@
+"""
+SHH Image Converter - Canvas Cache
+Optional on-disk cache of finished canvases, so format/quality-only re-runs just re-encode.
+
+process_image() output (decode, AI, flatten, resize, letterbox) depends only on the
+source file and the geometry/AI settings, never on quality or PNG effort. Each
+canvas is stored as a fast, lossless PNG keyed by path, file size, mtime and
+ConversionSettings.canvas_fingerprint(). The cache is capped in bytes; once over the
+cap, the least recently used entries are evicted down to EVICT_TO of it. The folder
+is scanned once, on first use; after that an in-memory index tracks sizes and use,
+so stores never walk the folder. Several processes may share a cache folder:
+entries another process wrote are adopted when they are read, and entries it
+evicted are dropped when found missing.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from PIL import Image
+
+EVICT_TO = 0.9  # Evict down to this fraction of the cap, so eviction does not run on every store
+PNG_COMPRESS_LEVEL = 1  # Storing must stay much cheaper than re-processing; level 1 is still ~3x smaller than raw
+
+def default_cache_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "SHH_Image_Converter", "canvases")
+
+class CanvasCache:
+    """Size-capped LRU of canvases on disk; safe to use from any worker thread."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 1_000_000_000):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[dict[str, tuple[int, float]]] = None  # key -> (bytes, last used)
+        self._total = 0
+
+    def key(self, path: str, variant: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{variant}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _scan(self):
+        """Rebuild the index from the folder (under the lock)."""
+        index = {}
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            subdirs = []
+        for subdir in subdirs:
+            try:
+                for entry in os.scandir(subdir):
+                    if entry.name.endswith(".png"):
+                        st = entry.stat()
+                        index[entry.name[:-4]] = (st.st_size, st.st_mtime)
+            except OSError:
+                continue
+        self._index = index
+        self._total = sum(size for size, _ in index.values())
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._scan()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._ensure_index()
+            return self._total
+
+    def get(self, path: str, variant: str) -> Optional[Image.Image]:
+        """The cached canvas for this source and settings variant, fully loaded; None on a miss."""
+        key = self.key(path, variant)
+        if key is None:
+            return None
+        disk_path = self._disk_path(key)
+        try:
+            with Image.open(disk_path) as cached:
+                cached.load()
+                canvas = cached.copy()
+        except FileNotFoundError:
+            self._discard(key)  # Evicted by another process; keep the index total honest
+            return None
+        except Exception:
+            self._discard(key)  # Corrupt or half-evicted entry; it is rendered and stored again
+            return None
+        canvas.info = {}  # Same as a fresh canvas, so the encoder writes identical bytes
+        now = time.time()
+        try:
+            os.utime(disk_path, (now, now))  # mtime is the LRU clock (atime is often disabled)
+            size = os.path.getsize(disk_path)
+        except OSError:
+            return canvas
+        with self._lock:
+            self._ensure_index()
+            old_size = self._index.get(key, (0, 0.0))[0]
+            self._index[key] = (size, now)  # Adopts entries written by another process
+            self._total += size - old_size
+        return canvas
+
+    def put(self, path: str, variant: str, canvas: Image.Image):
+        """Store a canvas; write failures are ignored (the cache is only an accelerator)."""
+        key = self.key(path, variant)
+        if key is None:
+            return
+        disk_path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(disk_path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    canvas.save(f, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+                size = os.path.getsize(temp_path)
+                if size > self.max_bytes * EVICT_TO:
+                    os.remove(temp_path)  # Would evict everything else and then itself
+                    return
+                os.replace(temp_path, disk_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        except OSError as e:
+            print(f"[CACHE] Canvas cache write failed: {e}")
+            return
+        with self._lock:
+            self._ensure_index()
+            old_size = self._index.get(key, (0, 0.0))[0]
+            self._index[key] = (size, time.time())
+            self._total += size - old_size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _discard(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+        with self._lock:
+            if self._index is not None and key in self._index:
+                self._total -= self._index.pop(key)[0]
+
+    def _evict(self):
+        """Drop least recently used entries down to EVICT_TO of the cap (under the lock)."""
+        target = self.max_bytes * EVICT_TO
+        evicted = freed = 0
+        for key in sorted(self._index, key=lambda k: self._index[k][1]):
+            if self._total <= target:
+                break
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass  # Already evicted by another process
+            except OSError:
+                continue  # In use on Windows; try again next time
+            size = self._index.pop(key)[0]
+            self._total -= size
+            evicted += 1
+            freed += size
+        if evicted:
+            print(f"[CACHE] Evicted {evicted} canvases ({freed / 1_000_000:.1f} MB)")
+
+_shared: dict[str, CanvasCache] = {}
+_shared_lock = threading.Lock()
+
+def shared_canvas_cache(cache_dir: str, max_bytes: int) -> CanvasCache:
+    """One CanvasCache per folder for the whole process, so every job shares its index."""
+    folder = os.path.abspath(cache_dir)
+    with _shared_lock:
+        cache = _shared.get(folder)
+        if cache is None:
+            cache = _shared[folder] = CanvasCache(folder, max_bytes)
+        cache.max_bytes = max_bytes  # The newest setting wins
+        return cache
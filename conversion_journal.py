@@ -0,0 +1,101 @@
+"""
+SHH Image Converter - Job Journal
+Append-only record of finished files so an interrupted batch can resume.
+
+One JSON object per line in the destination folder. A torn last line from a
+crash is ignored on load and terminated before the first new record is appended,
+so nothing written after a resume is lost to it.
+"""
+
+import json
+import os
+import threading
+from typing import Optional
+
+JOURNAL_FILENAME = ".shh_convert_journal.jsonl"
+
+class ConversionJournal:
+    """Tracks which sources were converted with which settings fingerprint."""
+    FSYNC_EVERY = 64  # Records between fsyncs; every record is still flushed to the OS immediately
+
+    def __init__(self, dest: str, settings_fingerprint: str, filename: str = JOURNAL_FILENAME):
+        self.path = os.path.join(dest, filename)
+        self.settings_fingerprint = settings_fingerprint
+        self._done: dict[str, tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                if record.get("settings") != self.settings_fingerprint:
+                    continue
+                if record.get("status") == "done":
+                    self._done[record["source"]] = (record["size"], record["mtime_ns"], record["output"])
+                else:
+                    self._done.pop(record.get("source"), None)
+
+    @property
+    def completed_count(self) -> int:
+        return len(self._done)
+
+    def completed_outputs(self) -> dict[str, str]:
+        """Source name -> output path for every file recorded as done."""
+        with self._lock:
+            return {name: entry[2] for name, entry in self._done.items()}
+
+    def is_complete(self, source_name: str, size: int, mtime_ns: int) -> bool:
+        """True if this exact source version was already converted and its output still exists."""
+        entry = self._done.get(source_name)
+        if entry is None or entry[0] != size or entry[1] != mtime_ns:
+            return False
+        return os.path.exists(entry[2])
+
+    def record(self, source_name: str, size: int, mtime_ns: int, status: str, output_path: Optional[str] = None):
+        entry = {
+            "source": source_name,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "status": status,
+            "output": output_path,
+            "settings": self.settings_fingerprint,
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = self._open_for_append()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+            if status == "done":
+                self._done[source_name] = (size, mtime_ns, output_path or "")
+            else:
+                self._done.pop(source_name, None)
+
+    def _open_for_append(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        if f.tell() > 0:
+            with open(self.path, 'rb') as raw:
+                raw.seek(-1, os.SEEK_END)
+                if raw.read(1) != b"\n":
+                    f.write("\n")  # Close off a line torn by a crash so the next record starts clean
+        return f
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
@@ -0,0 +1,1452 @@
+"""
+SHH Image Converter - Conversion Pipeline
+Headless conversion logic shared by the GUI and the command-line front-ends
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import queue
+import hashlib
+import tempfile
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field, replace
+from io import BytesIO
+from typing import Callable, Iterable, Iterator, Optional
+
+from PIL import Image
+
+from background_precheck import analyze_background, apply_colour_key
+from archive_io import (ArchiveEntry, ArchiveReader, ArchiveWriter, EntryReadError, archive_partial_prefix,
+                        is_archive_path)
+from animated_frames import FrameMaskCache, is_animated, iter_frames, merge_identical_frames
+from batch_planner import plan_batch
+from canvas_cache import CanvasCache, default_cache_dir, shared_canvas_cache
+from conversion_journal import ConversionJournal
+from exif_orientation import ORIENTATION_TAG, apply_orientation, read_orientation, swaps_axes
+from format_sniff import INPUT_EXTENSIONS, SNIFF_BYTES, classify_files, is_candidate_name, sniff_bytes
+from output_layout import (DEFAULT_OUTPUT_NAMING, MANIFEST_FILENAME, MAX_SHARD_DEPTH, OUTPUT_NAMING_MODES,
+                           OutputManifest, bytes_digest, claim_output_name, content_digest, output_name_for,
+                           plan_output_names, shard_subdir)
+from png_optimizer import PNG_EFFORT_LEVELS, DEFAULT_PNG_EFFORT, default_png_size, png_save_params, reduce_png
+from progress_channel import ProgressChannel, ProgressEvent
+from resize_backend import DEFAULT_RESIZE_BACKEND, PREMULTIPLIED_MODES, RESIZE_BACKENDS, resize_image
+from source_dedup import fill_duplicate, plan_deduplication
+
+SUPPORTED_EXTENSIONS = INPUT_EXTENSIONS  # Every input format this Pillow build decodes (see format_sniff)
+ANIMATED_OUTPUT_FORMATS = ("WebP", "PNG")  # Other formats get the first frame only
+# Settings that change neither the canvas nor the encoded bytes (where things are cached, how twins are found)
+RUNTIME_ONLY_SETTINGS = ("canvas_cache_mb", "canvas_cache_dir", "dedup_pixel_level", "png_report_savings")
+# Settings used only after the canvas is finished: encoder options, naming and animation
+# (animated sources are never cached; a still renders the same with or without them)
+ENCODE_ONLY_SETTINGS = ("quality", "png_compression", "png_palette_colors", "output_naming",
+                        "output_shard_depth", "output_manifest", "keep_animation", "animation_max_fps",
+                        "animation_max_frames", "animation_remove_background")
+TEMP_PREFIX = ".shh-partial-"  # In-progress outputs; renamed into place once fully written
+
+def ai_options_from_config(settings: dict) -> dict:
+    """AIManager keyword arguments from config.json's 'ai_threads' / 'ai_providers'."""
+    providers = settings.get("ai_providers") or None
+    return {"threads": max(0, int(settings.get("ai_threads", 0))),
+            "providers": list(providers) if providers else None}
+
+class AIManager:
+    """Manages AI background removal with timeouts & diagnostics to avoid indefinite hangs."""
+    SESSION_TIMEOUT_SEC = 40  # Max time allowed for initial model/session creation
+    REMOVAL_TIMEOUT_SEC = 25  # Per-image background removal timeout
+
+    def __init__(self, threads: int = 0, providers: Optional[list[str]] = None):
+        """threads > 0 pins onnxruntime's thread count; providers picks execution providers in order.
+
+        Both default to onnxruntime's own choice and are normally written by `ai_diagnostic.py --perf`.
+        """
+        self.threads = max(0, threads)
+        self.providers = list(providers) if providers else None
+        self._rembg = None
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._init_attempted = False
+        self._init_failed = False
+        self._last_error: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, settings: dict) -> "AIManager":
+        return cls(**ai_options_from_config(settings))
+
+    def _log(self, msg: str):
+        print(f"[AI] {time.strftime('%H:%M:%S')} {msg}")
+
+    def _new_session(self):
+        # rembg sizes onnxruntime's thread pools from OMP_NUM_THREADS when the session is created
+        if self.threads:
+            os.environ["OMP_NUM_THREADS"] = str(self.threads)
+        if self.providers:
+            try:
+                return self._rembg.new_session('u2net', providers=self.providers)
+            except TypeError:
+                self._log("This rembg version does not accept providers; using its defaults")
+        return self._rembg.new_session('u2net')
+
+    def _load_library(self) -> bool:
+        if self._rembg is not None:
+            return True
+        try:
+            import rembg  # type: ignore
+            self._rembg = rembg
+            self._log("rembg imported successfully")
+            return True
+        except ImportError as e:
+            self._last_error = f"ImportError: {e}"
+            self._log(f"Failed to import rembg: {e}")
+        except Exception as e:  # Unexpected
+            self._last_error = f"Unexpected import error: {e}"
+            self._log(f"Unexpected error importing rembg: {e}\n{traceback.format_exc()}")
+        return False
+
+    def _ensure_model_cache(self):
+        """Ensure the U2-Net model is available in cache; copy from bundled if needed."""
+        # Standard cache locations (no need for appdirs dependency)
+        cache_locations = [
+            os.path.expanduser("~/.u2net"),
+            os.path.expanduser("~/.cache/rembg"),
+            os.path.join(os.environ.get("LOCALAPPDATA", ""), "rembg"),
+        ]
+
+        model_filename = "u2net.onnx"
+
+        # Check if model already exists in any cache location
+        for cache_dir in cache_locations:
+            cache_file = os.path.join(cache_dir, model_filename)
+            if os.path.exists(cache_file) and os.path.getsize(cache_file) > 100_000_000:  # ~175MB expected
+                self._log(f"Found existing model at {cache_file}")
+                return True
+
+        # Model not found, try to copy from bundled location
+        bundled_model = None
+        possible_bundled_paths = [
+            os.path.join(os.path.dirname(__file__), "models", "u2net", model_filename),  # Source layout
+            os.path.join(os.path.dirname(os.path.abspath(sys.executable)), "models", "u2net", model_filename),  # Bundled EXE
+            os.path.join(os.getcwd(), "models", "u2net", model_filename),  # Current dir
+        ]
+
+        for path in possible_bundled_paths:
+            if os.path.exists(path):
+                bundled_model = path
+                self._log(f"Found bundled model at {bundled_model}")
+                break
+
+        if not bundled_model:
+            self._log("No bundled model found; will rely on online download during session creation")
+            return False
+
+        # Try to copy bundled model to first cache location
+        target_cache = cache_locations[0]  # ~/.u2net
+        try:
+            os.makedirs(target_cache, exist_ok=True)
+            target_file = os.path.join(target_cache, model_filename)
+
+            import shutil
+            self._log(f"Copying bundled model to {target_file}")
+            shutil.copy2(bundled_model, target_file)
+
+            if os.path.exists(target_file) and os.path.getsize(target_file) > 100_000_000:
+                self._log("Model copied successfully")
+                return True
+            else:
+                self._log("Model copy failed or incomplete")
+                return False
+
+        except Exception as e:
+            self._log(f"Failed to copy bundled model: {e}")
+            return False
+
+    def _init_session_blocking(self):
+        """Direct (blocking) session init; run inside a worker thread so we can time out."""
+        try:
+            if self._rembg is None and not self._load_library():
+                return
+            if self._rembg is not None:
+                # Ensure model is available before creating session
+                self._ensure_model_cache()
+                self._log("Creating new rembg session (model 'u2net') ..."
+                          + (f" threads={self.threads}" if self.threads else "")
+                          + (f" providers={self.providers}" if self.providers else ""))
+                self._session = self._new_session()  # May download model
+                self._log("Session created successfully")
+        except Exception as e:
+            self._last_error = f"Session init failed: {e}"
+            self._log(f"Session creation failed: {e}\n{traceback.format_exc()}")
+
+    def get_session(self):
+        """Get or lazily create session with a timeout to prevent indefinite stall."""
+        with self._session_lock:
+            if self._session is not None:
+                return self._session
+            if self._init_attempted and self._init_failed:
+                return None
+            self._init_attempted = True
+
+            worker = threading.Thread(target=self._init_session_blocking, daemon=True)
+            start = time.time()
+            worker.start()
+            worker.join(self.SESSION_TIMEOUT_SEC)
+            if worker.is_alive():
+                self._init_failed = True
+                self._last_error = ("Session initialization timed out after "
+                                    f"{self.SESSION_TIMEOUT_SEC}s (likely model download/network issue)")
+                self._log(self._last_error)
+                return None
+            if self._session is None:
+                # Failed inside worker
+                self._init_failed = True
+                if not self._last_error:
+                    self._last_error = "Unknown failure creating AI session"
+                return None
+            duration = time.time() - start
+            self._log(f"AI session ready in {duration:.1f}s")
+            return self._session
+
+    def remove_background(self, image, cancel_event: Optional[threading.Event] = None):
+        """Remove background with a per-image timeout; returns None on failure.
+
+        image is encoded bytes (the result is PNG bytes) or a PIL image (the result is the
+        RGBA cut-out, without a PNG encode/decode round trip). Setting cancel_event stops
+        waiting promptly; the abandoned daemon thread finishes on its own.
+        """
+        session = self.get_session()
+        if session is None:
+            return None
+        return self._call_with_timeout(lambda: self._rembg.remove(image, session=session), cancel_event)
+
+    def remove_background_mask(self, image: Image.Image,
+                               cancel_event: Optional[threading.Event] = None) -> Optional[Image.Image]:
+        """Only the 'L' alpha mask for a PIL image (what AI worker processes send back)."""
+        session = self.get_session()
+        if session is None:
+            return None
+        return self._call_with_timeout(lambda: self._rembg.remove(image, session=session, only_mask=True),
+                                       cancel_event)
+
+    def _call_with_timeout(self, func: Callable, cancel_event: Optional[threading.Event]):
+        result_container: dict = {"data": None}
+        error_container: dict[str, Optional[str]] = {"err": None}
+
+        def _work():
+            try:
+                result_container["data"] = func()
+            except Exception as e:
+                error_container["err"] = str(e)
+                self._log(f"Background removal exception: {e}\n{traceback.format_exc()}")
+
+        t = threading.Thread(target=_work, daemon=True)
+        t.start()
+        deadline = time.monotonic() + self.REMOVAL_TIMEOUT_SEC
+        while t.is_alive() and time.monotonic() < deadline:
+            t.join(0.1 if cancel_event is not None else self.REMOVAL_TIMEOUT_SEC)
+            if cancel_event is not None and cancel_event.is_set():
+                self._log("Background removal abandoned: job cancelled")
+                return None
+        if t.is_alive():
+            self._log(f"Per-image removal timed out after {self.REMOVAL_TIMEOUT_SEC}s; skipping AI for this image")
+            return None
+        if error_container["err"]:
+            return None
+        return result_container["data"]
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return self._last_error
+
+    @property
+    def has_session(self) -> bool:
+        return self._session is not None
+
+    def release(self):
+        """Drop the session so its model memory can be freed; the next use re-creates it."""
+        with self._session_lock:
+            if self._session is not None:
+                self._log("Releasing AI session")
+            self._session = None
+            self._init_attempted = False
+            self._init_failed = False
+
+class AISessionPool:
+    """Fixed set of AIManager instances so concurrent workers each run on their own warm session."""
+
+    def __init__(self, size: int = 1, threads: int = 0, providers: Optional[list[str]] = None):
+        self._managers = [AIManager(threads, providers) for _ in range(max(1, size))]
+        self._available: queue.Queue = queue.Queue()
+        for manager in self._managers:
+            self._available.put(manager)
+
+    @property
+    def size(self) -> int:
+        return len(self._managers)
+
+    @property
+    def warm_count(self) -> int:
+        return sum(1 for m in self._managers if m.has_session)
+
+    @property
+    def last_error(self) -> Optional[str]:
+        for manager in self._managers:
+            if manager.last_error:
+                return manager.last_error
+        return None
+
+    def warm(self) -> int:
+        """Create every session up front; returns how many are ready."""
+        for manager in self._managers:
+            manager.get_session()
+        return self.warm_count
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Borrow a manager for one image; raises queue.Empty if none frees up within timeout."""
+        manager = self._available.get(timeout=timeout)
+        try:
+            yield manager
+        finally:
+            self._available.put(manager)
+
+@dataclass(frozen=True)
+class ConversionSettings:
+    """Snapshot of the Settings tab values used for one conversion."""
+    output_width: int = 500
+    output_height: int = 500
+    output_format: str = "WebP"
+    quality: int = 85
+    remove_background: bool = False
+    memory_budget_mp: int = 0  # Bounded-memory mode when > 0: megapixels decoded at once across workers
+    keep_animation: bool = True  # Animated GIF/APNG/WebP in, animated WebP/APNG out
+    animation_max_fps: float = 0.0  # 0 = keep source timing
+    animation_max_frames: int = 0  # 0 = keep every frame
+    animation_remove_background: bool = False  # Run AI on animated frames too (masks reused when frames barely change)
+    png_compression: str = DEFAULT_PNG_EFFORT  # 'fast', 'balanced' or 'max' zlib effort
+    png_palette_colors: int = 0  # > 0: lossy palette quantization (alpha kept); 0 = lossless reductions only
+    ai_precheck: bool = True  # Skip AI for sources that are already cut out or sit on a flat backdrop
+    output_naming: str = DEFAULT_OUTPUT_NAMING  # 'stem', 'keep_ext' or 'hash' (see output_layout)
+    output_shard_depth: int = 0  # > 0: outputs go under that many levels of hash-prefix subfolders
+    output_manifest: bool = False  # Batches append source -> output lines to shh_manifest.jsonl in dest
+    resize_backend: str = DEFAULT_RESIZE_BACKEND  # 'auto', 'pillow' or 'opencv' (see resize_backend)
+    apply_exif_orientation: bool = True  # Turn phone photos upright from their EXIF tag (see exif_orientation)
+    canvas_cache_mb: int = 0  # > 0: keep finished canvases on disk up to this size (see canvas_cache)
+    canvas_cache_dir: str = ""  # "" = the per-user default cache folder
+    dedup_pixel_level: bool = False  # With deduplication, also match the same pixels saved differently (decodes)
+    png_report_savings: bool = False  # Diagnostics: re-encode each PNG with Pillow defaults to measure bytes saved
+
+    @classmethod
+    def from_config(cls, settings: dict) -> "ConversionSettings":
+        """Build settings from config.json-style keys, falling back to defaults."""
+        return cls(
+            output_width=max(1, int(settings.get("output_width", 500))),
+            output_height=max(1, int(settings.get("output_height", 500))),
+            output_format=settings.get("output_format", "WebP"),
+            quality=int(settings.get("quality", 85)),
+            remove_background=bool(settings.get("remove_background", False)),
+            memory_budget_mp=max(0, int(settings.get("memory_budget_mp", 0))),
+            keep_animation=bool(settings.get("keep_animation", True)),
+            animation_max_fps=max(0.0, float(settings.get("animation_max_fps", 0.0))),
+            animation_max_frames=max(0, int(settings.get("animation_max_frames", 0))),
+            animation_remove_background=bool(settings.get("animation_remove_background", False)),
+            png_compression=settings.get("png_compression", DEFAULT_PNG_EFFORT)
+            if settings.get("png_compression") in PNG_EFFORT_LEVELS else DEFAULT_PNG_EFFORT,
+            png_palette_colors=min(256, max(0, int(settings.get("png_palette_colors", 0)))),
+            ai_precheck=bool(settings.get("ai_precheck", True)),
+            output_naming=settings.get("output_naming", DEFAULT_OUTPUT_NAMING)
+            if settings.get("output_naming") in OUTPUT_NAMING_MODES else DEFAULT_OUTPUT_NAMING,
+            output_shard_depth=min(MAX_SHARD_DEPTH, max(0, int(settings.get("output_shard_depth", 0)))),
+            output_manifest=bool(settings.get("output_manifest", False)),
+            resize_backend=settings.get("resize_backend", DEFAULT_RESIZE_BACKEND)
+            if settings.get("resize_backend") in RESIZE_BACKENDS else DEFAULT_RESIZE_BACKEND,
+            apply_exif_orientation=bool(settings.get("apply_exif_orientation", True)),
+            canvas_cache_mb=max(0, int(settings.get("canvas_cache_mb", 0))),
+            canvas_cache_dir=str(settings.get("canvas_cache_dir", "")),
+            dedup_pixel_level=bool(settings.get("dedup_pixel_level", False)),
+            png_report_savings=bool(settings.get("png_report_savings", False)),
+        )
+
+    @property
+    def output_extension(self) -> str:
+        return self.output_format.lower()
+
+    def save_params(self) -> dict:
+        if self.output_format in ['WebP', 'JPEG']:
+            return {'quality': self.quality}
+        if self.output_format == "PNG":
+            return png_save_params(self.png_compression)
+        return {}
+
+    def fingerprint(self) -> str:
+        """Short stable hash of every setting that affects output bytes."""
+        values = {k: v for k, v in asdict(self).items() if k not in RUNTIME_ONLY_SETTINGS}
+        payload = json.dumps(values, sort_keys=True).encode("utf-8")
+        return hashlib.sha1(payload).hexdigest()[:16]
+
+    def canvas_fingerprint(self) -> str:
+        """Short stable hash of the settings that shape the canvas process_image() returns."""
+        values = {k: v for k, v in asdict(self).items()
+                  if k not in RUNTIME_ONLY_SETTINGS and k not in ENCODE_ONLY_SETTINGS}
+        values["output_format"] = self.output_format == "PNG"  # Only PNG keeps a transparent canvas
+        values["memory_budget_mp"] = bool(self.memory_budget_mp)  # Any budget turns on reduced decoding
+        payload = json.dumps(values, sort_keys=True).encode("utf-8")
+        return hashlib.sha1(payload).hexdigest()[:16]
+
+    def canvas_cache(self) -> Optional[CanvasCache]:
+        """The process-wide cache these settings select, or None when caching is off."""
+        if not self.canvas_cache_mb:
+            return None
+        return shared_canvas_cache(self.canvas_cache_dir or default_cache_dir(), self.canvas_cache_mb * 1_000_000)
+
+def load_config(config_file: str = "config.json") -> dict:
+    """Read config.json; a missing file yields an empty dict (defaults apply)."""
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, 'r') as f:
+        return json.load(f)
+
+def is_supported_image(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+def scan_image_files(source: str) -> tuple[list[str], dict[str, str]]:
+    """(convertible file names, {rejected name: reason}) for a source folder (non-recursive).
+
+    Candidates are files with an image extension in any case, or no extension; each
+    is classified by its header bytes, so corrupt and mislabelled files never reach a worker.
+    """
+    with os.scandir(source) as entries:
+        names = [entry.name for entry in entries if is_candidate_name(entry.name) and entry.is_file()]
+    accepted, rejected = classify_files(source, names)
+    for name, reason in sorted(rejected.items()):
+        print(f"[SNIFF] Rejected {name}: {reason}")
+    return accepted, rejected
+
+def list_image_files(source: str, sniff: bool = True) -> list[str]:
+    """List convertible file names in a source folder (non-recursive).
+
+    sniff=False trusts extensions only (no reads; used for the live preview).
+    """
+    if sniff:
+        return scan_image_files(source)[0]
+    return [f for f in os.listdir(source) if is_supported_image(f) and not f.startswith(".")]
+
+def output_path_for(image_path: str, dest: str, settings: ConversionSettings,
+                    name: Optional[str] = None) -> str:
+    """Output path for one source; name overrides the file name (see plan_output_names).
+
+    Hash naming reads the source to digest its content, so pass the full path then.
+    """
+    if name is None:
+        digest = content_digest(image_path) if settings.output_naming == "hash" else ""
+        name = output_name_for(image_path, settings.output_extension, settings.output_naming, digest)
+    return os.path.join(dest, shard_subdir(name, settings.output_shard_depth), name)
+
+def without_orientation(img: Image.Image) -> Image.Image:
+    """img, or a copy without EXIF, if it carries an orientation tag rembg would apply.
+
+    The pipeline works on stored pixel order; the old PNG handoff to rembg dropped EXIF
+    too, so masks always line up with the pixels they were computed from.
+    """
+    if "exif" not in img.info or img.getexif().get(ORIENTATION_TAG, 1) == 1:
+        return img
+    stripped = img.copy()
+    stripped.info.pop("exif", None)
+    return stripped
+
+def cutout_from_mask(img: Image.Image, mask: Image.Image) -> Image.Image:
+    """RGBA cut-out exactly as rembg builds it (naive cutout: colour fades out with the mask)."""
+    return Image.composite(img.convert("RGBA"), Image.new("RGBA", img.size, 0), mask)
+
+def apply_background_removal(img: Image.Image, ai_manager: AIManager, name: str = "",
+                             cancel_event: Optional[threading.Event] = None) -> Image.Image:
+    """Run AI background removal; returns the original image if AI is unavailable or fails.
+
+    ai_manager may be an AIManager or an ai_process_pool.AIProcessPool; either takes
+    the decoded image directly.
+    """
+    try:
+        session = ai_manager.get_session()
+        if session is None:
+            print(f"Warning: Background removal session not available for {name} (init failed or timed out)")
+            return img
+
+        # Timed background removal (won't hang indefinitely)
+        cutout = ai_manager.remove_background(without_orientation(img), cancel_event)
+        if cutout is not None:
+            return cutout
+        if ai_manager.last_error:
+            print(f"Warning: AI skip for {name}: {ai_manager.last_error}")
+        else:
+            print(f"Warning: Background removal failed or timed out for {name}")
+    except Exception as e:
+        print(f"Background removal failed for {name}: {e}\n{traceback.format_exc()}")
+    return img
+
+def process_image(img: Image.Image, settings: ConversionSettings,
+                  ai_manager: Optional[AIManager] = None, name: str = "",
+                  timings: Optional[dict] = None,
+                  cancel_event: Optional[threading.Event] = None,
+                  resample: Image.Resampling = Image.Resampling.LANCZOS,
+                  output_stats: Optional[dict] = None, orientation: int = 1) -> Image.Image:
+    """Apply background removal, transparency handling, scaling and letterboxing.
+
+    Returns the final canvas of exactly output_width x output_height, ready to save.
+    If timings is given, seconds spent in AI are added under 'ai'. If output_stats is
+    given, 'ai_route' records how the background was removed ('ai', 'alpha' or 'flat';
+    render_file() adds 'cache') and 'ai_fallback' is set when AI was due but unavailable
+    or failed. img is in stored pixel order; orientation (an EXIF tag value) is applied
+    to the resized image, so the transpose costs output-sized work only.
+    """
+    width = settings.output_width
+    height = settings.output_height
+    output_format = settings.output_format
+    img_original_mode = img.mode
+    ai_failed = False
+
+    # Apply background removal if enabled; the pre-check sends easy sources down a cheap path
+    if settings.remove_background:
+        check = analyze_background(img) if settings.ai_precheck else None
+        route = check.route if check is not None else "ai"
+        if route == "flat":
+            img = apply_colour_key(img, check.key_colour)
+        elif route == "ai" and ai_manager is not None:
+            ai_start = time.perf_counter()
+            cutout = apply_background_removal(img, ai_manager, name, cancel_event)
+            ai_failed = cutout is img
+            img = cutout
+            if timings is not None:
+                timings["ai"] = timings.get("ai", 0.0) + time.perf_counter() - ai_start
+        if output_stats is not None:
+            output_stats["ai_route"] = route
+            if route == "ai" and (ai_manager is None or ai_failed):
+                output_stats["ai_fallback"] = True  # Background kept; not a canvas worth caching
+
+    # Handle transparency
+    if settings.remove_background:
+        # For background removal, handle transparency based on output format
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+
+        # If output format is not PNG, apply white background
+        if output_format != "PNG":
+            white_background = Image.new("RGB", img.size, (255, 255, 255))
+            white_background.paste(img, mask=img)
+            img = white_background
+    else:
+        # Normal transparency handling for non-background-removed images
+        if output_format == "PNG" and img_original_mode in ('RGBA', 'LA', 'P'):
+            img = img.convert("RGBA")
+        else:
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                background_for_flattening = Image.new("RGB", img.size, (255, 255, 255))
+                img_rgba = img.convert("RGBA")
+                background_for_flattening.paste(img_rgba, mask=img_rgba)
+                img_rgba.close()
+                img = background_for_flattening
+            else:
+                img = img.convert('RGB')
+
+    # Calculate scaling to fit within target dimensions while maintaining aspect ratio;
+    # a 90-degree orientation turns the stored image, so it is fitted against the swapped box
+    img_width, img_height = img.size
+    fit_width, fit_height = (height, width) if swaps_axes(orientation) else (width, height)
+    scale_factor = min(fit_width / img_width, fit_height / img_height)
+
+    # Only resize if we need to scale (either up or down)
+    if scale_factor != 1.0:
+        new_width = int(img_width * scale_factor)
+        new_height = int(img_height * scale_factor)
+        img = resize_image(img, (new_width, new_height), resample, settings.resize_backend)
+    img = apply_orientation(img, orientation)
+
+    # Create appropriate background based on output format and transparency
+    if output_format == "PNG" and (settings.remove_background or img.mode == 'RGBA'):
+        background = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    else:
+        background = Image.new('RGB', (width, height), (255, 255, 255))
+
+    paste_x = (width - img.width) // 2
+    paste_y = (height - img.height) // 2
+
+    # Use appropriate paste method for transparency
+    if img.mode == 'RGBA' and background.mode == 'RGBA':
+        background.paste(img, (paste_x, paste_y), img)
+    else:
+        background.paste(img, (paste_x, paste_y))
+    return background
+
+def prepare_output(image: Image.Image, settings: ConversionSettings) -> Image.Image:
+    """Last step before encoding: PNG output is reduced to its smallest mode (see png_optimizer)."""
+    if settings.output_format == "PNG":
+        return reduce_png(image, settings.png_palette_colors)
+    return image
+
+def encode_image(image: Image.Image, settings: ConversionSettings, **save_kwargs) -> bytes:
+    if not save_kwargs.get("save_all"):
+        image = prepare_output(image, settings)
+    buffer = BytesIO()
+    image.save(buffer, settings.output_format, **{**settings.save_params(), **save_kwargs})
+    return buffer.getvalue()
+
+def keeps_animation(img: Image.Image, settings: ConversionSettings) -> bool:
+    return settings.keep_animation and settings.output_format in ANIMATED_OUTPUT_FORMATS and is_animated(img)
+
+def render_animation(img: Image.Image, settings: ConversionSettings,
+                     ai_manager: Optional[AIManager] = None, name: str = "",
+                     timings: Optional[dict] = None,
+                     control: Optional["JobControl"] = None) -> tuple[list[Image.Image], list[int]]:
+    """Process the kept frames of an animated source into output canvases and durations (ms).
+
+    Source frames are decoded and processed one at a time; only output-sized canvases
+    are kept for the encoder. Consecutive frames that end up identical are merged.
+    """
+    cancel_event = control.abort_event if control is not None else None
+    use_ai = settings.remove_background and settings.animation_remove_background and ai_manager is not None
+    # Frames that went through AI follow the background-removal transparency rules; others the normal ones
+    frame_settings = replace(settings, remove_background=use_ai)
+    masks = FrameMaskCache(lambda frame: apply_background_removal(frame, ai_manager, name, cancel_event)) \
+        if use_ai else None
+
+    def _canvases():
+        for frame, duration in iter_frames(img, settings.animation_max_fps, settings.animation_max_frames):
+            if control is not None:
+                control.check_abort()
+            if masks is not None:
+                ai_start = time.perf_counter()
+                frame = masks.apply(frame)
+                if timings is not None:
+                    timings["ai"] = timings.get("ai", 0.0) + time.perf_counter() - ai_start
+            yield process_image(frame, frame_settings, None, name), duration
+
+    frames, durations = [], []
+    for canvas, duration in merge_identical_frames(_canvases()):
+        frames.append(canvas)
+        durations.append(duration)
+    if masks is not None:
+        print(f"[ANIM] {name}: {masks.inferences} AI inferences, {masks.reused} masks reused")
+    return frames, durations
+
+def animation_save_params(frames: list[Image.Image], durations: list[int],
+                          settings: ConversionSettings, loop: int = 0) -> dict:
+    """Extra save() arguments for writing frames[0] as an animation (empty for a single frame)."""
+    if len(frames) < 2:
+        return {}
+    params = {"save_all": True, "append_images": frames[1:], "duration": durations, "loop": loop}
+    if settings.output_format == "PNG":
+        params["blend"] = 0  # APNG_BLEND_OP_SOURCE: every frame is a full canvas that replaces the last
+    return params
+
+def encode_animation(frames: list[Image.Image], durations: list[int],
+                     settings: ConversionSettings, loop: int = 0) -> bytes:
+    return encode_image(frames[0], settings, **animation_save_params(frames, durations, settings, loop))
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job is aborted mid-file."""
+
+class UndecodableInput(ValueError):
+    """The source bytes are not a decodable image (a bad input, not a conversion failure)."""
+
+class JobControl:
+    """Pause/cancel switches shared between the UI thread and batch workers.
+
+    cancel() stops feeding new files and lets in-flight files finish; with
+    abort_in_flight they stop at the next stage boundary (or AI wait) instead,
+    and nothing is written for them.
+    """
+    POLL_SEC = 0.1
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+        self.abort_event = threading.Event()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self, abort_in_flight: bool = False):
+        self._cancelled.set()
+        if abort_in_flight:
+            self.abort_event.set()
+        self._running.set()  # Wake paused workers so they can exit
+
+    @property
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def wait_while_paused(self) -> bool:
+        """Block while paused; returns False once the job has been cancelled."""
+        while not self._running.wait(self.POLL_SEC):
+            pass
+        return not self._cancelled.is_set()
+
+    def check_abort(self):
+        if self.abort_event.is_set():
+            raise JobCancelled()
+
+class MemoryBudget:
+    """Caps the decoded pixels in flight across worker threads.
+
+    An image larger than the whole budget is still admitted, but only once nothing else
+    holds a reservation, so it runs alone instead of failing.
+    """
+
+    def __init__(self, max_pixels: int):
+        self.max_pixels = max(1, max_pixels)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @contextmanager
+    def reserve(self, pixels: int):
+        pixels = min(max(1, pixels), self.max_pixels)
+        with self._cond:
+            while self._in_use and self._in_use + pixels > self.max_pixels:
+                self._cond.wait()
+            self._in_use += pixels
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= pixels
+                self._cond.notify_all()
+
+def _fit_scale(size: tuple[int, int], settings: ConversionSettings, orientation: int = 1) -> float:
+    """Resize factor for stored pixels of this size; the box is swapped for 90-degree orientations."""
+    width, height = settings.output_width, settings.output_height
+    if swaps_axes(orientation):
+        width, height = height, width
+    return min(width / size[0], height / size[1])
+
+def _orientation_for(img: Image.Image, settings: ConversionSettings) -> int:
+    return read_orientation(img) if settings.apply_exif_orientation else 1
+
+def _plan_reduced_decode(img: Image.Image, settings: ConversionSettings, orientation: int = 1):
+    """In bounded-memory mode, ask the JPEG decoder for a DCT-scaled image before loading.
+
+    The request keeps at least 2x the final fitted size so the LANCZOS pass still has detail.
+    """
+    if not settings.memory_budget_mp or img.format != 'JPEG':
+        return
+    scale = _fit_scale(img.size, settings, orientation)
+    if scale >= 0.5:
+        return
+    target = (max(1, math.ceil(img.size[0] * scale * 2)), max(1, math.ceil(img.size[1] * scale * 2)))
+    img.draft(img.mode, target)
+
+def _decode_for_processing(img: Image.Image, settings: ConversionSettings, orientation: int = 1) -> Image.Image:
+    """Load pixels; in bounded-memory mode shrink by an integer factor right away so the
+    full-resolution buffer can be released before AI, flattening and resizing."""
+    try:
+        img.load()
+    except Exception as e:  # Truncated or corrupt pixel data behind a valid header
+        raise UndecodableInput(f"cannot decode image: {e}") from e
+    if not settings.memory_budget_mp or img.mode not in ("L", "LA", "RGB", "RGBA"):
+        return img
+    factor = int(1 / (2 * _fit_scale(img.size, settings, orientation)))
+    if factor < 2:
+        return img
+    premultiplied = PREMULTIPLIED_MODES.get(img.mode)
+    if premultiplied is None:
+        return img.reduce(factor)
+    # Box-average premultiplied, as resize_backend does: colour hidden under fully
+    # transparent pixels must not bleed into the cut-out's edges
+    return img.convert(premultiplied).reduce(factor).convert(img.mode)
+
+def convert_bytes(data: bytes, settings: ConversionSettings,
+                  ai_manager: Optional[AIManager] = None, name: str = "",
+                  timings: Optional[dict] = None, control: Optional[JobControl] = None,
+                  budget: Optional[MemoryBudget] = None, output_stats: Optional[dict] = None) -> bytes:
+    """Convert encoded image bytes in memory; raises UndecodableInput for bytes that are not an image.
+
+    timings, control, budget and output_stats work as for convert_file().
+    """
+    try:
+        img = Image.open(BytesIO(data))
+    except Exception as e:
+        raise UndecodableInput(f"cannot identify image: {e}") from e
+    with img:
+        return _convert_opened(img, settings, ai_manager, name, timings, control, budget, output_stats,
+                               reduced_decode=True)
+
+def convert_image(img: Image.Image, settings: ConversionSettings,
+                  ai_manager: Optional[AIManager] = None, name: str = "",
+                  timings: Optional[dict] = None, control: Optional[JobControl] = None,
+                  budget: Optional[MemoryBudget] = None, output_stats: Optional[dict] = None) -> bytes:
+    """convert_bytes() for an opened or already decoded image; img itself is left untouched.
+
+    An unloaded img is loaded at full size (never drafted), so the caller keeps its
+    full-resolution pixels; use convert_bytes() for DCT-scaled bounded-memory decodes.
+    """
+    return _convert_opened(img, settings, ai_manager, name, timings, control, budget, output_stats,
+                           reduced_decode=False)
+
+def _convert_opened(img: Image.Image, settings: ConversionSettings, ai_manager: Optional[AIManager],
+                    name: str, timings: Optional[dict], control: Optional[JobControl],
+                    budget: Optional[MemoryBudget], output_stats: Optional[dict], reduced_decode: bool) -> bytes:
+    timings = timings if timings is not None else {}
+    if keeps_animation(img, settings):
+        frames, durations = _render_animated(img, settings, ai_manager, name, budget, timings, control)
+        image, save_kwargs = frames[0], animation_save_params(frames, durations, settings, img.info.get("loop", 0))
+    else:
+        image = _render_opened(img, settings, ai_manager, name, budget, timings, control, output_stats,
+                               reduced_decode)
+        save_kwargs = {}
+    if control is not None:
+        control.check_abort()
+    stage_start = time.perf_counter()
+    encoded = encode_image(image, settings, **save_kwargs)
+    timings["encode"] = time.perf_counter() - stage_start
+    return encoded
+
+def atomic_save(image: Image.Image, output_path: str, settings: ConversionSettings,
+                output_stats: Optional[dict] = None, **save_kwargs):
+    """Write to a temp file next to output_path and rename it into place.
+
+    A crash mid-write leaves only a TEMP_PREFIX file behind, never a truncated output.
+    save_kwargs are passed to Image.save() on top of the settings' own parameters.
+    If output_stats is given and settings.png_report_savings is on, PNG output stores
+    'png_bytes_saved' versus a plain Pillow save. Measuring costs a second encode, so it is opt-in.
+    """
+    final = image if save_kwargs.get("save_all") else prepare_output(image, settings)
+    _write_atomically(output_path,
+                      lambda f: final.save(f, settings.output_format, **{**settings.save_params(), **save_kwargs}))
+    if output_stats is not None and settings.output_format == "PNG" and settings.png_report_savings:
+        if final is image and settings.png_compression == DEFAULT_PNG_EFFORT:
+            output_stats["png_bytes_saved"] = 0  # Identical to a plain save; skip the baseline encode
+        else:
+            output_stats["png_bytes_saved"] = max(0, default_png_size(image) - os.path.getsize(output_path))
+
+def atomic_write_bytes(data: bytes, output_path: str):
+    """atomic_save() for output that is already encoded."""
+    _write_atomically(output_path, lambda f: f.write(data))
+
+def _write_atomically(output_path: str, write: Callable):
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)  # Shard folders are created on first use
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def remove_stale_partials(dest: str, shard_depth: int = 0, prefix: str = TEMP_PREFIX) -> int:
+    """Delete temp files left by a previous crashed run; returns how many were removed.
+
+    With shard_depth > 0 the shard subfolders down to that depth are cleaned too.
+    prefix narrows the match (archive_partial_prefix() for one archive's temp file).
+    """
+    removed = 0
+    try:
+        entries = list(os.scandir(dest))
+    except OSError:
+        return 0
+    for entry in entries:
+        if entry.name.startswith(prefix):
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        elif shard_depth > 0 and len(entry.name) == 2 and entry.is_dir():
+            removed += remove_stale_partials(entry.path, shard_depth - 1, prefix)
+    return removed
+
+def render_file(image_path: str, settings: ConversionSettings,
+                ai_manager: Optional[AIManager] = None, budget: Optional[MemoryBudget] = None,
+                timings: Optional[dict] = None, control: Optional[JobControl] = None,
+                output_stats: Optional[dict] = None) -> Image.Image:
+    """Decode and process one file into its final canvas (everything except encoding).
+
+    If timings is given, per-stage seconds are stored under 'decode', 'ai' and 'process',
+    or under 'cache' when the canvas comes from the canvas cache. With a control, an
+    abort raises JobCancelled between stages. output_stats is passed to process_image.
+    """
+    timings = timings if timings is not None else {}
+    cache = settings.canvas_cache()
+    if cache is not None:
+        stage_start = time.perf_counter()
+        canvas = cache.get(image_path, settings.canvas_fingerprint())
+        if canvas is not None:
+            timings["cache"] = time.perf_counter() - stage_start
+            if settings.remove_background and output_stats is not None:
+                output_stats["ai_route"] = "cache"  # Counted with the other inferences avoided
+            return canvas
+    output_stats = output_stats if output_stats is not None else {}
+    with Image.open(image_path) as img:
+        canvas = _render_opened(img, settings, ai_manager, os.path.basename(image_path), budget,
+                                timings, control, output_stats)
+    if cache is not None and not output_stats.get("ai_fallback"):
+        cache.put(image_path, settings.canvas_fingerprint(), canvas)
+    return canvas
+
+def _render_opened(img: Image.Image, settings: ConversionSettings, ai_manager: Optional[AIManager],
+                   name: str, budget: Optional[MemoryBudget], timings: dict,
+                   control: Optional[JobControl], output_stats: Optional[dict],
+                   reduced_decode: bool = True) -> Image.Image:
+    """render_file() for an already opened still image.
+
+    reduced_decode lets bounded-memory mode draft() img; only pass it for images opened here.
+    """
+    cancel_event = control.abort_event if control is not None else None
+    # Orientation, decode scale and target box are planned together from the header alone
+    orientation = _orientation_for(img, settings)
+    if reduced_decode:
+        _plan_reduced_decode(img, settings, orientation)
+    pixels = img.size[0] * img.size[1]
+    with budget.reserve(pixels) if budget is not None else nullcontext():
+        stage_start = time.perf_counter()
+        work = _decode_for_processing(img, settings, orientation)
+        timings["decode"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        try:
+            if control is not None:
+                control.check_abort()
+            background = process_image(work, settings, ai_manager, name, timings, cancel_event,
+                                       output_stats=output_stats, orientation=orientation)
+        finally:
+            if work is not img:
+                work.close()
+        timings["process"] = time.perf_counter() - stage_start - timings.get("ai", 0.0)
+    # Source buffers are released here; only the output-sized canvas is returned
+    return background
+
+def convert_file(image_path: str, dest: str, settings: ConversionSettings,
+                 ai_manager: Optional[AIManager] = None, budget: Optional[MemoryBudget] = None,
+                 timings: Optional[dict] = None, control: Optional[JobControl] = None,
+                 output_stats: Optional[dict] = None, output_path: Optional[str] = None) -> str:
+    """Convert one file into dest; returns the output path. Raises on unreadable input.
+
+    If timings is given, per-stage seconds are stored under 'decode', 'ai', 'process' and 'encode'.
+    With a control, an abort raises JobCancelled between stages; no output is written.
+    output_stats collects the AI route (see process_image) and PNG bytes saved (see atomic_save).
+    output_path overrides output_path_for() (batches pass their collision-free plan).
+    """
+    timings = timings if timings is not None else {}
+    output_path = output_path or output_path_for(image_path, dest, settings)
+    with Image.open(image_path) as img:
+        if keeps_animation(img, settings):
+            return _convert_animated_file(img, output_path, settings, ai_manager, budget, timings, control)
+    background = render_file(image_path, settings, ai_manager, budget, timings, control, output_stats)
+    if control is not None:
+        control.check_abort()
+    stage_start = time.perf_counter()
+    atomic_save(background, output_path, settings, output_stats)
+    timings["encode"] = time.perf_counter() - stage_start
+    return output_path
+
+def _convert_animated_file(img: Image.Image, output_path: str, settings: ConversionSettings,
+                           ai_manager: Optional[AIManager], budget: Optional[MemoryBudget],
+                           timings: dict, control: Optional[JobControl]) -> str:
+    """convert_file() for animated sources; decode time is included under 'process'."""
+    name = os.path.basename(img.filename or output_path)
+    frames, durations = _render_animated(img, settings, ai_manager, name, budget, timings, control)
+    if control is not None:
+        control.check_abort()
+    stage_start = time.perf_counter()
+    atomic_save(frames[0], output_path, settings,
+                **animation_save_params(frames, durations, settings, img.info.get("loop", 0)))
+    timings["encode"] = time.perf_counter() - stage_start
+    return output_path
+
+def _render_animated(img: Image.Image, settings: ConversionSettings, ai_manager: Optional[AIManager],
+                     name: str, budget: Optional[MemoryBudget], timings: dict,
+                     control: Optional[JobControl]) -> tuple[list[Image.Image], list[int]]:
+    """render_animation() under the memory budget; decode time is included under 'process'."""
+    # One source frame is decoded at a time, so that is what the memory budget has to cover
+    with budget.reserve(img.size[0] * img.size[1]) if budget is not None else nullcontext():
+        stage_start = time.perf_counter()
+        frames, durations = render_animation(img, settings, ai_manager, name, timings, control)
+        timings["process"] = time.perf_counter() - stage_start - timings.get("ai", 0.0)
+    return frames, durations
+
+def render_preview_draft(img: Image.Image, settings: ConversionSettings,
+                         box: tuple[int, int]) -> Image.Image:
+    """Cheap approximation of the output canvas, composited directly at display size.
+
+    Skips AI and works on an already reduced image; the layout and transparency rules
+    are the same as process_image so the refined preview only adds detail.
+    """
+    scale = min(box[0] / settings.output_width, box[1] / settings.output_height, 1.0)
+    display = replace(settings,
+                      output_width=max(1, round(settings.output_width * scale)),
+                      output_height=max(1, round(settings.output_height * scale)))
+    return process_image(img, display, None, resample=Image.Resampling.BILINEAR,
+                         orientation=_orientation_for(img, settings))
+
+@dataclass
+class BatchSummary:
+    """Outcome of one convert_batch() run."""
+    total: int = 0
+    converted: int = 0
+    skipped: int = 0
+    resumed: int = 0  # Already done in an earlier, interrupted run of the same job
+    deduplicated: int = 0  # Filled from an identical source instead of being converted
+    dedup_bytes_saved: int = 0
+    png_bytes_saved: int = 0  # Output bytes saved by the PNG optimizer versus a plain Pillow save
+    ai_inferences: int = 0  # Files sent to the AI model
+    ai_inferences_avoided: int = 0  # Files done without AI: existing alpha, flat backdrop or a cached canvas
+    rejected: int = 0  # Not a supported image by its header bytes; never sent to a worker (also in failed_files)
+    cancelled: bool = False
+    not_processed: int = 0  # Never started, or aborted mid-file, because the job was cancelled
+    failed_files: list[str] = field(default_factory=list)
+
+def run_bounded(func: Callable, items: Iterable, workers: int, window: Optional[int] = None) -> Iterator:
+    """Yield func(item) results in completion order with at most `window` tasks submitted.
+
+    Keeps memory flat for huge batches instead of creating one future per file up front.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+    window = window or workers * 2
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert") as pool:
+        for item in items:
+            pending.add(pool.submit(func, item))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+class BatchRun:
+    """One batch job split into per-file steps.
+
+    convert_batch() drives a run on its own thread pool; job_queue.JobScheduler
+    interleaves tasks from several runs on a shared one. With workers > 1, tasks
+    come largest first and small files are chunked (see batch_planner).
+    convert_task() is safe to call from any worker thread; record() serialises
+    summary and channel updates.
+    """
+
+    def __init__(self, source: str, dest: str, settings: ConversionSettings,
+                 ai_manager: Optional[AIManager] = None, resume: bool = True,
+                 deduplicate: bool = False, use_hardlinks: bool = True,
+                 channel: Optional[ProgressChannel] = None, control: Optional[JobControl] = None,
+                 progress: Optional[Callable[[int, int, str], None]] = None, workers: int = 1):
+        self.source = source
+        self.dest = dest
+        self.settings = settings
+        self.ai_manager = ai_manager
+        self.use_hardlinks = use_hardlinks
+        self.channel = channel
+        self.control = control
+        self.progress = progress
+        self.budget = MemoryBudget(settings.memory_budget_mp * 1_000_000) if settings.memory_budget_mp else None
+        self.journal: Optional[ConversionJournal] = None
+        self.manifest: Optional[OutputManifest] = None
+        self.dedup_plan = None
+        self.output_names: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.finished = 0
+        self._open_destination(resume)
+        self._plan(deduplicate, workers)
+
+    def _open_destination(self, resume: bool):
+        """Prepare dest: clear stale temp files, open the journal and manifest."""
+        os.makedirs(self.dest, exist_ok=True)
+        remove_stale_partials(self.dest, self.settings.output_shard_depth)
+        self.journal = ConversionJournal(self.dest, self.settings.fingerprint()) if resume else None
+        self.manifest = OutputManifest(self.dest) if self.settings.output_manifest else None
+
+    def _plan(self, deduplicate: bool, workers: int):
+        """List the source and set summary, output_names, dedup_plan and the task plan."""
+        image_files, rejected = scan_image_files(self.source)
+        self.summary = BatchSummary(total=len(image_files), rejected=len(rejected),
+                                    failed_files=sorted(rejected))
+        self.output_names = plan_output_names(image_files, self.settings.output_extension,
+                                              self.settings.output_naming)
+        self.dedup_plan = (plan_deduplication(self.source, image_files, self.settings.dedup_pixel_level)
+                           if deduplicate else None)
+        to_convert = image_files
+        if self.dedup_plan is not None and self.dedup_plan.duplicates:
+            skipped = self.dedup_plan.skipped_files()
+            to_convert = [name for name in image_files if name not in skipped]
+        self._pending = iter(plan_batch(self.source, to_convert, workers, self._journaled(to_convert, workers)))
+
+    def _journaled(self, names: list[str], workers: int) -> set[str]:
+        """Names the journal already records as done, so planning skips their header reads."""
+        if self.journal is None or workers <= 1:
+            return set()  # A single worker plans without reading headers anyway
+        done = set()
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.source, name))
+            except OSError:
+                continue
+            if self.journal.is_complete(name, st.st_size, st.st_mtime_ns):
+                done.add(name)
+        return done
+
+    def start(self):
+        if self.channel is not None:
+            self.channel.publish(ProgressEvent("started", payload=self.summary.total))
+
+    def next_task(self) -> Optional[list[str]]:
+        """Next files to convert together, or None once the plan is exhausted or the job is cancelled."""
+        if self.control is not None and self.control.is_cancelled:
+            return None
+        with self._lock:
+            return next(self._pending, None)
+
+    def convert_task(self, names: list[str]) -> list[ProgressEvent]:
+        """convert_one() for each file of a task; a cancel skips the rest of the chunk."""
+        events = []
+        for name in names:
+            if events and self.control is not None and self.control.is_cancelled:
+                events.append(ProgressEvent("cancelled", name))
+            else:
+                events.append(self.convert_one(name))
+        return events
+
+    def output_path(self, filename: str) -> str:
+        return output_path_for(os.path.join(self.source, filename), self.dest, self.settings,
+                               self.output_names.get(filename))
+
+    def _record_done(self, filename: str, st: os.stat_result, output_path: str,
+                     duplicate_of: Optional[str] = None):
+        if self.journal is not None:
+            self.journal.record(filename, st.st_size, st.st_mtime_ns, "done", output_path)
+        if self.manifest is not None:
+            self.manifest.record(filename, output_path, duplicate_of)
+
+    def _fill_duplicates(self, representative: str) -> list[ProgressEvent]:
+        events = []
+        rep_output = self.output_path(representative)
+        for name in self.dedup_plan.duplicates.get(representative, []):
+            image_path = os.path.join(self.source, name)
+            try:
+                st = os.stat(image_path)
+                if self.journal is not None and self.journal.is_complete(name, st.st_size, st.st_mtime_ns):
+                    events.append(ProgressEvent("resumed", name))
+                    continue
+                output_path = self.output_path(name)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                fill_duplicate(rep_output, output_path, self.use_hardlinks)
+                self._record_done(name, st, output_path, duplicate_of=representative)
+                events.append(ProgressEvent("deduplicated", name, bytes_in=st.st_size))
+            except Exception as e:
+                print(f"Skipping {name}: {e}")
+                events.append(ProgressEvent("skipped", name))
+        return events
+
+    def convert_one(self, filename: str) -> ProgressEvent:
+        image_path = os.path.join(self.source, filename)
+        try:
+            st = os.stat(image_path)
+            if self.journal is not None and self.journal.is_complete(filename, st.st_size, st.st_mtime_ns):
+                return ProgressEvent("resumed", filename)
+            timings: dict[str, float] = {}
+            output_stats: dict[str, int] = {}
+            output_path = convert_file(image_path, self.dest, self.settings, self.ai_manager, self.budget,
+                                       timings, self.control, output_stats, self.output_path(filename))
+            self._record_done(filename, st, output_path)
+            return ProgressEvent("converted", filename, bytes_in=st.st_size,
+                                 bytes_out=os.path.getsize(output_path), timings=timings,
+                                 bytes_saved=output_stats.get("png_bytes_saved", 0),
+                                 ai_route=output_stats.get("ai_route", ""))
+        except JobCancelled:
+            return ProgressEvent("cancelled", filename)
+        except Exception as e:
+            print(f"Skipping {filename}: {e}")
+            return ProgressEvent("skipped", filename)
+
+    def record(self, event: ProgressEvent):
+        """Fold one convert_one() result (plus any duplicates it fills) into the summary."""
+        if event.kind == "cancelled":
+            return
+        events = [event]
+        if self.dedup_plan is not None and event.name in self.dedup_plan.duplicates:
+            if event.kind == "skipped":
+                # Identical content would fail the same way
+                events += [ProgressEvent("skipped", name) for name in self.dedup_plan.duplicates[event.name]]
+            else:
+                events += self._fill_duplicates(event.name)
+        summary = self.summary
+        with self._lock:
+            for item in events:
+                if item.kind == "resumed":
+                    summary.resumed += 1
+                elif item.kind == "converted":
+                    summary.converted += 1
+                    summary.png_bytes_saved += item.bytes_saved
+                    if item.ai_route == "ai":
+                        summary.ai_inferences += 1
+                    elif item.ai_route:
+                        summary.ai_inferences_avoided += 1
+                elif item.kind == "deduplicated":
+                    summary.deduplicated += 1
+                    summary.dedup_bytes_saved += item.bytes_in
+                else:
+                    summary.skipped += 1
+                    summary.failed_files.append(item.name)
+                self.finished += 1
+                if self.channel is not None:
+                    self.channel.publish(item)
+                if self.progress is not None:
+                    self.progress(self.finished - 1, summary.total, item.name)
+
+    def finish(self) -> BatchSummary:
+        if self.journal is not None:
+            self.journal.close()
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.control is not None and self.control.is_cancelled:
+            self.summary.cancelled = True
+        self.summary.not_processed = self.summary.total - self.finished
+        return self.summary
+
+class ArchiveRun(BatchRun):
+    """A BatchRun whose source and/or destination is a ZIP/TAR archive (see archive_io).
+
+    A task is a read slot rather than a file name: convert_task() pulls the next
+    entry from the shared source, so the archive is read once and in order while
+    decoding and encoding run in parallel. Output names keep the entry's folders and
+    are claimed in archive order, so collisions resolve the same way on every run.
+    Resume works when the destination is a folder; deduplication and sharding do not
+    apply. A TAR source is not counted up front: summary.total grows as entries are read.
+    """
+
+    def __init__(self, source: str, dest: str, settings: ConversionSettings,
+                 ai_manager: Optional[AIManager] = None, resume: bool = True,
+                 channel: Optional[ProgressChannel] = None, control: Optional[JobControl] = None,
+                 progress: Optional[Callable[[int, int, str], None]] = None):
+        self.reader: Optional[ArchiveReader] = None
+        self.writer: Optional[ArchiveWriter] = None
+        self._manifest_lines: Optional[list[str]] = None
+        self._names: Optional[Iterator[str]] = None
+        super().__init__(source, dest, settings, ai_manager, resume, channel=channel, control=control,
+                         progress=progress)
+        self._taken: set[str] = set()
+        self._read_lock = threading.Lock()
+        self._exhausted = False
+        self.read_error: Optional[str] = None  # Set when the source stopped being readable mid-run
+
+    def _open_destination(self, resume: bool):
+        if not is_archive_path(self.dest):
+            super()._open_destination(resume)
+            return
+        # Only this archive's own leftovers; other jobs may be writing beside it
+        remove_stale_partials(os.path.dirname(os.path.abspath(self.dest)), prefix=archive_partial_prefix(self.dest))
+        self.writer = ArchiveWriter(self.dest)
+        self._manifest_lines = [] if self.settings.output_manifest else None
+
+    def _plan(self, deduplicate: bool, workers: int):
+        """Open the source; tasks are read slots, so there is nothing to plan up front."""
+        rejected: dict[str, str] = {}
+        if is_archive_path(self.source):
+            self.reader = ArchiveReader(self.source, is_candidate_name)
+            total = self.reader.count()
+        else:
+            names, rejected = scan_image_files(self.source)
+            names.sort()  # Same claim order as plan_output_names()
+            self._names = iter(names)
+            total = len(names)
+        self._counted = total is not None
+        self.summary = BatchSummary(total=total or 0, rejected=len(rejected), failed_files=sorted(rejected))
+
+    def next_task(self) -> Optional[list]:
+        """One read slot ([None]), or None once the source is exhausted or the job is cancelled."""
+        if self._exhausted or (self.control is not None and self.control.is_cancelled):
+            return None
+        return [None]
+
+    def convert_task(self, slots: list) -> list[ProgressEvent]:
+        """Read and convert one entry per slot; an unreadable entry fails alone.
+
+        Any other read error (a corrupt TAR stream) ends the run and is raised, so the
+        job fails and a destination archive is discarded rather than published short.
+        """
+        events = []
+        for _ in slots:
+            try:
+                claimed = self._next_entry()
+            except EntryReadError as e:
+                print(f"[ARCHIVE] Could not read {e}")
+                events.append(ProgressEvent("skipped", e.name))
+                continue
+            except Exception as e:
+                self._exhausted = True
+                self.read_error = str(e)
+                print(f"[ARCHIVE] Stopped reading {self.source}: {e}")
+                raise
+            if claimed is None:
+                self._exhausted = True
+                break
+            events.append(self.convert_entry(*claimed))
+        return events
+
+    def _already_done(self, entry: ArchiveEntry) -> bool:
+        return self.journal is not None and self.journal.is_complete(entry.name, entry.size, entry.mtime_ns)
+
+    def _next_entry(self) -> Optional[tuple[ArchiveEntry, str]]:
+        """The next source entry with its claimed output name; bytes are None for resumed entries.
+
+        Reading and claiming happen under one lock, so names are claimed in source order.
+        """
+        with self._read_lock:
+            if self.reader is not None:
+                entry = self.reader.next_entry(lambda item: not self._already_done(item))
+                if entry is not None and not self._counted:
+                    with self._lock:
+                        self.summary.total += 1
+            else:
+                name = next(self._names, None)
+                entry = None
+                if name is not None:
+                    path = os.path.join(self.source, name)
+                    try:
+                        st = os.stat(path)
+                        entry = ArchiveEntry(name, st.st_size, st.st_mtime_ns)
+                        if not self._already_done(entry):
+                            with open(path, 'rb') as f:
+                                entry.data = f.read()
+                    except OSError as e:  # Removed or locked since the scan
+                        raise EntryReadError(name, e) from e
+            if entry is None:
+                return None
+            digest = ""
+            if self.settings.output_naming == "hash":
+                if entry.data is None:
+                    return entry, ""  # Resumed; a content-hash name cannot collide with another source
+                digest = bytes_digest(entry.data)
+            name = claim_output_name(entry.name, self.settings.output_extension, self._taken,
+                                     self.settings.output_naming, digest)
+            return entry, name
+
+    def convert_entry(self, entry: ArchiveEntry, output_name: str) -> ProgressEvent:
+        if entry.data is None:
+            return ProgressEvent("resumed", entry.name)
+        if self.reader is not None and sniff_bytes(entry.data[:SNIFF_BYTES], entry.name) is None:
+            print(f"[SNIFF] Rejected {entry.name}: {'empty file' if not entry.data else 'not a supported image'}")
+            return ProgressEvent("skipped", entry.name)
+        try:
+            timings: dict[str, float] = {}
+            output_stats: dict[str, int] = {}
+            data = convert_bytes(entry.data, self.settings, self.ai_manager, entry.name, timings,
+                                 self.control, self.budget, output_stats)
+            if self.control is not None:
+                self.control.check_abort()
+            if self.writer is not None:
+                self.writer.add(output_name, data)
+                if self._manifest_lines is not None:
+                    with self._lock:
+                        self._manifest_lines.append(json.dumps(
+                            {"source": entry.name, "output": output_name, "bytes": len(data)}) + "\n")
+            else:
+                output_path = os.path.join(self.dest, *output_name.split("/"))
+                atomic_write_bytes(data, output_path)
+                if self.journal is not None:
+                    self.journal.record(entry.name, entry.size, entry.mtime_ns, "done", output_path)
+                if self.manifest is not None:
+                    self.manifest.record(entry.name, output_path)
+            return ProgressEvent("converted", entry.name, bytes_in=entry.size, bytes_out=len(data),
+                                 timings=timings, ai_route=output_stats.get("ai_route", ""))
+        except JobCancelled:
+            return ProgressEvent("cancelled", entry.name)
+        except Exception as e:
+            print(f"Skipping {entry.name}: {e}")
+            return ProgressEvent("skipped", entry.name)
+
+    def finish(self) -> BatchSummary:
+        summary = super().finish()
+        if self.reader is not None:
+            self.reader.close()
+        if self.writer is not None:
+            if summary.cancelled or self.read_error is not None:
+                self.writer.abort()
+                print(f"[ARCHIVE] {'Cancelled' if summary.cancelled else 'Source unreadable'}; "
+                      f"partial archive {self.dest} discarded")
+            else:
+                if self._manifest_lines:
+                    self.writer.add(MANIFEST_FILENAME, "".join(self._manifest_lines).encode("utf-8"))
+                self.writer.close()
+        return summary
+
+def open_batch_run(source: str, dest: str, settings: ConversionSettings,
+                   ai_manager: Optional[AIManager] = None, resume: bool = True,
+                   deduplicate: bool = False, use_hardlinks: bool = True,
+                   channel: Optional[ProgressChannel] = None, control: Optional[JobControl] = None,
+                   progress: Optional[Callable[[int, int, str], None]] = None, workers: int = 1) -> BatchRun:
+    """BatchRun for folder -> folder jobs, ArchiveRun when either end is a ZIP/TAR archive."""
+    if is_archive_path(source) or is_archive_path(dest):
+        if deduplicate:
+            print("[ARCHIVE] Deduplication does not apply to archive jobs; converting every entry")
+        return ArchiveRun(source, dest, settings, ai_manager, resume, channel, control, progress)
+    return BatchRun(source, dest, settings, ai_manager, resume, deduplicate, use_hardlinks,
+                    channel, control, progress, workers)
+
+def convert_batch(source: str, dest: str, settings: ConversionSettings,
+                  ai_manager: Optional[AIManager] = None, resume: bool = True,
+                  progress: Optional[Callable[[int, int, str], None]] = None,
+                  workers: int = 1, deduplicate: bool = False,
+                  use_hardlinks: bool = True, channel: Optional[ProgressChannel] = None,
+                  control: Optional[JobControl] = None) -> BatchSummary:
+    """Convert every supported file in source into dest.
+
+    With resume enabled, an append-only journal in dest records finished files; rerunning
+    the same job skips them by size/mtime without decoding. progress(index, total, name) is
+    called as each file finishes; with workers > 1 files run on a thread pool, and in
+    bounded-memory mode the pool shares one MemoryBudget. With deduplicate, identical
+    sources are converted once and the other outputs are hardlinked (or copied);
+    settings.dedup_pixel_level also matches the same pixels saved in another file format.
+    A channel receives one ProgressEvent per file (never touches any UI directly).
+    A control can pause or cancel the job; the summary then counts what was not processed.
+    """
+    run = open_batch_run(source, dest, settings, ai_manager, resume, deduplicate, use_hardlinks,
+                         channel, control, progress, workers)
+    return drive_run(run, workers)
+
+def drive_run(run: BatchRun, workers: int = 1) -> BatchSummary:
+    """Run every task of a prepared BatchRun on a bounded pool and return its summary."""
+    control = run.control
+
+    def _convert_task(names: list[str]) -> list[ProgressEvent]:
+        if control is not None and not control.wait_while_paused():
+            return [ProgressEvent("cancelled", name) for name in names]  # Queued before the cancel
+        return run.convert_task(names)
+
+    def _feed():
+        # Stop handing out tasks as soon as the job is cancelled; block here while paused
+        while True:
+            if control is not None and not control.wait_while_paused():
+                return
+            task = run.next_task()
+            if task is None:
+                return
+            yield task
+
+    run.start()
+    try:
+        for events in run_bounded(_convert_task, _feed(), workers):
+            for event in events:
+                run.record(event)
+    finally:
+        summary = run.finish()
+    return summary
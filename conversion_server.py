@@ -0,0 +1,298 @@
+"""
+SHH Image Converter - Local HTTP Conversion Service
+Keeps AI sessions warm so a web backend can convert images without paying
+process start-up and model load on every request.
+
+Run with:
+    python conversion_server.py [--port 8765] [--workers 2] [--ai-sessions 1]
+
+Endpoints:
+    POST /convert?output_width=500&output_format=WebP   body = image bytes
+    GET  /health                                         liveness + AI state
+    GET  /metrics                                        counters and latency
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from conversion_pipeline import (
+    AISessionPool,
+    ConversionSettings,
+    UndecodableInput,
+    ai_options_from_config,
+    convert_bytes,
+    load_config,
+)
+from ai_process_pool import AIProcessPool
+
+CONTENT_TYPES = {"WebP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+def _parse_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+QUERY_KEYS = ("output_width", "output_height", "output_format", "quality", "remove_background")
+
+def settings_from_query(query: dict[str, list[str]], defaults: ConversionSettings) -> ConversionSettings:
+    """Overlay Settings-tab keys from a query string onto the server defaults; raises ValueError.
+
+    Only keys present in the query change; every other default (PNG effort, AI
+    pre-check, orientation...) stays as loaded from config.json.
+    """
+    overrides = {}
+    for key in QUERY_KEYS:
+        if key not in query:
+            continue
+        raw = query[key][-1]
+        if key == "remove_background":
+            overrides[key] = _parse_bool(raw)
+        elif key == "output_format":
+            overrides[key] = raw
+        else:
+            overrides[key] = int(raw)
+    settings = replace(defaults, **overrides)
+    if settings.output_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported output_format: {settings.output_format}")
+    if not 1 <= settings.quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    if settings.output_width < 1 or settings.output_height < 1:
+        raise ValueError("output_width and output_height must be at least 1")
+    return settings
+
+class ConversionService:
+    """Bounded worker pool plus admission control in front of the conversion pipeline."""
+
+    def __init__(self, defaults: ConversionSettings, workers: int = 2, ai_sessions: int = 1,
+                 max_queue: int = 8, request_timeout: float = 120.0, ai_options: Optional[dict] = None,
+                 ai_processes: int = 0):
+        self.defaults = defaults
+        self.workers = max(1, workers)
+        self.request_timeout = request_timeout
+        if ai_processes > 0:
+            # Sessions live in worker processes; pixels travel through shared memory
+            self.ai_pool = AIProcessPool(ai_processes, **(ai_options or {}))
+        else:
+            self.ai_pool = AISessionPool(ai_sessions, **(ai_options or {}))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="convert")
+        # Requests beyond workers + max_queue are rejected immediately instead of piling up
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, max_queue))
+        self._capacity = self.workers + max(0, max_queue)
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=1000)
+        self._started = time.time()
+        self._in_flight = 0
+        self.counters = {"requests": 0, "converted": 0, "failed": 0, "rejected": 0,
+                         "bytes_in": 0, "bytes_out": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def _run(self, data: bytes, settings: ConversionSettings) -> bytes:
+        if settings.remove_background:
+            with self.ai_pool.acquire() as ai_manager:
+                return convert_bytes(data, settings, ai_manager, "request")
+        return convert_bytes(data, settings, None, "request")
+
+    def try_convert(self, data: bytes, settings: ConversionSettings) -> Optional[bytes]:
+        """Convert synchronously; returns None when the service is at capacity.
+
+        A timed-out request keeps its slot until its conversion really ends, so the
+        work in flight never exceeds workers + max_queue.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return None
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+            self.counters["requests"] += 1
+            self.counters["bytes_in"] += len(data)
+        try:
+            future = self._executor.submit(self._run, data, settings)
+        except Exception:
+            self._release_slot(None)
+            self._count("failed")
+            raise
+        future.add_done_callback(self._release_slot)
+        try:
+            result = future.result(self.request_timeout)
+            self._count("converted")
+            self._count("bytes_out", len(result))
+            return result
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+
+    def _release_slot(self, future: Optional[Future]):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "uptime_sec": round(time.time() - self._started, 1),
+            "ai_sessions": self.ai_pool.size,
+            "ai_sessions_warm": self.ai_pool.warm_count,
+            "ai_error": self.ai_pool.last_error,
+        }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot = dict(self.counters)
+            in_flight = self._in_flight
+
+        def _pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        snapshot.update({
+            "in_flight": in_flight,
+            "workers": self.workers,
+            "capacity": self._capacity,
+            "latency_ms_p50": _pct(0.50),
+            "latency_ms_p95": _pct(0.95),
+            "latency_ms_max": _pct(1.0),
+        })
+        return snapshot
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if isinstance(self.ai_pool, AIProcessPool):
+            self.ai_pool.release()
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    service: ConversionService  # Set on the subclass created by make_server()
+    max_body_bytes = 64 * 1024 * 1024
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {time.strftime('%H:%M:%S')} {self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: bytes, content_type: str, extra_headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict, extra_headers: Optional[dict] = None):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", extra_headers)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, self.service.health())
+        elif path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = 0
+        if length <= 0:
+            self._send_json(411, {"error": "Content-Length with image bytes required"})
+            return
+        if length > self.max_body_bytes:
+            self._send_json(413, {"error": f"body exceeds {self.max_body_bytes} bytes"})
+            return
+        data = self.rfile.read(length)
+
+        try:
+            settings = settings_from_query(parse_qs(url.query), self.service.defaults)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            result = self.service.try_convert(data, settings)
+        except FutureTimeoutError:
+            self._send_json(504, {"error": f"conversion took longer than {self.service.request_timeout:g}s"})
+            return
+        except UndecodableInput as e:  # Classified by the worker that decoded it
+            self._send_json(422, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"[HTTP] Conversion failed: {type(e).__name__}: {e}")
+            self._send_json(500, {"error": f"conversion failed: {type(e).__name__}: {e}"})
+            return
+        if result is None:
+            self._send_json(503, {"error": "server busy"}, {"Retry-After": "1"})
+            return
+        self._send(200, result, CONTENT_TYPES[settings.output_format])
+
+def make_server(service: ConversionService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    handler = type("BoundConversionRequestHandler", (ConversionRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve image conversion over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default="config.json", help="Default settings (same keys as the Settings tab)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Concurrent conversions (default: 'workers' from config, else up to 4)")
+    parser.add_argument("--ai-sessions", type=int, default=None,
+                        help="Warm rembg sessions, each holding its own copy of the model "
+                             "(default: 'ai_workers' from config, else 1)")
+    parser.add_argument("--ai-processes", type=int, default=None,
+                        help="Run AI in this many worker processes instead of in-process sessions "
+                             "(default: 'ai_processes' from config, else 0 = in-process)")
+    parser.add_argument("--max-queue", type=int, default=8,
+                        help="Requests allowed to wait for a worker before answering 503")
+    parser.add_argument("--no-warm", action="store_true", help="Create AI sessions lazily on first use")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    defaults = ConversionSettings.from_config(config)
+    # Values tuned by `ai_diagnostic.py --perf` apply unless overridden on the command line
+    workers = args.workers or int(config.get("workers", 0)) or max(1, min(4, os.cpu_count() or 1))
+    ai_sessions = args.ai_sessions or int(config.get("ai_workers", 0)) or 1
+    ai_processes = args.ai_processes if args.ai_processes is not None else int(config.get("ai_processes", 0))
+    service = ConversionService(defaults, workers=workers, ai_sessions=ai_sessions,
+                                max_queue=args.max_queue, ai_options=ai_options_from_config(config),
+                                ai_processes=max(0, ai_processes))
+    if not args.no_warm:
+        ready = service.ai_pool.warm()
+        print(f"[HTTP] {ready}/{service.ai_pool.size} AI sessions warm")
+
+    server = make_server(service, args.host, args.port)
+    print(f"[HTTP] Listening on http://{args.host}:{args.port} with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # AI worker processes in the frozen executable
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+SHH Image Converter - Streaming Library API
+Convert images inside another Python service: (name, bytes or PIL image) in, converted bytes out.
+
+    from converter_api import convert_stream
+    from conversion_pipeline import ConversionSettings
+
+    spec = ConversionSettings(output_width=800, output_height=800, output_format="WebP")
+    for result in convert_stream(spec, items, workers=4):
+        if result.ok:
+            upload(result.name, result.data)
+
+Nothing touches Tk or the filesystem. Items are pulled from the iterable only as
+workers free up, so a generator over a message queue or an HTTP stream is consumed
+lazily with at most a few items held in memory. Background removal uses the same
+session management as the app: pass an AIManager, AISessionPool or AIProcessPool,
+or let one shared AIManager be created on first use.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from PIL import Image
+
+from conversion_pipeline import AIManager, ConversionSettings, JobControl, convert_bytes, convert_image
+
+ImageInput = Union[bytes, bytearray, memoryview, Image.Image]
+
+@dataclass
+class StreamResult:
+    """One converted item; data is None and error holds the message if it failed."""
+    index: int  # Position in the input stream
+    name: str
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+_shared_ai: Optional[AIManager] = None
+_shared_ai_lock = threading.Lock()
+
+def shared_ai_manager() -> AIManager:
+    """Process-wide AIManager used when convert_stream() gets no ai backend; the session loads once."""
+    global _shared_ai
+    with _shared_ai_lock:
+        if _shared_ai is None:
+            _shared_ai = AIManager()
+        return _shared_ai
+
+def release_shared_ai():
+    """Drop the shared session (e.g. before a service goes idle); the next AI item reloads it."""
+    with _shared_ai_lock:
+        if _shared_ai is not None:
+            _shared_ai.release()
+
+def _convert_item(index: int, name: str, item: ImageInput, settings: ConversionSettings,
+                  ai: Any, control: Optional[JobControl]) -> StreamResult:
+    result = StreamResult(index, name)
+    try:
+        # Pools lend one warm session per item; a plain AIManager is shared by all workers
+        lease = ai.acquire() if settings.remove_background and hasattr(ai, "acquire") else nullcontext(ai)
+        with lease as ai_manager:
+            ai_manager = ai_manager if settings.remove_background else None
+            if isinstance(item, Image.Image):
+                result.data = convert_image(item, settings, ai_manager, name, result.timings, control)
+            else:
+                result.data = convert_bytes(bytes(item), settings, ai_manager, name, result.timings, control)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+def convert_stream(spec: Union[ConversionSettings, dict], items: Iterable[tuple[str, ImageInput]],
+                   workers: int = 2, ordered: bool = True, ai: Any = None,
+                   control: Optional[JobControl] = None, window: Optional[int] = None) -> Iterator[StreamResult]:
+    """Lazily convert (name, bytes or PIL image) pairs on an internal pool of workers threads.
+
+    spec is a ConversionSettings or a config.json-style dict. With ordered=True results
+    come back in input order (a slow item holds back the ones after it); otherwise in
+    completion order. A failed item yields a result with error set instead of raising.
+    At most window items (default 2 x workers) are in flight. With a control, cancel()
+    stops pulling new items and abort_in_flight interrupts the running ones.
+    Closing the iterator early drops the items not yet started.
+    """
+    settings = spec if isinstance(spec, ConversionSettings) else ConversionSettings.from_config(spec)
+    if settings.remove_background and ai is None:
+        ai = shared_ai_manager()
+    workers = max(1, workers)
+    window = max(1, window or workers * 2)
+    pending: deque[Future] = deque()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert-stream")
+    try:
+        for index, (name, item) in enumerate(items):
+            if control is not None and not control.wait_while_paused():
+                break
+            pending.append(pool.submit(_convert_item, index, name, item, settings, ai, control))
+            while len(pending) >= window:
+                yield from _drain(pending, ordered, block=True)
+            yield from _drain(pending, ordered, block=False)
+        while pending:
+            yield from _drain(pending, ordered, block=True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _drain(pending: deque, ordered: bool, block: bool) -> Iterator[StreamResult]:
+    """Yield the results that are ready; with block, wait until at least one is."""
+    if ordered:
+        if block:
+            pending[0].result()
+        while pending and pending[0].done():
+            yield pending.popleft().result()
+        return
+    if block:
+        wait(pending, return_when=FIRST_COMPLETED)
+    for future in [f for f in pending if f.done()]:
+        pending.remove(future)
+        yield future.result()
@@ -0,0 +1,525 @@
+"""
+SHH Image Converter - Distributed Batches
+Several hosts convert one huge batch together through a work queue on the shared filesystem.
+
+Run with:
+    python distributed_batch.py plan SOURCE DEST [--config config.json] [--shard-files 100] [--lease 300]
+    python distributed_batch.py work DEST [--workers 4] [--config config.json]    (on every host)
+    python distributed_batch.py status DEST
+    python distributed_batch.py run SOURCE DEST --processes 3                     (plan + local workers)
+
+'plan' lists and sniffs the source once, plans collision-free output names and
+splits the batch into cost-balanced shards under DEST/.shh_work/. Workers claim
+shards with lock files: creating leases/<shard>.lease with O_EXCL is atomic on
+local disks and on NFSv3+, where SQLite's file locking is not safe to rely on.
+The holder touches its lease while it works. A lease left untouched for longer
+than the lease time, measured against the file server's clock, belonged to a
+crashed or stalled worker and is taken over. Each shard keeps its own journal,
+so a taken-over shard skips the files its previous owner finished. Finished
+shards write done/<shard>.json; 'status' merges them into one run summary.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+
+from ai_process_pool import ai_backend_from_config
+from archive_io import is_archive_path
+from batch_planner import estimate_costs, plan_batch, plan_shards
+from conversion_journal import ConversionJournal
+from conversion_pipeline import (AIManager, BatchRun, BatchSummary, ConversionSettings, JobControl,
+                                 atomic_write_bytes, drive_run, load_config, remove_stale_partials,
+                                 scan_image_files)
+from job_queue import JobSpec
+from output_layout import MANIFEST_FILENAME, plan_output_names
+
+WORK_DIRNAME = ".shh_work"
+PLAN_FILENAME = "plan.json"
+CLOCK_FILENAME = "clock"  # Touched to read the file server's time (hosts' clocks may disagree)
+DEFAULT_SHARD_FILES = 100
+DEFAULT_LEASE_SEC = 300.0
+MAX_IDLE_POLL_SEC = 5.0
+
+def work_dir(dest: str) -> str:
+    return os.path.join(dest, WORK_DIRNAME)
+
+def _write_json(path: str, data: dict):
+    atomic_write_bytes(json.dumps(data, sort_keys=True).encode("utf-8"), path)
+
+def _read_json(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+@dataclass
+class DistributedPlan:
+    """The shared description of one distributed run, written once by the coordinator."""
+    dest: str
+    spec: JobSpec
+    shards: list[str]
+    lease_sec: float
+    total: int
+    rejected: list[str]
+
+    @property
+    def fingerprint(self) -> str:
+        return self.spec.settings.fingerprint()
+
+    def shard_path(self, shard: str) -> str:
+        return os.path.join(work_dir(self.dest), "shards", f"{shard}.json")
+
+    def done_path(self, shard: str) -> str:
+        return os.path.join(self.done_dir(), f"{shard}.json")
+
+    def journal_dir(self) -> str:
+        return os.path.join(work_dir(self.dest), "journals")
+
+    def done_dir(self) -> str:
+        return os.path.join(work_dir(self.dest), "done")
+
+def load_plan(dest: str) -> DistributedPlan:
+    data = _read_json(os.path.join(work_dir(dest), PLAN_FILENAME))
+    return DistributedPlan(dest, JobSpec.from_dict(data["spec"]), data["shards"], data["lease_sec"],
+                           data["total"], data["rejected"])
+
+def plan_distributed(spec: JobSpec, shard_files: int = DEFAULT_SHARD_FILES,
+                     lease_sec: float = DEFAULT_LEASE_SEC) -> DistributedPlan:
+    """Write the plan for spec into spec.dest, or return the existing one for the same job.
+
+    Run it before any worker starts: it clears temp files left by earlier crashes.
+    """
+    if is_archive_path(spec.source) or is_archive_path(spec.dest):
+        raise ValueError("Distributed runs need folder sources and destinations")
+    plan_file = os.path.join(work_dir(spec.dest), PLAN_FILENAME)
+    if os.path.exists(plan_file):
+        plan = load_plan(spec.dest)
+        if plan.spec.source != spec.source or plan.fingerprint != spec.settings.fingerprint():
+            raise ValueError(f"{spec.dest} already has a plan for another job; remove {WORK_DIRNAME} to start over")
+        print(f"[DIST] Resuming the existing plan in {spec.dest} ({len(plan.shards)} shards)")
+        return plan
+    if spec.deduplicate:
+        print("[DIST] Deduplication does not apply across shards; converting every file")
+    settings = spec.settings
+    os.makedirs(spec.dest, exist_ok=True)
+    remove_stale_partials(spec.dest, settings.output_shard_depth)
+    names, rejected = scan_image_files(spec.source)
+    output_names = plan_output_names(names, settings.output_extension, settings.output_naming)
+    shards = plan_shards(estimate_costs(spec.source, names), shard_files)
+    plan = DistributedPlan(spec.dest, spec, [f"{i:05d}" for i in range(len(shards))], lease_sec,
+                           len(names), sorted(rejected))
+    for shard, files in zip(plan.shards, shards):
+        _write_json(plan.shard_path(shard), {
+            "files": files,
+            "output_names": {name: output_names[name] for name in files if name in output_names},
+        })
+    os.makedirs(plan.journal_dir(), exist_ok=True)
+    # Written last: its presence means every shard file is in place
+    _write_json(plan_file, {"spec": spec.to_dict(), "shards": plan.shards, "lease_sec": lease_sec,
+                            "total": plan.total, "rejected": plan.rejected})
+    print(f"[DIST] Planned {plan.total} files in {len(plan.shards)} shards ({len(rejected)} rejected)")
+    return plan
+
+class ShardQueue:
+    """Lock-file leases over the shards of one plan."""
+
+    def __init__(self, plan: DistributedPlan, worker_id: str):
+        self.plan = plan
+        self.worker_id = worker_id
+        self.lease_dir = os.path.join(work_dir(plan.dest), "leases")
+        self._held: dict[str, tuple[Optional[int], str]] = {}  # shard -> (lease fd, token) for leases we hold
+        os.makedirs(self.lease_dir, exist_ok=True)
+        os.makedirs(plan.done_dir(), exist_ok=True)
+
+    def lease_path(self, shard: str) -> str:
+        return os.path.join(self.lease_dir, f"{shard}.lease")
+
+    def is_done(self, shard: str) -> bool:
+        return os.path.exists(self.plan.done_path(shard))
+
+    def server_now(self) -> float:
+        """Current time on the filesystem that holds the leases (touch a file, read its mtime)."""
+        path = os.path.join(work_dir(self.plan.dest), CLOCK_FILENAME)
+        with open(path, 'a'):
+            pass
+        os.utime(path, None)
+        return os.stat(path).st_mtime
+
+    def _read_lease(self, shard: str) -> dict:
+        try:
+            return _read_json(self.lease_path(shard))
+        except (OSError, ValueError):
+            return {}  # Gone, or created but not written yet
+
+    def owner(self, shard: str) -> str:
+        return self._read_lease(shard).get("worker", "")
+
+    def holds(self, shard: str) -> bool:
+        """True while the lease file is still the one this worker wrote."""
+        token = self._held.get(shard, (None, None))[1]
+        return token is not None and self._read_lease(shard).get("token") == token
+
+    def claim(self) -> Optional[str]:
+        """Lease the first unfinished shard nobody holds (or whose holder stopped renewing)."""
+        now = None
+        for shard in self.plan.shards:
+            if self.is_done(shard):
+                continue
+            if not self._create(shard):
+                now = now if now is not None else self.server_now()
+                if not self._take_over_if_expired(shard, now):
+                    continue
+            if self.is_done(shard):
+                self.release(shard)  # Finished between the check and the claim
+                continue
+            return shard
+        return None
+
+    def _write_lease(self, path: str) -> tuple[Optional[int], str]:
+        """Create path with O_EXCL and our lease body; returns (fd, token). Raises FileExistsError.
+
+        The fd stays open for renewals where os.utime() accepts one; elsewhere (Windows)
+        it is closed, since an open handle would also block a takeover's rename.
+        """
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o644)
+        token = uuid.uuid4().hex  # Tells this lease generation apart from any earlier one by the same worker
+        body = {"worker": self.worker_id, "host": socket.gethostname(), "pid": os.getpid(), "token": token}
+        os.write(fd, json.dumps(body).encode("utf-8"))
+        os.fsync(fd)
+        if os.utime not in os.supports_fd:
+            os.close(fd)
+            return None, token
+        return fd, token
+
+    def _create(self, shard: str) -> bool:
+        try:
+            self._held[shard] = self._write_lease(self.lease_path(shard))
+        except FileExistsError:
+            return False
+        return True
+
+    def _take_over_if_expired(self, shard: str, now: float) -> bool:
+        """Replace an expired lease in place; the lease path never disappears.
+
+        Of several workers spotting the same expired lease, the one that creates the
+        takeover marker for its token (O_EXCL) wins. The winner re-checks that the lease
+        is still that token and still expired, then renames its own lease over it.
+        """
+        lease = self.lease_path(shard)
+        try:
+            if now - os.stat(lease).st_mtime < self.plan.lease_sec:
+                return False
+        except FileNotFoundError:
+            return self._create(shard)
+        previous = self._read_lease(shard)
+        if not previous.get("token"):
+            return False  # Still being written; look again next round
+        marker = f"{lease}.takeover-{previous['token']}"
+        if not self._create_marker(marker, now):
+            return False
+        try:
+            try:
+                still_expired = self.server_now() - os.stat(lease).st_mtime >= self.plan.lease_sec
+            except FileNotFoundError:
+                return False
+            if not still_expired or self._read_lease(shard).get("token") != previous["token"]:
+                return False  # The holder renewed, or the shard changed hands meanwhile
+            replacement = f"{lease}.new-{uuid.uuid4().hex}"
+            fd, token = self._write_lease(replacement)
+            try:
+                os.replace(replacement, lease)
+            except OSError:
+                # Windows refuses while another process has the lease open; try next round
+                if fd is not None:
+                    os.close(fd)
+                os.remove(replacement)
+                return False
+            self._held[shard] = (fd, token)
+        finally:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+        print(f"[DIST] {self.worker_id} took over shard {shard} from {previous.get('worker', '?')} (lease expired)")
+        return True
+
+    def _create_marker(self, marker: str, now: float) -> bool:
+        """Create a takeover marker (O_EXCL); False while another worker's attempt is live.
+
+        A marker older than the lease time was left by a taker that crashed mid-takeover.
+        It is removed and the create retried, so the shard is not blocked forever. Two
+        workers clearing the same stale marker may both proceed; the token re-check and
+        renew() fence the loser out.
+        """
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return True
+            except FileExistsError:
+                try:
+                    if now - os.stat(marker).st_mtime < self.plan.lease_sec:
+                        return False
+                    print(f"[DIST] Removing stale takeover marker {os.path.basename(marker)}")
+                    os.remove(marker)
+                except FileNotFoundError:
+                    pass  # Finished or cleared meanwhile; try to create it again
+        return False
+
+    def renew(self, shard: str) -> bool:
+        """Touch our lease; False if it was taken over (we stalled past the lease time)."""
+        if not self.holds(shard):
+            return False
+        fd = self._held[shard][0]
+        try:
+            # Through our own fd where possible: if the lease is replaced right after the
+            # check, only our orphaned file is touched, never the new owner's
+            os.utime(fd if fd is not None else self.lease_path(shard), None)
+            return True
+        except OSError:
+            return False
+
+    def complete(self, shard: str, summary: BatchSummary) -> bool:
+        """Record the shard as done; False (nothing recorded) if the lease was lost meanwhile."""
+        if not self.holds(shard):
+            self.release(shard)
+            return False
+        _write_json(self.plan.done_path(shard), {"worker": self.worker_id, "summary": asdict(summary)})
+        self.release(shard)
+        return True
+
+    def release(self, shard: str):
+        if self.holds(shard):
+            try:
+                os.remove(self.lease_path(shard))
+            except OSError:
+                pass
+        fd = self._held.pop(shard, (None, None))[0]
+        if fd is not None:
+            os.close(fd)
+
+class _LeaseKeeper(threading.Thread):
+    """Renews one lease in the background; aborts the shard's run if the lease is lost."""
+
+    def __init__(self, queue: ShardQueue, shard: str, control: JobControl):
+        super().__init__(daemon=True, name=f"lease-{shard}")
+        self.queue = queue
+        self.shard = shard
+        self.control = control
+        self.lost_event = threading.Event()  # ShardRun stops journalling once this is set
+        self._stopped = threading.Event()
+
+    @property
+    def lost(self) -> bool:
+        return self.lost_event.is_set()
+
+    def run(self):
+        while not self._stopped.wait(self.queue.plan.lease_sec / 3):
+            if not self.queue.renew(self.shard):
+                self.lost_event.set()
+                print(f"[DIST] Lost the lease on shard {self.shard}; aborting files in progress")
+                # The new owner converts these files again; ours must stop, not finish
+                self.control.cancel(abort_in_flight=True)
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class ShardRun(BatchRun):
+    """A BatchRun over one shard: the plan's files and output names, and a per-shard journal.
+
+    Never clears temp files in dest; other hosts are writing there. Once lease_lost is
+    set, finished files are no longer journalled: the shard belongs to another worker.
+    """
+
+    def __init__(self, plan: DistributedPlan, shard: str, ai_manager: Optional[AIManager] = None,
+                 control: Optional[JobControl] = None, workers: int = 1,
+                 lease_lost: Optional[threading.Event] = None):
+        self.plan = plan
+        self.shard = shard
+        self.lease_lost = lease_lost or threading.Event()
+        super().__init__(plan.spec.source, plan.spec.dest, plan.spec.settings, ai_manager, control=control,
+                         workers=workers)
+
+    def _open_destination(self, resume: bool):
+        self.journal = ConversionJournal(self.plan.journal_dir(), self.plan.fingerprint, f"{self.shard}.jsonl")
+
+    def _plan(self, deduplicate: bool, workers: int):
+        shard_data = _read_json(self.plan.shard_path(self.shard))
+        self.summary = BatchSummary(total=len(shard_data["files"]))
+        self.output_names = shard_data["output_names"]
+        files = shard_data["files"]
+        self._pending = iter(plan_batch(self.source, files, workers, self._journaled(files, workers)))
+
+    def _record_done(self, filename: str, st: os.stat_result, output_path: str,
+                     duplicate_of: Optional[str] = None):
+        if not self.lease_lost.is_set():
+            super()._record_done(filename, st, output_path, duplicate_of)
+
+def merge_summaries(summaries: list[BatchSummary]) -> BatchSummary:
+    merged = BatchSummary()
+    for summary in summaries:
+        for f in fields(BatchSummary):
+            value = getattr(summary, f.name)
+            if f.name == "failed_files":
+                merged.failed_files.extend(value)
+            elif f.name == "cancelled":
+                merged.cancelled = merged.cancelled or value
+            else:
+                setattr(merged, f.name, getattr(merged, f.name) + value)
+    return merged
+
+def run_worker(dest: str, workers: int = 1, ai_manager: Optional[AIManager] = None,
+               worker_id: Optional[str] = None, wait_for_others: bool = True) -> BatchSummary:
+    """Claim and convert shards until every shard is done; returns this worker's own totals.
+
+    With wait_for_others, the worker stays until shards leased by others finish, so
+    it can take over the ones whose holder crashed.
+    """
+    plan = load_plan(dest)
+    queue = ShardQueue(plan, worker_id or default_worker_id())
+    mine: list[BatchSummary] = []
+    idle_poll = min(MAX_IDLE_POLL_SEC, plan.lease_sec / 4)
+    while True:
+        shard = queue.claim()
+        if shard is None:
+            if not wait_for_others or all(queue.is_done(s) for s in plan.shards):
+                break
+            time.sleep(idle_poll)
+            continue
+        control = JobControl()
+        keeper = _LeaseKeeper(queue, shard, control)
+        keeper.start()
+        try:
+            summary = drive_run(ShardRun(plan, shard, ai_manager, control, workers, keeper.lost_event), workers)
+        except BaseException:
+            queue.release(shard)  # Let another worker retry right away instead of after the lease time
+            raise
+        finally:
+            keeper.stop()
+        if keeper.lost or not queue.complete(shard, summary):
+            continue
+        mine.append(summary)
+        print(f"[DIST] {queue.worker_id} finished shard {shard}: {summary.converted} converted, "
+              f"{summary.resumed} resumed, {summary.skipped} skipped")
+    return merge_summaries(mine)
+
+def run_status(dest: str) -> dict:
+    """Shard counts plus the merged summary of every finished shard."""
+    plan = load_plan(dest)
+    queue = ShardQueue(plan, "status")
+    summaries, done = [], 0
+    for shard in plan.shards:
+        if queue.is_done(shard):
+            done += 1
+            data = _read_json(plan.done_path(shard))["summary"]
+            summaries.append(BatchSummary(**{k: v for k, v in data.items() if k in BatchSummary.__dataclass_fields__}))
+    leased = sum(1 for shard in plan.shards if not queue.is_done(shard) and os.path.exists(queue.lease_path(shard)))
+    summary = merge_summaries(summaries)
+    summary.total = plan.total
+    summary.rejected = len(plan.rejected)
+    summary.failed_files = plan.rejected + summary.failed_files
+    summary.not_processed = plan.total - sum(s.total for s in summaries)
+    return {"shards": len(plan.shards), "done": done, "leased": leased,
+            "pending": len(plan.shards) - done - leased, "summary": summary}
+
+def write_manifest(dest: str) -> int:
+    """Rebuild shh_manifest.jsonl in dest from the shard journals; returns the number of entries."""
+    plan = load_plan(dest)
+    lines = []
+    for shard in plan.shards:
+        journal = ConversionJournal(plan.journal_dir(), plan.fingerprint, f"{shard}.jsonl")
+        for source_name, output_path in sorted(journal.completed_outputs().items()):
+            if os.path.exists(output_path):
+                lines.append(json.dumps({"source": source_name,
+                                         "output": os.path.relpath(output_path, dest).replace(os.sep, "/"),
+                                         "bytes": os.path.getsize(output_path)}) + "\n")
+    atomic_write_bytes("".join(lines).encode("utf-8"), os.path.join(dest, MANIFEST_FILENAME))
+    return len(lines)
+
+def _worker_process(dest: str, workers: int, config: dict):
+    ai_manager = ai_backend_from_config(config) if load_plan(dest).spec.settings.remove_background else None
+    try:
+        run_worker(dest, workers, ai_manager)
+    finally:
+        if ai_manager is not None:
+            ai_manager.release()
+
+def run_local(spec: JobSpec, processes: int = 2, workers: int = 1, shard_files: int = DEFAULT_SHARD_FILES,
+              lease_sec: float = DEFAULT_LEASE_SEC, config: Optional[dict] = None) -> BatchSummary:
+    """Plan spec and convert it with several worker processes on this machine."""
+    plan_distributed(spec, shard_files, lease_sec)
+    procs = [multiprocessing.Process(target=_worker_process, args=(spec.dest, workers, config or {}),
+                                     name=f"dist-worker-{i + 1}") for i in range(max(1, processes))]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    status = run_status(spec.dest)
+    if status["done"] == status["shards"] and spec.settings.output_manifest:
+        write_manifest(spec.dest)
+    return status["summary"]
+
+def _print_status(dest: str) -> int:
+    status = run_status(dest)
+    summary = status["summary"]
+    print(f"[DIST] Shards: {status['done']}/{status['shards']} done, {status['leased']} leased, "
+          f"{status['pending']} pending")
+    print(f"[DIST] Converted: {summary.converted}, Resumed: {summary.resumed}, Skipped: {summary.skipped}, "
+          f"Rejected: {summary.rejected}, Not processed yet: {summary.not_processed}")
+    return 0 if status["done"] == status["shards"] else 1
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert one batch on several hosts through a shared folder.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    plan_cmd = sub.add_parser("plan", help="Split SOURCE into shards under DEST (run once)")
+    run_cmd = sub.add_parser("run", help="Plan, then convert with local worker processes")
+    for cmd in (plan_cmd, run_cmd):
+        cmd.add_argument("source")
+        cmd.add_argument("dest")
+        cmd.add_argument("--shard-files", type=int, default=DEFAULT_SHARD_FILES, help="Files per shard (about)")
+        cmd.add_argument("--lease", type=float, default=DEFAULT_LEASE_SEC,
+                         help="Seconds without renewal before another worker takes a shard over")
+    run_cmd.add_argument("--processes", type=int, default=2)
+    work_cmd = sub.add_parser("work", help="Claim and convert shards of the plan in DEST")
+    work_cmd.add_argument("dest")
+    work_cmd.add_argument("--no-wait", action="store_true", help="Exit when nothing is claimable right now")
+    for cmd in (run_cmd, work_cmd):
+        cmd.add_argument("--workers", type=int, default=1, help="Files converted at once per worker")
+    status_cmd = sub.add_parser("status", help="Show progress and the merged summary")
+    status_cmd.add_argument("dest")
+    for cmd in (plan_cmd, run_cmd, work_cmd):
+        cmd.add_argument("--config", default="config.json", help="Settings file (same keys as the Settings tab)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        return _print_status(args.dest)
+    config = load_config(args.config)
+    if args.command == "work":
+        ai_manager = ai_backend_from_config(config) if load_plan(args.dest).spec.settings.remove_background else None
+        try:
+            summary = run_worker(args.dest, args.workers, ai_manager, wait_for_others=not args.no_wait)
+        finally:
+            if ai_manager is not None:
+                ai_manager.release()
+        print(f"[DIST] This worker converted {summary.converted} files")
+        return _print_status(args.dest)
+    spec = JobSpec(os.path.abspath(args.source), os.path.abspath(args.dest), ConversionSettings.from_config(config))
+    if args.command == "plan":
+        plan_distributed(spec, args.shard_files, args.lease)
+        return 0
+    run_local(spec, args.processes, args.workers, args.shard_files, args.lease, config)
+    return _print_status(args.dest)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+SHH Image Converter - EXIF Orientation
+Reads the camera's orientation tag from the header so rotation is planned with the resize.
+
+Phones store pixels in sensor order and record how to display them in EXIF tag
+0x0112. The pipeline reads the tag before decoding, fits the image against the
+target box with width and height swapped for the 90-degree cases, and transposes
+only the already resized image. A 24 MP photo is never rotated at full size, and
+the DCT-scaled decode of bounded-memory mode still applies to it.
+"""
+
+from typing import Optional
+
+from PIL import Image
+
+ORIENTATION_TAG = 0x0112
+
+# Orientation tag value -> transpose that displays the stored pixels upright (1 = as stored)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def read_orientation(img: Image.Image) -> int:
+    """Orientation tag of an opened image (header only, nothing is decoded); 1 if absent or invalid."""
+    try:
+        if "exif" not in img.info and img.format not in ("TIFF", "MPO"):
+            return 1  # TIFF keeps its tags outside info['exif']; everything else has no EXIF at all
+        orientation = img.getexif().get(ORIENTATION_TAG, 1)
+    except Exception:
+        return 1  # A corrupt EXIF block must not fail the conversion
+    return orientation if orientation in ORIENTATION_TRANSPOSE else 1
+
+def swaps_axes(orientation: int) -> bool:
+    """True when the upright image is the stored one turned by 90 degrees (width and height swap)."""
+    return orientation in (5, 6, 7, 8)
+
+def upright_size(size: tuple[int, int], orientation: int) -> tuple[int, int]:
+    return (size[1], size[0]) if swaps_axes(orientation) else size
+
+def apply_orientation(img: Image.Image, orientation: int) -> Image.Image:
+    """img turned upright; returned unchanged for orientation 1."""
+    transpose: Optional[Image.Transpose] = ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(transpose) if transpose is not None else img
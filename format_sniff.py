@@ -0,0 +1,108 @@
+"""
+SHH Image Converter - Input Format Sniffing
+Classifies source files by their first bytes instead of trusting the extension.
+
+Discovery reads SNIFF_BYTES from each candidate (the same prefix Image.open()
+uses to pick a plugin) and asks Pillow's own format checks whether it can decode
+it. Mislabelled files (a JPEG named .png) are converted normally. Files without
+an extension, as DAM exports produce, are picked up. Text, HTML error pages,
+empty and truncated-header files are rejected before they take a worker.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PIL import Image
+
+SNIFF_BYTES = 16  # Image.open() reads this much to choose a plugin
+SNIFF_THREADS = 8  # One tiny read per file; overlap the latency on network shares
+
+# Pillow formats accepted as input, with their usual extensions. Common formats come
+# first so most files match on the first check. Left out: formats that need
+# external tools (EPS via Ghostscript, WMF on Windows only) and scientific stubs.
+INPUT_FORMATS = {
+    "JPEG": (".jpg", ".jpeg", ".jpe", ".jfif", ".mpo"),
+    "PNG": (".png", ".apng"),
+    "WEBP": (".webp",),
+    "GIF": (".gif",),
+    "TIFF": (".tif", ".tiff"),
+    "BMP": (".bmp", ".dib"),
+    "AVIF": (".avif", ".avifs"),
+    "JPEG2000": (".jp2", ".j2k", ".jpx", ".jpf", ".j2c", ".jpc"),
+    "PSD": (".psd",),
+    "ICO": (".ico",),
+    "CUR": (".cur",),
+    "ICNS": (".icns",),
+    "QOI": (".qoi",),
+    "DDS": (".dds",),
+    "PPM": (".ppm", ".pgm", ".pbm", ".pnm", ".pfm"),
+    "PCX": (".pcx",),
+    "SGI": (".sgi", ".rgb", ".rgba", ".bw"),
+    "SUN": (".ras",),
+    "XBM": (".xbm",),
+    "XPM": (".xpm",),
+    "BLP": (".blp",),
+    "TGA": (".tga", ".vda", ".icb", ".vst"),  # No signature: trusted by extension alone
+}
+
+def _available_formats() -> dict[str, tuple[str, ...]]:
+    """INPUT_FORMATS limited to the plugins this Pillow build registers."""
+    Image.init()
+    return {fmt: exts for fmt, exts in INPUT_FORMATS.items() if fmt in Image.OPEN}
+
+AVAILABLE_FORMATS = _available_formats()
+INPUT_EXTENSIONS = tuple(ext for exts in AVAILABLE_FORMATS.values() for ext in exts)
+
+def is_candidate_name(filename: str) -> bool:
+    """Worth sniffing: a known image extension (any case) or no extension at all.
+
+    Dotfiles (our journal and temp files, macOS '._' resource forks) never are.
+    """
+    base = os.path.basename(filename)
+    if not base or base.startswith("."):
+        return False
+    ext = os.path.splitext(base)[1].lower()
+    return ext == "" or ext in INPUT_EXTENSIONS
+
+def sniff_bytes(prefix: bytes, filename: str = "") -> Optional[str]:
+    """Pillow format name for a file's first bytes, or None if it is not a supported image."""
+    if not prefix:
+        return None
+    for fmt in AVAILABLE_FORMATS:
+        accept = Image.OPEN[fmt][1]
+        if accept is None:
+            continue
+        try:
+            result = accept(prefix)
+        except Exception:
+            continue  # Some checks index past a very short prefix
+        if result and not isinstance(result, str):  # A string means "recognised, but this build cannot decode it"
+            return fmt
+    lower = filename.lower()
+    for fmt, exts in AVAILABLE_FORMATS.items():
+        if Image.OPEN[fmt][1] is None and lower.endswith(exts):
+            return fmt
+    return None
+
+def sniff_file(path: str) -> tuple[Optional[str], str]:
+    """(format, '') for a decodable image, else (None, reason) from one small read."""
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(SNIFF_BYTES)
+    except OSError as e:
+        return None, f"unreadable ({e.strerror or e})"
+    if not prefix:
+        return None, "empty file"
+    fmt = sniff_bytes(prefix, path)
+    return (fmt, "") if fmt else (None, "not a supported image")
+
+def classify_files(folder: str, names: list[str]) -> tuple[list[str], dict[str, str]]:
+    """Split names into (accepted, {rejected name: reason}); the accepted keep their order."""
+    if not names:
+        return [], {}
+    with ThreadPoolExecutor(max_workers=min(SNIFF_THREADS, len(names)), thread_name_prefix="sniff") as pool:
+        results = list(pool.map(lambda name: sniff_file(os.path.join(folder, name)), names))
+    accepted = [name for name, (fmt, _) in zip(names, results) if fmt]
+    rejected = {name: reason for name, (fmt, reason) in zip(names, results) if not fmt}
+    return accepted, rejected
@@ -0,0 +1,215 @@
+"""
+SHH Image Converter - Gallery View
+Scrollable grid of every image in the source folder.
+
+Only rows currently in view have canvas items; thumbnails are produced by
+background workers through ThumbnailCache and handed back to Tk via a queue
+drained on a timer, so opening a 10k-image folder decodes nothing up front.
+"""
+
+import math
+import os
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+from typing import Callable, Optional
+
+from PIL import Image, ImageTk
+
+from thumbnail_cache import ThumbnailCache
+
+class GalleryView(ttk.Frame):
+    """Virtualized thumbnail grid with a Before/After toggle."""
+    CELL_WIDTH = 140
+    CELL_HEIGHT = 160
+    THUMB_SIZE = (128, 128)
+    POLL_MS = 50
+    MARGIN_ROWS = 1  # Extra rows rendered above/below the viewport for smooth scrolling
+
+    def __init__(self, parent, after_renderer: Callable[[], tuple[str, Callable[[str], Image.Image]]],
+                 on_select: Optional[Callable[[str], None]] = None, workers: int = 2,
+                 upright: Callable[[], bool] = lambda: True):
+        """after_renderer() is called on the Tk thread and returns (cache variant, render function)
+        for the current settings; the render function runs on worker threads. upright() (also
+        on the Tk thread) says whether Before thumbnails follow EXIF orientation."""
+        super().__init__(parent)
+        self.after_renderer = after_renderer
+        self.upright = upright
+        self._drawn_upright = True
+        self.on_select = on_select
+        self.cache = ThumbnailCache(size=self.THUMB_SIZE)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        self._results: queue.SimpleQueue = queue.SimpleQueue()
+        self._folder = ""
+        self._files: list[str] = []
+        self._items: dict[int, tuple] = {}  # index -> (canvas item ids, PhotoImage or None)
+        self._requested: set[tuple[int, int]] = set()  # (generation, index) already submitted
+        self._wanted_lock = threading.Lock()
+        self._wanted: set[int] = set()
+        self._generation = 0
+        self.mode = tk.StringVar(value="before")
+
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill=tk.X, pady=(0, 5))
+        ttk.Radiobutton(toolbar, text="Before", value="before", variable=self.mode,
+                        command=self.refresh).pack(side=tk.LEFT)
+        ttk.Radiobutton(toolbar, text="After", value="after", variable=self.mode,
+                        command=self.refresh).pack(side=tk.LEFT, padx=10)
+        self.count_label = ttk.Label(toolbar, text="")
+        self.count_label.pack(side=tk.RIGHT)
+
+        body = ttk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(body, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas.bind("<Configure>", lambda e: self._layout())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda e: self._scroll_units(-1))
+        self.canvas.bind("<Button-5>", lambda e: self._scroll_units(1))
+        self.after(self.POLL_MS, self._drain_results)
+
+    # --- Folder & layout ---
+    def set_folder(self, folder: str, files: list[str]):
+        if folder == self._folder and files == self._files:
+            return
+        self._folder = folder
+        self._files = files
+        self.count_label.config(text=f"{len(files)} images")
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def settings_changed(self):
+        if self.mode.get() == "after" or self.upright() != self._drawn_upright:
+            self.refresh()
+
+    def refresh(self):
+        """Drop drawn cells (e.g. after a Before/After toggle or settings change) and redraw."""
+        self._generation += 1
+        self.canvas.delete("all")
+        self._items.clear()
+        self._layout()
+
+    @property
+    def _columns(self) -> int:
+        return max(1, self.canvas.winfo_width() // self.CELL_WIDTH)
+
+    def _layout(self):
+        rows = math.ceil(len(self._files) / self._columns)
+        self.canvas.configure(scrollregion=(0, 0, self._columns * self.CELL_WIDTH, rows * self.CELL_HEIGHT))
+        self._update_visible()
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self._update_visible()
+
+    def _scroll_units(self, units: int):
+        self.canvas.yview_scroll(units, "units")
+        self._update_visible()
+
+    def _on_mousewheel(self, event):
+        self._scroll_units(-1 if event.delta > 0 else 1)
+
+    def _visible_indices(self) -> range:
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // self.CELL_HEIGHT) - self.MARGIN_ROWS)
+        last_row = int(bottom // self.CELL_HEIGHT) + self.MARGIN_ROWS
+        columns = self._columns
+        return range(first_row * columns, min(len(self._files), (last_row + 1) * columns))
+
+    def _update_visible(self):
+        visible = self._visible_indices()
+        wanted = set(visible)
+        with self._wanted_lock:
+            self._wanted = wanted
+
+        # Forget cells that scrolled out of view so canvas items and PhotoImages stay bounded
+        for index in [i for i in self._items if i not in wanted]:
+            ids, _photo = self._items.pop(index)
+            for item in ids:
+                self.canvas.delete(item)
+
+        variant, render = self._variant()
+        upright = self._drawn_upright = self.upright()
+        for index in visible:
+            if index in self._items:
+                continue
+            self._draw_placeholder(index)
+            path = os.path.join(self._folder, self._files[index])
+            cached = self.cache.get(path, variant, upright)
+            if cached is not None:
+                self._draw_thumbnail(index, cached)
+            elif (self._generation, index) not in self._requested:
+                self._requested.add((self._generation, index))
+                self._executor.submit(self._load, self._generation, index, path, variant, render, upright)
+
+    def _variant(self) -> tuple[str, Optional[Callable[[str], Image.Image]]]:
+        if self.mode.get() == "before":
+            return "before", None
+        return self.after_renderer()
+
+    def _cell_origin(self, index: int) -> tuple[int, int]:
+        columns = self._columns
+        return (index % columns) * self.CELL_WIDTH, (index // columns) * self.CELL_HEIGHT
+
+    def _draw_placeholder(self, index: int):
+        x, y = self._cell_origin(index)
+        box = self.canvas.create_rectangle(x + 6, y + 4, x + self.CELL_WIDTH - 6, y + 4 + self.THUMB_SIZE[1],
+                                           outline="#888888", dash=(2, 2))
+        name = self._files[index]
+        label = self.canvas.create_text(x + self.CELL_WIDTH // 2, y + self.THUMB_SIZE[1] + 16,
+                                        text=name if len(name) <= 20 else name[:17] + "...", width=self.CELL_WIDTH - 8)
+        self.canvas.tag_bind(box, "<Button-1>", lambda e, i=index: self._select(i))
+        self.canvas.tag_bind(label, "<Button-1>", lambda e, i=index: self._select(i))
+        self._items[index] = ((box, label), None)
+
+    def _draw_thumbnail(self, index: int, thumb: Image.Image):
+        if index not in self._items:
+            return
+        ids, _old = self._items[index]
+        x, y = self._cell_origin(index)
+        photo = ImageTk.PhotoImage(thumb)
+        image_id = self.canvas.create_image(x + self.CELL_WIDTH // 2, y + 4 + self.THUMB_SIZE[1] // 2, image=photo)
+        self.canvas.tag_bind(image_id, "<Button-1>", lambda e, i=index: self._select(i))
+        self._items[index] = (ids + (image_id,), photo)
+
+    def _select(self, index: int):
+        if self.on_select is not None and index < len(self._files):
+            self.on_select(os.path.join(self._folder, self._files[index]))
+
+    # --- Background loading ---
+    def _load(self, generation: int, index: int, path: str, variant: str,
+              render: Optional[Callable[[str], Image.Image]], upright: bool):
+        """Worker thread: skip work for cells that scrolled away before we got to them."""
+        with self._wanted_lock:
+            still_wanted = index in self._wanted
+        if generation != self._generation or not still_wanted:
+            self._results.put((generation, index, None))
+            return
+        try:
+            thumb = self.cache.get_or_create(path, variant, render, upright)
+        except Exception as e:
+            print(f"Thumbnail failed for {os.path.basename(path)}: {e}")
+            thumb = None
+        self._results.put((generation, index, thumb))
+
+    def _drain_results(self):
+        try:
+            while True:
+                generation, index, thumb = self._results.get_nowait()
+                self._requested.discard((generation, index))
+                if generation == self._generation and thumb is not None:
+                    self._draw_thumbnail(index, thumb)
+        except queue.Empty:
+            pass
+        self.after(self.POLL_MS, self._drain_results)
+
+    def destroy(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
@@ -3,175 +3,31 @@ from tkinter import filedialog, messagebox, ttk
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from ttkthemes import ThemedStyle
 from PIL import Image, ImageTk
-import threading
 import os
 import json
-import time
-import traceback
-import sys
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from typing import Optional
 
-class AIManager:
-    """Manages AI background removal with timeouts & diagnostics to avoid indefinite hangs."""
-    SESSION_TIMEOUT_SEC = 40  # Max time allowed for initial model/session creation
-    REMOVAL_TIMEOUT_SEC = 25  # Per-image background removal timeout
-
-    def __init__(self):
-        self._rembg = None
-        self._session = None
-        self._session_lock = threading.Lock()
-        self._init_attempted = False
-        self._init_failed = False
-        self._last_error: Optional[str] = None
-
-    def _log(self, msg: str):
-        print(f"[AI] {time.strftime('%H:%M:%S')} {msg}")
-
-    def _load_library(self) -> bool:
-        if self._rembg is not None:
-            return True
-        try:
-            import rembg  # type: ignore
-            self._rembg = rembg
-            self._log("rembg imported successfully")
-            return True
-        except ImportError as e:
-            self._last_error = f"ImportError: {e}"
-            self._log(f"Failed to import rembg: {e}")
-        except Exception as e:  # Unexpected
-            self._last_error = f"Unexpected import error: {e}"
-            self._log(f"Unexpected error importing rembg: {e}\n{traceback.format_exc()}")
-        return False
-
-    def _ensure_model_cache(self):
-        """Ensure the U2-Net model is available in cache; copy from bundled if needed."""
-        # Standard cache locations (no need for appdirs dependency)
-        cache_locations = [
-            os.path.expanduser("~/.u2net"),
-            os.path.expanduser("~/.cache/rembg"),
-            os.path.join(os.environ.get("LOCALAPPDATA", ""), "rembg"),
-        ]
-        
-        model_filename = "u2net.onnx"
-        
-        # Check if model already exists in any cache location
-        for cache_dir in cache_locations:
-            cache_file = os.path.join(cache_dir, model_filename)
-            if os.path.exists(cache_file) and os.path.getsize(cache_file) > 100_000_000:  # ~175MB expected
-                self._log(f"Found existing model at {cache_file}")
-                return True
-        
-        # Model not found, try to copy from bundled location
-        bundled_model = None
-        possible_bundled_paths = [
-            os.path.join(os.path.dirname(__file__), "models", "u2net", model_filename),  # Source layout
-            os.path.join(os.path.dirname(os.path.abspath(sys.executable)), "models", "u2net", model_filename),  # Bundled EXE
-            os.path.join(os.getcwd(), "models", "u2net", model_filename),  # Current dir
-        ]
-        
-        for path in possible_bundled_paths:
-            if os.path.exists(path):
-                bundled_model = path
-                self._log(f"Found bundled model at {bundled_model}")
-                break
-        
-        if not bundled_model:
-            self._log("No bundled model found; will rely on online download during session creation")
-            return False
-        
-        # Try to copy bundled model to first cache location
-        target_cache = cache_locations[0]  # ~/.u2net
-        try:
-            os.makedirs(target_cache, exist_ok=True)
-            target_file = os.path.join(target_cache, model_filename)
-            
-            import shutil
-            self._log(f"Copying bundled model to {target_file}")
-            shutil.copy2(bundled_model, target_file)
-            
-            if os.path.exists(target_file) and os.path.getsize(target_file) > 100_000_000:
-                self._log("Model copied successfully")
-                return True
-            else:
-                self._log("Model copy failed or incomplete")
-                return False
-                
-        except Exception as e:
-            self._log(f"Failed to copy bundled model: {e}")
-            return False
-
-    def _init_session_blocking(self):
-        """Direct (blocking) session init; run inside a worker thread so we can time out."""
-        try:
-            if self._rembg is None and not self._load_library():
-                return
-            if self._rembg is not None:
-                # Ensure model is available before creating session
-                self._ensure_model_cache()
-                self._log("Creating new rembg session (model 'u2net') ...")
-                self._session = self._rembg.new_session('u2net')  # May download model
-                self._log("Session created successfully")
-        except Exception as e:
-            self._last_error = f"Session init failed: {e}"
-            self._log(f"Session creation failed: {e}\n{traceback.format_exc()}")
-
-    def get_session(self):
-        """Get or lazily create session with a timeout to prevent indefinite stall."""
-        with self._session_lock:
-            if self._session is not None:
-                return self._session
-            if self._init_attempted and self._init_failed:
-                return None
-            self._init_attempted = True
-
-            worker = threading.Thread(target=self._init_session_blocking, daemon=True)
-            start = time.time()
-            worker.start()
-            worker.join(self.SESSION_TIMEOUT_SEC)
-            if worker.is_alive():
-                self._init_failed = True
-                self._last_error = ("Session initialization timed out after "
-                                    f"{self.SESSION_TIMEOUT_SEC}s (likely model download/network issue)")
-                self._log(self._last_error)
-                return None
-            if self._session is None:
-                # Failed inside worker
-                self._init_failed = True
-                if not self._last_error:
-                    self._last_error = "Unknown failure creating AI session"
-                return None
-            duration = time.time() - start
-            self._log(f"AI session ready in {duration:.1f}s")
-            return self._session
-
-    def remove_background(self, image_bytes: bytes):
-        """Remove background with a per-image timeout; returns bytes or None."""
-        session = self.get_session()
-        if session is None:
-            return None
-        result_container: dict[str, Optional[bytes]] = {"data": None}
-        error_container: dict[str, Optional[str]] = {"err": None}
-
-        def _work():
-            try:
-                result_container["data"] = self._rembg.remove(image_bytes, session=session)  # type: ignore
-            except Exception as e:
-                error_container["err"] = str(e)
-                self._log(f"Background removal exception: {e}\n{traceback.format_exc()}")
-
-        t = threading.Thread(target=_work, daemon=True)
-        t.start()
-        t.join(self.REMOVAL_TIMEOUT_SEC)
-        if t.is_alive():
-            self._log(f"Per-image removal timed out after {self.REMOVAL_TIMEOUT_SEC}s; skipping AI for this image")
-            return None
-        if error_container["err"]:
-            return None
-        return result_container["data"]
-
-    @property
-    def last_error(self) -> Optional[str]:
-        return self._last_error
+from ai_process_pool import AIProcessPool
+from archive_io import is_archive_path
+from exif_orientation import apply_orientation, read_orientation
+from conversion_pipeline import (
+    AIManager,
+    BatchSummary,
+    ConversionSettings,
+    ai_options_from_config,
+    encode_image,
+    list_image_files,
+    load_config,
+    render_file,
+    render_preview_draft,
+)
+from gallery_view import GalleryView
+from job_queue import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, JobScheduler, JobSpec
+from output_layout import DEFAULT_OUTPUT_NAMING, MAX_SHARD_DEPTH, OUTPUT_NAMING_MODES
+from progress_channel import ProgressChannel, ProgressStats
 
 class ImageConverterApp:
     def __init__(self, root):
@@ -179,7 +35,7 @@ class ImageConverterApp:
         self.style = ThemedStyle(root)
         self.version = "4.1.1"
         self.root.title(f"SHH Image Converter v{self.version}")
-        self.root.geometry("650x550")
+        self.root.geometry("650x600")
         self.root.resizable(False, False)
         self.config_file = "config.json"
 
@@ -194,16 +50,48 @@ class ImageConverterApp:
         self.output_format = tk.StringVar(value="WebP")
         self.theme = tk.StringVar(value="arc") # Default theme
         self.remove_background = tk.BooleanVar(value=False)
+        self.workers = tk.IntVar(value=1)
+        self.memory_budget_mp = tk.IntVar(value=0)
+        self.deduplicate = tk.BooleanVar(value=False)
+        self.dedup_pixel_level = tk.BooleanVar(value=False)
+        self.keep_animation = tk.BooleanVar(value=True)
+        self.animation_max_fps = tk.DoubleVar(value=0.0)
+        self.animation_remove_background = tk.BooleanVar(value=False)
+        self.png_compression = tk.StringVar(value="balanced")
+        self.png_palette_colors = tk.IntVar(value=0)
+        self.ai_precheck = tk.BooleanVar(value=True)
+        self.output_naming = tk.StringVar(value=DEFAULT_OUTPUT_NAMING)
+        self.output_shard_depth = tk.IntVar(value=0)
+        self.output_manifest = tk.BooleanVar(value=False)
+        self.apply_exif_orientation = tk.BooleanVar(value=True)
+        self.canvas_cache_mb = tk.IntVar(value=0)
+        self.canvas_cache_dir = ""  # config.json only (no widget); "" = per-user default folder
+        self.png_report_savings = False  # config.json only: measure PNG bytes saved (costs a second encode)
+        self.ai_workers = 0  # From `ai_diagnostic.py --perf`; 0 = use Parallel Workers for AI jobs too
 
         # Link variables to update preview
         self.output_width.trace_add("write", lambda *args: self.update_preview())
         self.output_height.trace_add("write", lambda *args: self.update_preview())
         self.quality.trace_add("write", lambda *args: self.update_preview())
         self.remove_background.trace_add("write", lambda *args: self.update_preview())
+        self.ai_precheck.trace_add("write", lambda *args: self.update_preview())
+        self.png_palette_colors.trace_add("write", lambda *args: self.update_preview())
+        self.apply_exif_orientation.trace_add("write", lambda *args: self.update_preview())
 
         # Background removal session management
         self.ai_manager = AIManager()
 
+        # Every conversion (Convert or Add to Queue) runs on one scheduler sharing workers and the AI session
+        self.scheduler = JobScheduler(workers=1, ai_manager=self.ai_manager)
+        self.job_priority = tk.StringVar(value="Normal")
+        self.tracked_job = None  # Job shown on the Converter tab's progress bar
+        self._queue_stats: dict[str, ProgressStats] = {}
+
+        # Preview refinement runs on one background thread; stale requests are skipped by generation
+        self._preview_generation = 0
+        self.preview_file: Optional[str] = None  # Chosen in the Gallery; defaults to the first image
+        self._preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+
         # UI Elements
         self.create_widgets()
         self.load_settings()
@@ -224,19 +112,28 @@ class ImageConverterApp:
         # Create frames for each tab
         converter_frame = ttk.Frame(notebook, padding="10")
         preview_frame = ttk.Frame(notebook, padding="10")
+        self.preview_frame = preview_frame
+        queue_frame = ttk.Frame(notebook, padding="10")
+        self.gallery = GalleryView(notebook, after_renderer=self._gallery_after_renderer,
+                                   on_select=self.select_preview_file,
+                                   upright=self.apply_exif_orientation.get)
+        self.gallery.configure(padding="10")
         settings_frame = ttk.Frame(notebook, padding="10")
 
         notebook.add(converter_frame, text='Converter')
         notebook.add(preview_frame, text='Preview')
+        notebook.add(self.gallery, text='Gallery')
+        notebook.add(queue_frame, text='Queue')
         notebook.add(settings_frame, text='Settings')
+        self.notebook = notebook
 
         # --- Converter Tab Widgets ---
         # Drag and Drop Area
         self.drop_target_frame = ttk.Frame(converter_frame, relief="sunken", borderwidth=2, width=400, height=100)
-        self.drop_target_frame.grid(row=0, column=0, columnspan=3, pady=5, sticky=(tk.W, tk.E))
+        self.drop_target_frame.grid(row=0, column=0, columnspan=4, pady=5, sticky=(tk.W, tk.E))
         self.drop_target_frame.grid_propagate(False)
         
-        self.drop_label = ttk.Label(self.drop_target_frame, text="Drag and Drop Source Folder Here", anchor=tk.CENTER)
+        self.drop_label = ttk.Label(self.drop_target_frame, text="Drag and Drop Source Folder or Archive Here", anchor=tk.CENTER)
         self.drop_label.pack(expand=True, fill=tk.BOTH)
 
         self.drop_target_frame.drop_target_register(DND_FILES)
@@ -245,16 +142,18 @@ class ImageConverterApp:
         self.drop_target_frame.dnd_bind('<<DragLeave>>', self.on_drag_leave)
 
         # Source Directory
-        ttk.Label(converter_frame, text="Source Folder:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Label(converter_frame, text="Source Folder or Archive:").grid(row=1, column=0, sticky=tk.W, pady=2)
         source_entry = ttk.Entry(converter_frame, textvariable=self.source_dir, width=50, state="readonly")
         source_entry.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
         ttk.Button(converter_frame, text="Browse...", command=self.select_source_dir).grid(row=2, column=2, sticky=tk.W, padx=5)
+        ttk.Button(converter_frame, text="Archive...", command=self.select_source_archive).grid(row=2, column=3, sticky=tk.W)
 
         # Destination Directory
-        ttk.Label(converter_frame, text="Destination Folder:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Label(converter_frame, text="Destination Folder or Archive:").grid(row=3, column=0, sticky=tk.W, pady=2)
         dest_entry = ttk.Entry(converter_frame, textvariable=self.dest_dir, width=50, state="readonly")
         dest_entry.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
         ttk.Button(converter_frame, text="Browse...", command=self.select_dest_dir).grid(row=4, column=2, sticky=tk.W, padx=5)
+        ttk.Button(converter_frame, text="Archive...", command=self.select_dest_archive).grid(row=4, column=3, sticky=tk.W)
 
         # Quality Slider
         self.quality_label_text = ttk.Label(converter_frame, text="Quality (1-100):")
@@ -264,9 +163,47 @@ class ImageConverterApp:
         self.quality_label_value = ttk.Label(converter_frame, textvariable=self.quality)
         self.quality_label_value.grid(row=6, column=2, sticky=tk.W, padx=5)
 
-        # Convert Button
-        self.convert_button = ttk.Button(converter_frame, text="Convert Images", command=self.start_conversion_thread, state="disabled")
-        self.convert_button.grid(row=7, column=0, columnspan=3, pady=10)
+        # Convert / Pause / Cancel Buttons
+        button_frame = ttk.Frame(converter_frame)
+        button_frame.grid(row=7, column=0, columnspan=4, pady=10)
+        self.convert_button = ttk.Button(button_frame, text="Convert Images", command=self.start_conversion_thread, state="disabled")
+        self.convert_button.pack(side=tk.LEFT, padx=5)
+        self.pause_button = ttk.Button(button_frame, text="Pause", command=self.toggle_pause, state="disabled")
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_conversion, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.queue_button = ttk.Button(button_frame, text="Add to Queue", command=self.add_to_queue, state="disabled")
+        self.queue_button.pack(side=tk.LEFT, padx=5)
+        ttk.Label(button_frame, text="Priority:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Combobox(button_frame, textvariable=self.job_priority, values=list(self.PRIORITIES),
+                     state="readonly", width=8).pack(side=tk.LEFT)
+
+        # Progress (fed from the worker's ProgressChannel on a fixed timer)
+        self.progress_value = tk.DoubleVar(value=0.0)
+        self.progress_bar = ttk.Progressbar(converter_frame, variable=self.progress_value, maximum=1.0)
+        self.progress_bar.grid(row=8, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=2)
+        self.progress_text = tk.StringVar(value="")
+        ttk.Label(converter_frame, textvariable=self.progress_text).grid(row=9, column=0, columnspan=4, sticky=tk.W)
+
+        # --- Queue Tab Widgets ---
+        queue_frame.grid_columnconfigure(0, weight=1)
+        queue_frame.grid_rowconfigure(0, weight=1)
+        self.queue_tree = ttk.Treeview(queue_frame, columns=("priority", "status", "progress"), selectmode="browse")
+        self.queue_tree.heading("#0", text="Job")
+        self.queue_tree.heading("priority", text="Priority")
+        self.queue_tree.heading("status", text="Status")
+        self.queue_tree.heading("progress", text="Progress")
+        self.queue_tree.column("#0", width=260)
+        self.queue_tree.column("priority", width=70, anchor=tk.CENTER)
+        self.queue_tree.column("status", width=80, anchor=tk.CENTER)
+        self.queue_tree.column("progress", width=160)
+        self.queue_tree.grid(row=0, column=0, sticky="nsew")
+        queue_buttons = ttk.Frame(queue_frame)
+        queue_buttons.grid(row=1, column=0, pady=5, sticky=tk.W)
+        ttk.Button(queue_buttons, text="Pause / Resume", command=self.toggle_selected_job).pack(side=tk.LEFT, padx=5)
+        ttk.Button(queue_buttons, text="Cancel Job", command=self.cancel_selected_job).pack(side=tk.LEFT, padx=5)
+        ttk.Button(queue_buttons, text="Clear Finished", command=self.clear_finished_jobs).pack(side=tk.LEFT, padx=5)
+        self.root.after(self.QUEUE_POLL_MS, self._poll_queue)
 
         # --- Preview Tab Widgets ---
         preview_frame.grid_columnconfigure(0, weight=1)
@@ -319,25 +256,90 @@ class ImageConverterApp:
         bg_remove_check = ttk.Checkbutton(settings_frame, text="Remove Background (transparent for PNG, white for others)", 
                                          variable=self.remove_background, command=self.on_bg_remove_change)
         bg_remove_check.grid(row=5, column=1, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="AI Pre-check:").grid(row=12, column=0, sticky=tk.W, pady=(10, 5))
+        ttk.Checkbutton(settings_frame, text="Skip AI for images already transparent or on a flat backdrop",
+                        variable=self.ai_precheck).grid(row=12, column=1, sticky=tk.W, padx=5)
+
+        # Performance
+        ttk.Label(settings_frame, text="Parallel Workers:").grid(row=6, column=0, sticky=tk.W, pady=(10, 5))
+        ttk.Spinbox(settings_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.workers,
+                    width=8).grid(row=6, column=1, sticky=tk.W, padx=5)
+
+        ttk.Label(settings_frame, text="Memory Budget (MP):").grid(row=7, column=0, sticky=tk.W, pady=(10, 5))
+        budget_frame = ttk.Frame(settings_frame)
+        budget_frame.grid(row=7, column=1, sticky=tk.W, padx=5)
+        ttk.Entry(budget_frame, textvariable=self.memory_budget_mp, width=10).pack(side=tk.LEFT)
+        ttk.Label(budget_frame, text="0 = off; limits decoded megapixels in flight").pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(settings_frame, text="Duplicates:").grid(row=8, column=0, sticky=tk.W, pady=(10, 5))
+        dedup_frame = ttk.Frame(settings_frame)
+        dedup_frame.grid(row=8, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(dedup_frame, text="Convert identical source images only once",
+                        variable=self.deduplicate).pack(side=tk.LEFT)
+        ttk.Checkbutton(dedup_frame, text="Also match same pixels in other formats (slower)",
+                        variable=self.dedup_pixel_level).pack(side=tk.LEFT, padx=10)
+
+        # Animation
+        ttk.Label(settings_frame, text="Animation:").grid(row=9, column=0, sticky=tk.W, pady=(10, 5))
+        animation_frame = ttk.Frame(settings_frame)
+        animation_frame.grid(row=9, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(animation_frame, text="Keep GIF/APNG/WebP animation (WebP/PNG output)",
+                        variable=self.keep_animation).pack(side=tk.LEFT)
+        ttk.Label(animation_frame, text="Max FPS:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Entry(animation_frame, textvariable=self.animation_max_fps, width=6).pack(side=tk.LEFT)
+        ttk.Checkbutton(settings_frame, text="Remove background on every animation frame (slow)",
+                        variable=self.animation_remove_background).grid(row=10, column=1, sticky=tk.W, padx=5)
+
+        # PNG Optimization
+        ttk.Label(settings_frame, text="PNG Compression:").grid(row=11, column=0, sticky=tk.W, pady=(10, 5))
+        png_frame = ttk.Frame(settings_frame)
+        png_frame.grid(row=11, column=1, sticky=tk.W, padx=5)
+        ttk.Combobox(png_frame, textvariable=self.png_compression, values=["fast", "balanced", "max"],
+                     state="readonly", width=10).pack(side=tk.LEFT)
+        ttk.Label(png_frame, text="Palette colours:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Entry(png_frame, textvariable=self.png_palette_colors, width=6).pack(side=tk.LEFT)
+        ttk.Label(png_frame, text="0 = lossless").pack(side=tk.LEFT, padx=5)
+
+        # Output Layout
+        ttk.Label(settings_frame, text="Output Names:").grid(row=13, column=0, sticky=tk.W, pady=(10, 5))
+        layout_frame = ttk.Frame(settings_frame)
+        layout_frame.grid(row=13, column=1, sticky=tk.W, padx=5)
+        ttk.Combobox(layout_frame, textvariable=self.output_naming, values=list(OUTPUT_NAMING_MODES),
+                     state="readonly", width=9).pack(side=tk.LEFT)
+        ttk.Label(layout_frame, text="Subfolder levels:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Spinbox(layout_frame, from_=0, to=MAX_SHARD_DEPTH, textvariable=self.output_shard_depth,
+                    width=4).pack(side=tk.LEFT)
+        ttk.Checkbutton(layout_frame, text="Write manifest",
+                        variable=self.output_manifest).pack(side=tk.LEFT, padx=(10, 0))
+
+        ttk.Label(settings_frame, text="Orientation:").grid(row=14, column=0, sticky=tk.W, pady=(10, 5))
+        ttk.Checkbutton(settings_frame, text="Turn photos upright from their EXIF orientation",
+                        variable=self.apply_exif_orientation).grid(row=14, column=1, sticky=tk.W, padx=5)
+
+        ttk.Label(settings_frame, text="Canvas Cache (MB):").grid(row=15, column=0, sticky=tk.W, pady=(10, 5))
+        cache_frame = ttk.Frame(settings_frame)
+        cache_frame.grid(row=15, column=1, sticky=tk.W, padx=5)
+        ttk.Entry(cache_frame, textvariable=self.canvas_cache_mb, width=10).pack(side=tk.LEFT)
+        ttk.Label(cache_frame, text="0 = off; re-runs that change only format/quality just re-encode").pack(side=tk.LEFT, padx=5)
 
         # Save Settings Button
-        ttk.Button(settings_frame, text="Save Settings", command=self.save_settings).grid(row=6, column=0, columnspan=2, pady=10)
+        ttk.Button(settings_frame, text="Save Settings", command=self.save_settings).grid(row=16, column=0, columnspan=2, pady=10)
 
     def handle_drop(self, event):
         # The event.data is a string containing one or more file paths, possibly enclosed in braces
         path_str = event.data.strip('{}')
-        if os.path.isdir(path_str):
+        if os.path.isdir(path_str) or is_archive_path(path_str):
             self.source_dir.set(path_str)
             self.check_paths()
         else:
-            messagebox.showwarning("Invalid Drop", "Please drop a folder, not a file.")
+            messagebox.showwarning("Invalid Drop", "Please drop a folder or a ZIP/TAR archive, not a single file.")
         self.on_drag_leave(event) # Reset style after drop
 
     def on_drag_enter(self, event):
         self.drop_label.config(text="Drop it!")
 
     def on_drag_leave(self, event):
-        self.drop_label.config(text="Drag and Drop Source Folder Here")
+        self.drop_label.config(text="Drag and Drop Source Folder or Archive Here")
 
     def set_theme(self):
         self.style.set_theme(self.theme.get())
@@ -359,14 +361,34 @@ class ImageConverterApp:
         self.update_preview()
 
     def save_settings(self):
-        settings = {
+        # Merge into the existing file so keys without a widget (e.g. tuned AI settings) survive
+        try:
+            settings = load_config(self.config_file)
+        except Exception:
+            settings = {}
+        settings.update({
             "output_width": self.output_width.get(),
             "output_height": self.output_height.get(),
             "output_format": self.output_format.get(),
             "quality": self.quality.get(),
             "theme": self.theme.get(),
-            "remove_background": self.remove_background.get()
-        }
+            "remove_background": self.remove_background.get(),
+            "workers": self._get_positive_int(self.workers, 1),
+            "memory_budget_mp": self._get_non_negative_int(self.memory_budget_mp, 0),
+            "deduplicate": self.deduplicate.get(),
+            "dedup_pixel_level": self.dedup_pixel_level.get(),
+            "keep_animation": self.keep_animation.get(),
+            "animation_max_fps": self._get_non_negative_float(self.animation_max_fps, 0.0),
+            "animation_remove_background": self.animation_remove_background.get(),
+            "png_compression": self.png_compression.get(),
+            "png_palette_colors": min(256, self._get_non_negative_int(self.png_palette_colors, 0)),
+            "ai_precheck": self.ai_precheck.get(),
+            "output_naming": self.output_naming.get(),
+            "output_shard_depth": min(MAX_SHARD_DEPTH, self._get_non_negative_int(self.output_shard_depth, 0)),
+            "output_manifest": self.output_manifest.get(),
+            "apply_exif_orientation": self.apply_exif_orientation.get(),
+            "canvas_cache_mb": self._get_non_negative_int(self.canvas_cache_mb, 0)
+        })
         try:
             with open(self.config_file, 'w') as f:
                 json.dump(settings, f, indent=4)
@@ -386,6 +408,32 @@ class ImageConverterApp:
                     self.quality.set(settings.get("quality", 85))
                     self.theme.set(settings.get("theme", "arc"))
                     self.remove_background.set(settings.get("remove_background", False))
+                    self.workers.set(settings.get("workers", 1))
+                    self.memory_budget_mp.set(settings.get("memory_budget_mp", 0))
+                    self.deduplicate.set(settings.get("deduplicate", False))
+                    self.dedup_pixel_level.set(settings.get("dedup_pixel_level", False))
+                    self.keep_animation.set(settings.get("keep_animation", True))
+                    self.animation_max_fps.set(settings.get("animation_max_fps", 0.0))
+                    self.animation_remove_background.set(settings.get("animation_remove_background", False))
+                    self.png_compression.set(settings.get("png_compression", "balanced"))
+                    self.png_palette_colors.set(settings.get("png_palette_colors", 0))
+                    self.ai_precheck.set(settings.get("ai_precheck", True))
+                    self.output_naming.set(settings.get("output_naming", DEFAULT_OUTPUT_NAMING))
+                    self.output_shard_depth.set(settings.get("output_shard_depth", 0))
+                    self.output_manifest.set(settings.get("output_manifest", False))
+                    self.apply_exif_orientation.set(settings.get("apply_exif_orientation", True))
+                    self.canvas_cache_mb.set(settings.get("canvas_cache_mb", 0))
+                    self.canvas_cache_dir = settings.get("canvas_cache_dir", "")
+                    self.png_report_savings = bool(settings.get("png_report_savings", False))
+                    ai_processes = max(0, int(settings.get("ai_processes", 0)))
+                    # With AI worker processes, keep at least one conversion in flight per process
+                    self.ai_workers = max(0, int(settings.get("ai_workers", 0))) or ai_processes
+                    ai_options = ai_options_from_config(settings)
+                    if ai_processes and not isinstance(self.ai_manager, AIProcessPool):
+                        self.ai_manager = AIProcessPool(ai_processes, **ai_options)
+                        self.scheduler.ai_manager = self.ai_manager
+                    self.ai_manager.threads = ai_options["threads"]  # Applied when the session is created
+                    self.ai_manager.providers = ai_options["providers"]
             # Set theme regardless of whether settings were loaded, to ensure a theme is always applied
             self.set_theme()
             self.on_format_change() # Update UI based on loaded settings
@@ -410,9 +458,25 @@ class ImageConverterApp:
             self.dest_dir.set(path)
             self.check_paths()
 
+    ARCHIVE_FILETYPES = [("Archives", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz"), ("All files", "*.*")]
+
+    def select_source_archive(self):
+        path = filedialog.askopenfilename(filetypes=self.ARCHIVE_FILETYPES)
+        if path:
+            self.source_dir.set(path)
+            self.check_paths()
+
+    def select_dest_archive(self):
+        path = filedialog.asksaveasfilename(filetypes=self.ARCHIVE_FILETYPES, defaultextension=".zip")
+        if path:
+            self.dest_dir.set(path)
+            self.check_paths()
+
     def check_paths(self):
         if self.source_dir.get() and self.dest_dir.get():
-            self.convert_button.config(state="normal")
+            if self.tracked_job is None:
+                self.convert_button.config(state="normal")
+            self.queue_button.config(state="normal")
         self.update_preview()
 
     def _get_positive_int(self, var: tk.Variable, default: int) -> int:
@@ -423,16 +487,36 @@ class ImageConverterApp:
         except (tk.TclError, ValueError, TypeError):
             return default
 
+    def _get_non_negative_int(self, var: tk.Variable, default: int) -> int:
+        """Like _get_positive_int but allows 0 (used for 'off' values)."""
+        try:
+            return max(0, int(var.get()))
+        except (tk.TclError, ValueError, TypeError):
+            return default
+
+    def _get_non_negative_float(self, var: tk.Variable, default: float) -> float:
+        try:
+            return max(0.0, float(var.get()))
+        except (tk.TclError, ValueError, TypeError):
+            return default
+
+    PREVIEW_POLL_MS = 30
+
     def update_preview(self):
+        self._preview_generation += 1
+        generation = self._preview_generation
         source = self.source_dir.get()
         if not source or not os.path.isdir(source):
-            self.preview_before_label.config(image='', text="No image selected")
+            text = "Archive source (no preview)" if source and is_archive_path(source) else "No image selected"
+            self.preview_before_label.config(image='', text=text)
             self.preview_after_label.config(image='', text="Settings will be applied here")
             self.preview_before_label.image = None
             self.preview_after_label.image = None
             return
 
-        image_files = [f for f in os.listdir(source) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
+        image_files = list_image_files(source, sniff=False)  # Runs on every settings change; no reads
+        self.gallery.set_folder(source, image_files)
+        self.gallery.settings_changed()
         if not image_files:
             self.preview_before_label.config(image='', text="No images found in folder")
             self.preview_after_label.config(image='', text="Settings will be applied here")
@@ -441,120 +525,34 @@ class ImageConverterApp:
             return
 
         first_image_path = os.path.join(source, image_files[0])
+        if self.preview_file and os.path.dirname(self.preview_file) == source and os.path.exists(self.preview_file):
+            first_image_path = self.preview_file
         
         try:
             # We need to update the UI to get correct widget sizes
             self.root.update_idletasks()
-            original_image = Image.open(first_image_path)
-
-            # --- Before Preview ---
-            pad = 10 # Small padding
-            w_before = self.preview_before_label.winfo_width() - pad
-            h_before = self.preview_before_label.winfo_height() - pad
-            
-            if w_before < pad or h_before < pad: # Fallback if widget size isn't available
-                w_before, h_before = 250, 250
-
-            img_before_thumb = original_image.copy()
-            img_before_thumb.thumbnail((w_before, h_before))
-            self.photo_before = ImageTk.PhotoImage(img_before_thumb)
+            before_box = self._preview_box(self.preview_before_label)
+            after_box = self._preview_box(self.preview_after_label)
+            settings = self.get_conversion_settings()
+
+            # --- Pass 1: instant draft (reduced decode, fast resample, composited at display size) ---
+            with Image.open(first_image_path) as original_image:
+                orientation = read_orientation(original_image) if settings.apply_exif_orientation else 1
+                original_image.thumbnail(before_box, Image.Resampling.BILINEAR)  # Uses JPEG draft/reduce internally
+                self.photo_before = ImageTk.PhotoImage(apply_orientation(original_image, orientation))
+                draft_after = render_preview_draft(original_image, settings, after_box)
             self.preview_before_label.config(image=self.photo_before, text="")
             self.preview_before_label.image = self.photo_before
 
-            # --- After Preview ---
-            output_width = self._get_positive_int(self.output_width, 500)
-            output_height = self._get_positive_int(self.output_height, 500)
-            output_format = self.output_format.get()
-
-            # Create the image as it would be after conversion settings are applied
-            img_after_base = original_image.copy()
-            
-            # Apply background removal if enabled
-            if self.remove_background.get():
-                try:
-                    session = self.get_bg_removal_session()
-                    if session is not None:
-                        # Convert to bytes for rembg processing
-                        from io import BytesIO
-                        img_bytes = BytesIO()
-                        img_after_base.save(img_bytes, format='PNG')
-                        img_bytes.seek(0)
-                        
-                        # Remove background
-                        bg_removed_bytes = self.ai_manager.remove_background(img_bytes.getvalue())
-                        if bg_removed_bytes is not None:
-                            bg_removed_img = Image.open(BytesIO(bg_removed_bytes))
-                            img_after_base = bg_removed_img
-                        else:
-                            print("Warning: Background removal failed, continuing without AI")
-                    else:
-                        print("Warning: Background removal session not available")
-                except Exception as e:
-                    print(f"Background removal failed in preview: {e}")
-            
-            # Handle transparency correctly for the conversion process
-            if self.remove_background.get():
-                # For background removal, handle transparency based on output format
-                if img_after_base.mode != "RGBA":
-                    img_after_base = img_after_base.convert("RGBA")
-                
-                # If output format is not PNG, apply white background
-                if output_format != "PNG":
-                    white_background = Image.new("RGB", img_after_base.size, (255, 255, 255))
-                    white_background.paste(img_after_base, mask=img_after_base)
-                    img_after_base = white_background
-            else:
-                # Normal transparency handling for non-background-removed images
-                if output_format != "PNG" and (img_after_base.mode in ('RGBA', 'LA') or (img_after_base.mode == 'P' and 'transparency' in img_after_base.info)):
-                    background_flatten = Image.new("RGB", img_after_base.size, (255, 255, 255))
-                    img_rgba = img_after_base.convert("RGBA")
-                    background_flatten.paste(img_rgba, mask=img_rgba)
-                    img_after_base = background_flatten
-                elif img_after_base.mode not in ("RGB", "RGBA"):
-                    img_after_base = img_after_base.convert("RGB")
-
-            # Calculate scaling to fit within target dimensions while maintaining aspect ratio
-            img_width, img_height = img_after_base.size
-            scale_factor = min(output_width / img_width, output_height / img_height)
-            
-            # Only resize if we need to scale (either up or down)
-            if scale_factor != 1.0:
-                new_width = int(img_width * scale_factor)
-                new_height = int(img_height * scale_factor)
-                img_after_base = img_after_base.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Create a new background for pasting the scaled image (letterboxing)
-            # Use white background for non-PNG formats, transparent for PNG
-            if output_format == "PNG":
-                final_processed_image = Image.new('RGBA', (output_width, output_height), (255, 255, 255, 0))
-            else:
-                final_processed_image = Image.new('RGB', (output_width, output_height), (255, 255, 255))
-            
-            paste_x = (output_width - img_after_base.width) // 2
-            paste_y = (output_height - img_after_base.height) // 2
-            
-            # Use appropriate paste method for transparency
-            if img_after_base.mode == 'RGBA' and output_format == "PNG":
-                final_processed_image.paste(img_after_base, (paste_x, paste_y), img_after_base)
-            else:
-                final_processed_image.paste(img_after_base, (paste_x, paste_y))
-
-            if output_format != "PNG":
-                final_processed_image = final_processed_image.convert("RGB")
-
-            # Now, create a thumbnail of this final processed image for the preview display
-            w_after = self.preview_after_label.winfo_width() - pad
-            h_after = self.preview_after_label.winfo_height() - pad
-            if w_after < pad or h_after < pad: # Fallback
-                w_after, h_after = 250, 250
-
-            display_thumb = final_processed_image.copy()
-            display_thumb.thumbnail((w_after, h_after))
-
-            self.photo_after = ImageTk.PhotoImage(display_thumb)
+            self.photo_after = ImageTk.PhotoImage(draft_after)
             self.preview_after_label.config(image=self.photo_after, text="")
             self.preview_after_label.image = self.photo_after
 
+            # --- Pass 2: exact output (full pipeline + encode) rendered off the Tk thread ---
+            future = self._preview_executor.submit(self._render_refined_preview, generation,
+                                                   first_image_path, settings, after_box)
+            self.root.after(self.PREVIEW_POLL_MS, self._poll_refined_preview, future, generation)
+
         except Exception as e:
             self.preview_before_label.config(image='', text="Error loading image")
             self.preview_after_label.config(image='', text="Preview Error")
@@ -562,135 +560,278 @@ class ImageConverterApp:
             self.preview_after_label.image = None
             print(f"Preview Error: {e}")
 
+    def select_preview_file(self, path: str):
+        """Gallery click: show this file on the Preview tab."""
+        self.preview_file = path
+        self.notebook.select(self.preview_frame)
+        self.update_preview()
+
+    def _gallery_after_renderer(self):
+        """Snapshot settings on the Tk thread for After thumbnails rendered by gallery workers."""
+        settings = self.get_conversion_settings()
+
+        def _render(path: str) -> Image.Image:
+            return render_file(path, settings, self.ai_manager)
+        return f"after-{settings.fingerprint()}", _render
+
+    def _preview_box(self, label: ttk.Label) -> tuple[int, int]:
+        pad = 10 # Small padding
+        width = label.winfo_width() - pad
+        height = label.winfo_height() - pad
+        if width < pad or height < pad: # Fallback if widget size isn't available
+            return 250, 250
+        return width, height
+
+    def _render_refined_preview(self, generation: int, image_path: str,
+                                settings: ConversionSettings, box: tuple[int, int]) -> Optional[Image.Image]:
+        """Preview worker: identical to convert_file up to the encoded bytes, then thumbnailed for display."""
+        if generation != self._preview_generation:
+            return None  # Superseded by a newer settings change before it started
+        canvas = render_file(image_path, settings, self.ai_manager)
+        if generation != self._preview_generation:
+            return None
+        # Round-trip through the encoder so quality/format artifacts match the real output
+        encoded = Image.open(BytesIO(encode_image(canvas, settings)))
+        encoded.load()
+        encoded.thumbnail(box)
+        return encoded
+
+    def _poll_refined_preview(self, future, generation: int):
+        if generation != self._preview_generation:
+            return
+        if not future.done():
+            self.root.after(self.PREVIEW_POLL_MS, self._poll_refined_preview, future, generation)
+            return
+        try:
+            refined = future.result()
+        except Exception as e:
+            print(f"Preview Error: {e}")
+            return
+        if refined is None:
+            return
+        self.photo_after = ImageTk.PhotoImage(refined)
+        self.preview_after_label.config(image=self.photo_after, text="")
+        self.preview_after_label.image = self.photo_after
+
+    PROGRESS_POLL_MS = 200  # UI refresh interval while a job runs, independent of file rate
+    QUEUE_POLL_MS = 500  # Queue tab refresh interval
+    PRIORITIES = {"High": PRIORITY_HIGH, "Normal": PRIORITY_NORMAL, "Low": PRIORITY_LOW}
+
+    def _job_spec(self) -> JobSpec:
+        """Freeze the current paths and settings into a job; later UI edits do not affect it."""
+        source, dest = self.source_dir.get(), self.dest_dir.get()
+        return JobSpec(source, dest, self.get_conversion_settings(),
+                       priority=self.PRIORITIES.get(self.job_priority.get(), PRIORITY_NORMAL),
+                       workers=self._conversion_workers(), deduplicate=self.deduplicate.get(),
+                       label=f"{os.path.basename(source) or source} -> {os.path.basename(dest) or dest}")
+
     def start_conversion_thread(self):
         self.convert_button.config(state="disabled")
         self.status_var.set("Starting conversion...")
-        thread = threading.Thread(target=self.convert_images)
-        thread.start()
-
-    def convert_images(self):
-        try:
-            source = self.source_dir.get()
-            dest = self.dest_dir.get()
-            quality = self.quality.get()
-            width = self._get_positive_int(self.output_width, 500)
-            height = self._get_positive_int(self.output_height, 500)
-            output_format = self.output_format.get()
-            
-            image_files = [f for f in os.listdir(source) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
-            total_files = len(image_files)
-            converted_count = 0
-            skipped_count = 0
-
-            for i, filename in enumerate(image_files):
-                self.status_var.set(f"Converting {i+1}/{total_files}...")
-                try:
-                    image_path = os.path.join(source, filename)
-                    img = Image.open(image_path)
-                    img_original_mode = img.mode
-
-                    # Apply background removal if enabled
-                    if self.remove_background.get():
-                        try:
-                            session = self.get_bg_removal_session()
-                            if session is not None:
-                                from io import BytesIO
-                                img_bytes = BytesIO()
-                                img.save(img_bytes, format='PNG')
-                                img_bytes.seek(0)
-
-                                # Timed background removal (won't hang indefinitely)
-                                bg_removed_bytes = self.ai_manager.remove_background(img_bytes.getvalue())
-                                if bg_removed_bytes is not None:
-                                    bg_removed_img = Image.open(BytesIO(bg_removed_bytes))
-                                    img = bg_removed_img
-                                    # Note: No longer forcing PNG format - user choice is respected
-                                else:
-                                    if self.ai_manager.last_error:
-                                        print(f"Warning: AI skip for {filename}: {self.ai_manager.last_error}")
-                                    else:
-                                        print(f"Warning: Background removal failed or timed out for {filename}")
-                            else:
-                                print(f"Warning: Background removal session not available for {filename} (init failed or timed out)")
-                        except Exception as e:
-                            print(f"Background removal failed for {filename}: {e}\n{traceback.format_exc()}")
-
-                    # Handle transparency
-                    if self.remove_background.get():
-                        # For background removal, handle transparency based on output format
-                        if img.mode != "RGBA":
-                            img = img.convert("RGBA")
-                        
-                        # If output format is not PNG, apply white background
-                        if output_format != "PNG":
-                            white_background = Image.new("RGB", img.size, (255, 255, 255))
-                            white_background.paste(img, mask=img)
-                            img = white_background
-                    else:
-                        # Normal transparency handling for non-background-removed images
-                        if output_format == "PNG" and img_original_mode in ('RGBA', 'LA', 'P'):
-                            img = img.convert("RGBA")
-                        else:
-                            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                                background_for_flattening = Image.new("RGB", img.size, (255, 255, 255))
-                                img_rgba = img.convert("RGBA")
-                                background_for_flattening.paste(img_rgba, mask=img_rgba)
-                                img = background_for_flattening
-                            else:
-                                img = img.convert('RGB')
-
-                    # Calculate scaling to fit within target dimensions while maintaining aspect ratio
-                    img_width, img_height = img.size
-                    scale_factor = min(width / img_width, height / img_height)
-                    
-                    # Only resize if we need to scale (either up or down)
-                    if scale_factor != 1.0:
-                        new_width = int(img_width * scale_factor)
-                        new_height = int(img_height * scale_factor)
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Create appropriate background based on output format and transparency
-                    if output_format == "PNG" and (self.remove_background.get() or img.mode == 'RGBA'):
-                        background = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-                    else:
-                        background = Image.new('RGB', (width, height), (255, 255, 255))
-                    
-                    paste_x = (width - img.width) // 2
-                    paste_y = (height - img.height) // 2
-                    
-                    # Use appropriate paste method for transparency
-                    if img.mode == 'RGBA' and background.mode == 'RGBA':
-                        background.paste(img, (paste_x, paste_y), img)
-                    else:
-                        background.paste(img, (paste_x, paste_y))
-
-                    base_filename, _ = os.path.splitext(filename)
-                    output_extension = output_format.lower()
-                    output_filename = f"{base_filename}.{output_extension}"
-                    output_path = os.path.join(dest, output_filename)
-                    
-                    save_params = {'quality': quality} if output_format in ['WebP', 'JPEG'] else {}
-                    background.save(output_path, output_format, **save_params)
-                    converted_count += 1
-
-                except Exception as e:
-                    print(f"Skipping {filename}: {e}")
-                    skipped_count += 1
-                    continue
-            
-            self.status_var.set(f"Conversion complete! Converted: {converted_count}, Skipped: {skipped_count}")
-            # Provide final note if AI never initialized
-            ai_note = ""
-            if self.remove_background.get() and self.ai_manager.last_error:
-                ai_note = f"\n\n(Background removal disabled: {self.ai_manager.last_error})"
-            messagebox.showinfo("Success", f"Conversion complete!\n\nSuccessfully converted: {converted_count}\nSkipped: {skipped_count}{ai_note}")
+        self.progress_value.set(0.0)
+        self.progress_text.set("")
+        self.progress_channel = ProgressChannel()
+        self.progress_stats = ProgressStats()
+        spec = self._job_spec()
+        self.conversion_settings = spec.settings
+        self.tracked_job = self.scheduler.submit(spec, channel=self.progress_channel)
+        self.job_control = self.tracked_job.control
+        self.pause_button.config(state="normal", text="Pause")
+        self.cancel_button.config(state="normal", text="Cancel")
+        self.root.after(self.PROGRESS_POLL_MS, self._poll_progress)
+
+    def add_to_queue(self):
+        """Queue a job without tying up the Converter tab; progress shows on the Queue tab."""
+        job = self.scheduler.submit(self._job_spec())
+        self._queue_stats[job.id] = ProgressStats()
+        self.status_var.set(f"Queued: {job.spec.label} ({self.job_priority.get()} priority)")
+        self._refresh_queue_tree()
+
+    def _conversion_workers(self) -> int:
+        if self.remove_background.get() and self.ai_workers:
+            return self.ai_workers  # AI jobs are limited by inference throughput, not decode/encode
+        return self._get_positive_int(self.workers, 1)
+
+    def toggle_pause(self):
+        """Pause stops handing out new files; files already being converted finish."""
+        if self.job_control.is_paused:
+            self.scheduler.resume(self.tracked_job.id)
+            self.pause_button.config(text="Pause")
+        else:
+            self.scheduler.pause(self.tracked_job.id)
+            self.pause_button.config(text="Resume")
+
+    def cancel_conversion(self):
+        """First press lets in-flight files finish; a second press aborts them too."""
+        if not self.job_control.is_cancelled:
+            self.scheduler.cancel(self.tracked_job.id)
+            self.cancel_button.config(text="Abort Now")
+        else:
+            self.scheduler.cancel(self.tracked_job.id, abort_in_flight=True)
+            self.cancel_button.config(state="disabled")
+        self.pause_button.config(state="disabled")
+
+    def get_conversion_settings(self) -> ConversionSettings:
+        """Snapshot the current Settings tab values so a running job is unaffected by later edits."""
+        return ConversionSettings(
+            output_width=self._get_positive_int(self.output_width, 500),
+            output_height=self._get_positive_int(self.output_height, 500),
+            output_format=self.output_format.get(),
+            quality=self.quality.get(),
+            remove_background=self.remove_background.get(),
+            memory_budget_mp=self._get_non_negative_int(self.memory_budget_mp, 0),
+            keep_animation=self.keep_animation.get(),
+            animation_max_fps=self._get_non_negative_float(self.animation_max_fps, 0.0),
+            animation_remove_background=self.animation_remove_background.get(),
+            png_compression=self.png_compression.get(),
+            png_palette_colors=min(256, self._get_non_negative_int(self.png_palette_colors, 0)),
+            ai_precheck=self.ai_precheck.get(),
+            output_naming=self.output_naming.get(),
+            output_shard_depth=min(MAX_SHARD_DEPTH, self._get_non_negative_int(self.output_shard_depth, 0)),
+            output_manifest=self.output_manifest.get(),
+            apply_exif_orientation=self.apply_exif_orientation.get(),
+            canvas_cache_mb=self._get_non_negative_int(self.canvas_cache_mb, 0),
+            canvas_cache_dir=self.canvas_cache_dir,
+            png_report_savings=self.png_report_savings,
+            dedup_pixel_level=self.dedup_pixel_level.get(),
+        )
+
+    def _poll_progress(self):
+        """Tk-side drain of the progress channel; reschedules itself until the job ends."""
+        final_event = None
+        for event in self.progress_channel.drain():
+            if event.kind in ("finished", "error"):
+                final_event = event
+            else:
+                self.progress_stats.add(event)
+
+        stats = self.progress_stats
+        self.progress_value.set(stats.fraction)
+        self.progress_text.set(stats.describe() if stats.total else "")
+        if final_event is None:
+            if self.job_control.is_cancelled:
+                self.status_var.set(f"Cancelling... waiting for files in progress ({stats.done}/{stats.total})")
+            elif self.job_control.is_paused:
+                self.status_var.set(f"Paused at {stats.done}/{stats.total}")
+            elif stats.total:
+                self.status_var.set(f"Converting {stats.done}/{stats.total}...")
+            self.root.after(self.PROGRESS_POLL_MS, self._poll_progress)
+            return
 
-        except Exception as e:
+        self.tracked_job = None
+        self.convert_button.config(state="normal")
+        self.pause_button.config(state="disabled", text="Pause")
+        self.cancel_button.config(state="disabled", text="Cancel")
+        if final_event.kind == "error":
             self.status_var.set("Error!")
-            messagebox.showerror("Error", f"An unexpected error occurred:\n{e}")
-        
-        finally:
-            self.convert_button.config(state="normal")
+            messagebox.showerror("Error", f"An unexpected error occurred:\n{final_event.payload}")
+            return
+        if final_event.payload.cancelled and self.scheduler.active_count == 0:
+            # Free the model memory; an abandoned AI call holds at most one reference until it times out
+            self.ai_manager.release()
+        self._show_summary(final_event.payload)
+
+    def _selected_job(self):
+        selection = self.queue_tree.selection()
+        return self.scheduler.get(selection[0]) if selection else None
+
+    def toggle_selected_job(self):
+        job = self._selected_job()
+        if job is None or not job.is_active:
+            return
+        if job.control.is_paused:
+            self.scheduler.resume(job.id)
+        else:
+            self.scheduler.pause(job.id)
+        if job is self.tracked_job:
+            self.pause_button.config(text="Resume" if job.control.is_paused else "Pause")
+        self._refresh_queue_tree()
+
+    def cancel_selected_job(self):
+        job = self._selected_job()
+        if job is None or not job.is_active:
+            return
+        if job is self.tracked_job:
+            self.cancel_conversion()
+        else:
+            self.scheduler.cancel(job.id)
+        self._refresh_queue_tree()
+
+    def clear_finished_jobs(self):
+        self.scheduler.forget_finished()
+        self._queue_stats = {job_id: stats for job_id, stats in self._queue_stats.items()
+                             if self.scheduler.get(job_id) is not None}
+        self._refresh_queue_tree()
+
+    def _poll_queue(self):
+        """Drain queued (non-Converter-tab) jobs and refresh the Queue tab."""
+        for job in self.scheduler.jobs():
+            stats = self._queue_stats.get(job.id)
+            if stats is None:
+                continue  # The tracked job's channel belongs to _poll_progress
+            for event in job.channel.drain():
+                if event.kind == "finished":
+                    summary = event.payload
+                    outcome = "cancelled" if summary.cancelled else "done"
+                    self.status_var.set(f"Queued job {outcome}: {job.spec.label} "
+                                        f"(Converted: {summary.converted}, Skipped: {summary.skipped})")
+                elif event.kind == "error":
+                    self.status_var.set(f"Queued job failed: {job.spec.label} ({event.payload})")
+                else:
+                    stats.add(event)
+        self._refresh_queue_tree()
+        self.root.after(self.QUEUE_POLL_MS, self._poll_queue)
+
+    def _refresh_queue_tree(self):
+        names = {value: name for name, value in self.PRIORITIES.items()}
+        jobs = self.scheduler.jobs()
+        existing = set(self.queue_tree.get_children())
+        for job in jobs:
+            if job is self.tracked_job:
+                stats = self.progress_stats
+            else:
+                stats = self._queue_stats.get(job.id)
+            status = "paused" if job.is_active and job.control.is_paused else job.state
+            progress = stats.describe() if stats is not None and stats.total else ""
+            values = (names.get(job.spec.priority, str(job.spec.priority)), status, progress)
+            if job.id in existing:
+                self.queue_tree.item(job.id, values=values)
+            else:
+                self.queue_tree.insert("", tk.END, iid=job.id, text=job.spec.label or job.id, values=values)
+        for index, job in enumerate(jobs):
+            self.queue_tree.move(job.id, "", index)
+        for stale in existing - {job.id for job in jobs}:
+            self.queue_tree.delete(stale)
+
+    def _show_summary(self, summary: BatchSummary):
+        converted_count = summary.converted
+        skipped_count = summary.skipped
+        if summary.cancelled:
+            self.status_var.set(f"Conversion cancelled. Converted: {converted_count}, Skipped: {skipped_count}")
+            messagebox.showinfo("Cancelled", f"Conversion cancelled.\n\nSuccessfully converted: {converted_count}\n"
+                                             f"Skipped: {skipped_count}\nAlready done (resumed): {summary.resumed}\n"
+                                             f"Not processed: {summary.not_processed}\n\n"
+                                             "Run the same job again to continue where it stopped.")
+            return
+        self.status_var.set(f"Conversion complete! Converted: {converted_count}, Skipped: {skipped_count}")
+        details_note = ""
+        if summary.resumed:
+            details_note = f"\nAlready done (resumed): {summary.resumed}"
+        if summary.rejected:
+            details_note += f"\nRejected (not a supported image, never opened): {summary.rejected}"
+        if summary.deduplicated:
+            details_note += (f"\nDuplicates filled without re-processing: {summary.deduplicated} "
+                             f"({summary.dedup_bytes_saved / (1024 * 1024):.1f} MB of source skipped)")
+        if summary.ai_inferences_avoided:
+            details_note += (f"\nAI skipped (already transparent, flat backdrop or cached): {summary.ai_inferences_avoided} "
+                             f"of {summary.ai_inferences + summary.ai_inferences_avoided}")
+        if summary.png_bytes_saved:
+            details_note += f"\nPNG optimization saved: {summary.png_bytes_saved / (1024 * 1024):.2f} MB"
+        # Provide final note if AI never initialized
+        ai_note = ""
+        if self.conversion_settings.remove_background and self.ai_manager.last_error:
+            ai_note = f"\n\n(Background removal disabled: {self.ai_manager.last_error})"
+        messagebox.showinfo("Success", f"Conversion complete!\n\nSuccessfully converted: {converted_count}\nSkipped: {skipped_count}{details_note}{ai_note}")
 
 
 def launch_main_application():
@@ -700,6 +841,7 @@ def launch_main_application():
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # AI worker processes (ai_processes) in the frozen executable
     # Import loading screen
     try:
         from loading_screen import show_loading_screen
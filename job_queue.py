@@ -0,0 +1,260 @@
+"""
+SHH Image Converter - Job Queue
+Many conversion jobs, one worker pool and one warm AI session.
+
+Each job is a frozen JobSpec captured at submission time, so later edits in
+the Settings tab never leak into a queued or running job. Workers pick work
+one task (a file, or a chunk of small files) at a time from the highest-priority
+job that has work left, so a small urgent job starts on the next free worker
+instead of waiting for a long batch to finish.
+"""
+
+import itertools
+import json
+import threading
+import traceback
+from dataclasses import asdict, dataclass, field, fields
+from typing import Optional
+
+from conversion_pipeline import AIManager, BatchRun, BatchSummary, ConversionSettings, JobControl, open_batch_run
+from progress_channel import ProgressChannel, ProgressEvent
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+@dataclass(frozen=True)
+class JobSpec:
+    """Everything one job needs, fixed when it is submitted."""
+    source: str
+    dest: str
+    settings: ConversionSettings = field(default_factory=ConversionSettings)
+    priority: int = PRIORITY_NORMAL  # Higher runs first; equal priorities run in submission order
+    workers: int = 1  # Max files of this job converted at once
+    deduplicate: bool = False
+    resume: bool = True
+    label: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "JobSpec":
+        """Inverse of to_dict(); unknown keys (e.g. from a newer version) are ignored."""
+        known = {f.name for f in fields(ConversionSettings)}
+        settings = ConversionSettings(**{k: v for k, v in data.get("settings", {}).items() if k in known})
+        spec_keys = {f.name for f in fields(cls)} - {"settings"}
+        return cls(settings=settings, **{k: v for k, v in data.items() if k in spec_keys})
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text: str) -> "JobSpec":
+        return cls.from_dict(json.loads(text))
+
+class QueuedJob:
+    """Scheduler-side state of one submitted JobSpec.
+
+    state is 'queued', 'starting', 'running', 'finishing', then 'finished', 'cancelled'
+    or 'failed'. The channel receives the usual per-file events followed by one
+    'finished' (payload: BatchSummary) or 'error' event.
+    """
+
+    def __init__(self, job_id: str, spec: JobSpec, seq: int, channel: ProgressChannel):
+        self.id = job_id
+        self.spec = spec
+        self.seq = seq
+        self.channel = channel
+        self.control = JobControl()
+        self.state = "queued"
+        self.run: Optional[BatchRun] = None
+        self.in_flight = 0
+        self.summary: Optional[BatchSummary] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    @property
+    def is_active(self) -> bool:
+        return not self.done.is_set()
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        return (-self.spec.priority, self.seq)
+
+_START = object()
+_FINISH = object()
+
+class JobScheduler:
+    """Priority scheduler over a shared pool of worker threads."""
+    IDLE_WAIT_SEC = 0.25  # Re-check paused jobs even without a notify
+
+    def __init__(self, workers: int = 2, ai_manager: Optional[AIManager] = None):
+        self.ai_manager = ai_manager
+        self._cond = threading.Condition()
+        self._jobs: dict[str, QueuedJob] = {}
+        self._seq = itertools.count(1)
+        self._threads: list[threading.Thread] = []
+        self._shutdown = False
+        self.ensure_workers(workers)
+
+    @property
+    def workers(self) -> int:
+        return len(self._threads)
+
+    def ensure_workers(self, count: int):
+        """Grow the pool to at least count threads (it never shrinks while running)."""
+        with self._cond:
+            while len(self._threads) < max(1, count):
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          name=f"job-worker-{len(self._threads) + 1}")
+                self._threads.append(thread)
+                thread.start()
+
+    # --- Public API ---
+    def submit(self, spec: JobSpec, channel: Optional[ProgressChannel] = None) -> QueuedJob:
+        self.ensure_workers(spec.workers)
+        with self._cond:
+            seq = next(self._seq)
+            job = QueuedJob(f"job-{seq}", spec, seq, channel or ProgressChannel())
+            self._jobs[job.id] = job
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[QueuedJob]:
+        """All jobs in scheduling order (finished jobs last)."""
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda j: (not j.is_active,) + j.sort_key)
+
+    @property
+    def active_count(self) -> int:
+        return sum(1 for job in list(self._jobs.values()) if job.is_active)
+
+    def pause(self, job_id: str):
+        self._jobs[job_id].control.pause()
+
+    def resume(self, job_id: str):
+        self._jobs[job_id].control.resume()
+        with self._cond:
+            self._cond.notify_all()
+
+    def cancel(self, job_id: str, abort_in_flight: bool = False):
+        with self._cond:
+            job = self._jobs[job_id]
+            job.control.cancel(abort_in_flight)
+            if job.state == "queued":
+                # Never started: nothing to clean up
+                job.summary = BatchSummary(cancelled=True)
+                self._complete(job, "cancelled", ProgressEvent("finished", payload=job.summary))
+            self._cond.notify_all()
+
+    def forget_finished(self):
+        with self._cond:
+            for job_id in [j.id for j in self._jobs.values() if not j.is_active]:
+                del self._jobs[job_id]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[BatchSummary]:
+        job = self._jobs[job_id]
+        job.done.wait(timeout)
+        return job.summary
+
+    def shutdown(self, cancel: bool = True, wait: bool = True):
+        with self._cond:
+            if cancel:
+                for job in self._jobs.values():
+                    job.control.cancel(abort_in_flight=True)
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    # --- Workers ---
+    def _complete(self, job: QueuedJob, state: str, event: ProgressEvent):
+        job.state = state
+        job.channel.publish(event)
+        job.done.set()
+
+    def _pick(self):
+        """Under the lock: the next (job, step) to run, or None if nothing is runnable."""
+        for job in sorted(self._jobs.values(), key=lambda j: j.sort_key):
+            if job.state == "queued" and not job.control.is_paused:
+                job.state = "starting"  # Listing/dedup planning can be slow; done outside the lock
+                return job, _START
+            if job.state != "running":
+                continue
+            exhausted = job.control.is_cancelled
+            if not job.control.is_paused and job.in_flight < max(1, job.spec.workers):
+                task = job.run.next_task()
+                if task is not None:
+                    job.in_flight += 1
+                    return job, task
+                exhausted = True
+            # Nothing left to hand out (or cancelled): the last worker out finishes the job
+            if exhausted and job.in_flight == 0:
+                job.state = "finishing"
+                return job, _FINISH
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = None
+                while not self._shutdown and (task := self._pick()) is None:
+                    self._cond.wait(self.IDLE_WAIT_SEC)
+                if self._shutdown:
+                    return
+            job, step = task
+            if step is _START:
+                self._start(job)
+            elif step is _FINISH:
+                self._finish(job)
+            else:
+                try:
+                    for event in job.run.convert_task(step):
+                        job.run.record(event)
+                except Exception as e:
+                    # Stop handing out this job's tasks; the last worker out finishes it as failed
+                    print(f"Job {job.id} failed: {e}\n{traceback.format_exc()}")
+                    job.error = job.error or str(e)
+                    job.control.cancel(abort_in_flight=True)
+                finally:
+                    with self._cond:
+                        job.in_flight -= 1
+                        self._cond.notify_all()
+
+    def _finish(self, job: QueuedJob):
+        """Finalize outside the lock: archive close and journal flush must not stall other jobs."""
+        try:
+            summary = job.run.finish()
+        except Exception as e:
+            print(f"Job {job.id} failed while finishing: {e}\n{traceback.format_exc()}")
+            job.error = job.error or str(e)
+            summary = job.run.summary
+        with self._cond:
+            job.summary = summary
+            if job.error:
+                self._complete(job, "failed", ProgressEvent("error", payload=job.error))
+            else:
+                self._complete(job, "cancelled" if summary.cancelled else "finished",
+                               ProgressEvent("finished", payload=summary))
+            self._cond.notify_all()
+
+    def _start(self, job: QueuedJob):
+        spec = job.spec
+        try:
+            run = open_batch_run(spec.source, spec.dest, spec.settings, self.ai_manager, spec.resume,
+                                 spec.deduplicate, channel=job.channel, control=job.control, workers=spec.workers)
+            run.start()
+        except Exception as e:
+            with self._cond:
+                job.error = str(e)
+                self._complete(job, "failed", ProgressEvent("error", payload=str(e)))
+            return
+        with self._cond:
+            job.run = run
+            job.state = "running"
+            self._cond.notify_all()
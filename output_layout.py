@@ -0,0 +1,147 @@
+"""
+SHH Image Converter - Output Layout
+Where each converted file goes: naming, collision handling, sharding and the manifest.
+
+Naming modes:
+  stem      photo.png -> photo.webp (the classic layout)
+  keep_ext  photo.png -> photo.png.webp
+  hash      photo.png -> photo-<content hash>.webp
+
+In every mode a batch never lets two sources write the same output; a file whose
+name collides (case-insensitively, as on Windows and SMB shares) with an earlier
+one falls back to keeping its extension, then to a numeric suffix. Sharding puts
+each output under hash-prefix subfolders (ab/cd/name.webp) so no single folder
+grows past a few thousand entries on huge batches.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import threading
+from typing import Iterable, Optional
+
+OUTPUT_NAMING_MODES = ("stem", "keep_ext", "hash")
+DEFAULT_OUTPUT_NAMING = "stem"
+MAX_SHARD_DEPTH = 3  # 256^3 folders is already far more than any batch needs
+HASH_SUFFIX_CHARS = 12
+MANIFEST_FILENAME = "shh_manifest.jsonl"
+CHUNK_BYTES = 1024 * 1024
+
+def content_digest(path: str) -> str:
+    """Hex digest of a file's bytes (streamed, so large sources are never held in memory)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def bytes_digest(data: bytes) -> str:
+    """content_digest() for bytes already in memory (archive entries)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def output_name_for(filename: str, extension: str, naming: str = DEFAULT_OUTPUT_NAMING,
+                    digest: str = "") -> str:
+    """Output file name (no folders) for a source name; hash naming needs the content digest."""
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    if naming == "keep_ext" and ext:
+        stem = f"{stem}.{ext[1:]}"
+    elif naming == "hash":
+        stem = f"{stem}-{digest[:HASH_SUFFIX_CHARS]}"
+    return f"{stem}.{extension}"
+
+def shard_subdir(output_name: str, depth: int) -> str:
+    """Relative folder for output_name: depth levels of two hex chars from a hash of the name."""
+    if depth <= 0:
+        return ""
+    key = hashlib.sha1(output_name.lower().encode("utf-8")).hexdigest()
+    return os.path.join(*(key[i * 2:i * 2 + 2] for i in range(min(depth, MAX_SHARD_DEPTH))))
+
+def plan_output_names(filenames: Iterable[str], extension: str,
+                      naming: str = DEFAULT_OUTPUT_NAMING) -> dict[str, str]:
+    """Output names for the files whose default name collides with another file in the batch.
+
+    Files are considered in sorted order, so the first keeps its usual name and the
+    assignment is the same on every run over the same folder. Hash names only
+    collide for identical content under the same stem, which needs no renaming.
+    """
+    if naming == "hash":
+        return {}
+    taken: set[str] = set()
+    renamed: dict[str, str] = {}
+    for filename in sorted(filenames):
+        name = claim_output_name(filename, extension, taken, naming)
+        if name != output_name_for(filename, extension, naming):
+            renamed[filename] = name
+    return renamed
+
+def claim_output_name(filename: str, extension: str, taken: set[str],
+                      naming: str = DEFAULT_OUTPUT_NAMING, digest: str = "") -> str:
+    """Output name for filename that is not in taken yet, and add it to taken.
+
+    filename may carry '/'-separated folders (archive entries); they are kept, and
+    taken holds lower-cased relative names. A collision falls back to keeping the
+    source extension, then to a numeric suffix.
+    """
+    folder, base = posixpath.split(filename)
+    name = posixpath.join(folder, output_name_for(base, extension, naming, digest))
+    if name.lower() in taken:
+        name = posixpath.join(folder, f"{base}.{extension}")  # keep_ext form: photo.jpg -> photo.jpg.<ext>
+        counter = 2
+        while name.lower() in taken:
+            name = posixpath.join(folder, f"{base}-{counter}.{extension}")
+            counter += 1
+        print(f"Output name collision: {filename} -> {name}")
+    taken.add(name.lower())
+    return name
+
+class OutputManifest:
+    """Append-only source -> output map written next to the outputs.
+
+    One JSON object per line with the source name, the output path relative to
+    the destination (always '/'-separated) and its size. A rerun appends again;
+    read_manifest() keeps the last entry per source.
+    """
+
+    def __init__(self, dest: str):
+        self.dest = dest
+        self.path = os.path.join(dest, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, source_name: str, output_path: str, duplicate_of: Optional[str] = None):
+        entry = {
+            "source": source_name,
+            "output": os.path.relpath(output_path, self.dest).replace(os.sep, "/"),
+            "bytes": os.path.getsize(output_path),
+        }
+        if duplicate_of:
+            entry["duplicate_of"] = duplicate_of
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+def read_manifest(dest: str) -> dict[str, str]:
+    """Source name -> output path relative to dest, from the manifest in dest (empty if none)."""
+    path = os.path.join(dest, MANIFEST_FILENAME)
+    mapping: dict[str, str] = {}
+    if not os.path.exists(path):
+        return mapping
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Partial line from an interrupted write
+            mapping[record["source"]] = record["output"]
+    return mapping
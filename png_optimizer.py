@@ -0,0 +1,90 @@
+"""
+SHH Image Converter - PNG Optimizer
+Smaller PNG output: lossless mode reduction, optional palette quantization
+and selectable zlib effort.
+
+Lossless reduction picks the cheapest exact representation: RGB when alpha
+is fully opaque, L when every pixel is grey, otherwise an 8-bit (or smaller)
+palette when the image has at most 256 colours, or LA for grey with alpha.
+Fully transparent pixels have their hidden colour cleared first, since it is
+invisible but costs bytes.
+"""
+
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageChops
+
+PNG_EFFORT_LEVELS = {
+    "fast": {"compress_level": 1},
+    "balanced": {"compress_level": 6},  # Pillow's default
+    "max": {"optimize": True},  # compress_level 9 plus a search over filter strategies
+}
+DEFAULT_PNG_EFFORT = "balanced"
+
+def png_save_params(effort: str) -> dict:
+    return dict(PNG_EFFORT_LEVELS.get(effort, PNG_EFFORT_LEVELS[DEFAULT_PNG_EFFORT]))
+
+def _clear_hidden_colour(img: Image.Image) -> Image.Image:
+    """Zero the RGB of fully transparent pixels (AI cut-outs leave the old background there)."""
+    alpha = img.getchannel("A")
+    visible = alpha.point(lambda a: 255 if a else 0)
+    if visible.getextrema() == (255, 255):
+        return img
+    cleared = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    cleared.paste(img, mask=visible)
+    return cleared
+
+def _is_grayscale(img: Image.Image) -> bool:
+    r, g, b = img.split()[:3]
+    return ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(g, b).getbbox() is None
+
+def _exact_palette(img: Image.Image) -> Optional[Image.Image]:
+    """Palette version of img if it has <= 256 colours and round-trips exactly."""
+    if img.getcolors(256) is None:
+        return None
+    method = Image.Quantize.FASTOCTREE if img.mode == "RGBA" else Image.Quantize.MEDIANCUT
+    palette = img.quantize(colors=256, method=method, dither=Image.Dither.NONE)
+    if ImageChops.difference(palette.convert(img.mode), img).getbbox() is None:
+        return palette
+    return None
+
+def _lossy_palette(img: Image.Image, colors: int) -> Image.Image:
+    # libimagequant gives better results when Pillow was built with it; octree works everywhere (incl. RGBA)
+    for method in (Image.Quantize.LIBIMAGEQUANT, Image.Quantize.FASTOCTREE):
+        try:
+            return img.quantize(colors=colors, method=method, dither=Image.Dither.FLOYDSTEINBERG)
+        except ValueError:
+            continue
+    return img
+
+def reduce_png(img: Image.Image, palette_colors: int = 0) -> Image.Image:
+    """Return the smallest representation of img for PNG output.
+
+    palette_colors > 0 quantizes lossily to that many colours (alpha preserved);
+    otherwise every reduction is exact.
+    """
+    if img.mode not in ("RGB", "RGBA"):
+        return img
+    if img.mode == "RGBA":
+        if img.getchannel("A").getextrema() == (255, 255):
+            img = img.convert("RGB")
+        else:
+            img = _clear_hidden_colour(img)
+    if palette_colors > 0:
+        return _lossy_palette(img, min(256, palette_colors))
+    grey = _is_grayscale(img)
+    if grey and img.mode == "RGB":
+        return img.convert("L")  # Same 8 bits per pixel as a palette, without the PLTE chunk
+    palette = _exact_palette(img)
+    if palette is not None:
+        return palette  # Pillow writes 1/2/4-bit PNGs for small palettes
+    if grey:
+        return img.convert("LA")
+    return img
+
+def default_png_size(img: Image.Image) -> int:
+    """Encoded size with Pillow's plain defaults; the baseline for 'bytes saved'."""
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.tell()
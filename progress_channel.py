@@ -0,0 +1,107 @@
+"""
+SHH Image Converter - Progress Channel
+Workers publish events to a queue; the UI drains it on its own timer.
+
+Publishing is a single SimpleQueue.put, so workers never touch Tk and pay no
+per-file UI cost. ProgressStats turns drained events into files/sec, MB/s
+and an ETA.
+"""
+
+import queue
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+@dataclass
+class ProgressEvent:
+    """One worker-side occurrence.
+
+    kind is 'converted', 'skipped', 'resumed' or 'deduplicated' for a file, or
+    'started' / 'finished' / 'error' for the whole job (payload holds the file
+    count, the summary or the message).
+    """
+    kind: str
+    name: str = ""
+    bytes_in: int = 0
+    bytes_out: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+    payload: Any = None
+    bytes_saved: int = 0  # Output bytes saved by PNG optimization
+    ai_route: str = ""  # With background removal: 'ai', or the cheap path used instead ('alpha', 'flat')
+
+FILE_EVENTS = ("converted", "skipped", "resumed", "deduplicated")
+
+class ProgressChannel:
+    """Thread-safe, unbounded event queue between workers and the UI."""
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    def publish(self, event: ProgressEvent):
+        self._queue.put(event)
+
+    def drain(self, max_events: int = 10_000) -> list[ProgressEvent]:
+        """Return queued events without blocking; capped so one UI tick stays short."""
+        events = []
+        try:
+            while len(events) < max_events:
+                events.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+class ProgressStats:
+    """Running totals for one job, fed by drained events."""
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.started = time.monotonic()
+        self.counts = {kind: 0 for kind in FILE_EVENTS}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.stage_seconds: dict[str, float] = {}
+
+    def add(self, event: ProgressEvent):
+        if event.kind == "started":
+            self.total = event.payload
+            return
+        if event.kind not in self.counts:
+            return
+        self.counts[event.kind] += 1
+        self.bytes_in += event.bytes_in
+        self.bytes_out += event.bytes_out
+        for stage, seconds in event.timings.items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def elapsed(self) -> float:
+        return max(1e-6, time.monotonic() - self.started)
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.done / self.elapsed
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes_in / (1024 * 1024) / self.elapsed
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        rate = self.files_per_sec
+        if not self.total or rate <= 0:
+            return None
+        return max(0.0, (self.total - self.done) / rate)
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    def describe(self) -> str:
+        eta = self.eta_seconds
+        eta_text = "--:--" if eta is None else time.strftime('%H:%M:%S', time.gmtime(eta))
+        return (f"{self.done}/{self.total} • {self.files_per_sec:.1f} files/s • "
+                f"{self.mb_per_sec:.1f} MB/s • ETA {eta_text}")
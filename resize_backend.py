@@ -0,0 +1,186 @@
+"""
+SHH Image Converter - Resize Backends
+Picks the fastest resampler for each resize that still matches Pillow's LANCZOS output.
+
+  pillow   Image.resize(LANCZOS) with reducing_gap: downscales by 6x or more first
+           shrink by an integer factor with reduce() (box filter, C speed), then
+           LANCZOS finishes from roughly 3x the target size. RGBA/LA are
+           premultiplied explicitly, because Image.resize() skips reducing_gap
+           for them.
+  opencv   cv2.resize with INTER_AREA for downscales and INTER_LANCZOS4 for upscales
+           (optional; only when OpenCV is installed). RGBA is premultiplied first,
+           as Pillow does, so transparent pixels never bleed their hidden colour
+           into the edges.
+
+'pillow' is the default: it stays within 1/255 of plain LANCZOS on any content.
+'auto' is an opt-in speed mode. It uses Pillow with reduce() for large downscales
+(the fastest path measured) and OpenCV's area filter for downscales under 6x,
+where reduce() cannot help. INTER_AREA is a different filter, so on fine detail
+its output drifts visibly from LANCZOS (the benchmark's noisy source shows
+2-3/255 mean). Upscales, other modes, and non-LANCZOS filters such as the
+BILINEAR draft preview always use Pillow, as does everything when OpenCV is
+not installed.
+
+Benchmark on this machine:
+    python resize_backend.py [--source 6000x4000] [--target 500x500 --target 2400x2400] [--repeat 3]
+"""
+
+import argparse
+import time
+from PIL import Image, ImageChops, ImageStat
+
+RESIZE_BACKENDS = ("auto", "pillow", "opencv")
+DEFAULT_RESIZE_BACKEND = "pillow"  # The only backend that matches LANCZOS on every source
+REDUCING_GAP = 3.0  # Pillow docs: >= 3 is indistinguishable from a full LANCZOS pass
+OPENCV_MODES = ("L", "RGB", "RGBA")
+PREMULTIPLIED_MODES = {"RGBA": "RGBa", "LA": "La"}
+
+_cv2 = None
+_cv2_checked = False
+
+def _load_cv2():
+    """Import OpenCV on first use; None when it is not installed (Fast build)."""
+    global _cv2, _cv2_checked
+    if not _cv2_checked:
+        _cv2_checked = True
+        try:
+            import cv2
+            _cv2 = cv2
+        except Exception:
+            _cv2 = None
+    return _cv2
+
+def opencv_available() -> bool:
+    return _load_cv2() is not None
+
+def _resize_pillow(img: Image.Image, size: tuple[int, int], resample: Image.Resampling) -> Image.Image:
+    if not (size[0] < img.width and size[1] < img.height):
+        return img.resize(size, resample)
+    premultiplied = PREMULTIPLIED_MODES.get(img.mode)
+    if premultiplied and resample != Image.Resampling.NEAREST:
+        shrunk = img.convert(premultiplied).resize(size, resample, reducing_gap=REDUCING_GAP)
+        return shrunk.convert(img.mode)
+    return img.resize(size, resample, reducing_gap=REDUCING_GAP)
+
+def _resize_opencv(img: Image.Image, size: tuple[int, int]) -> Image.Image:
+    import numpy as np
+    cv2 = _load_cv2()
+    premultiplied = img.mode == "RGBA"
+    work = img.convert("RGBa") if premultiplied else img
+    array = np.asarray(work)
+    downscale = size[0] < img.width and size[1] < img.height
+    resized = cv2.resize(array, size, interpolation=cv2.INTER_AREA if downscale else cv2.INTER_LANCZOS4)
+    if premultiplied:
+        return Image.frombuffer("RGBa", size, resized.tobytes(), "raw", "RGBa", 0, 1).convert("RGBA")
+    return Image.fromarray(resized, img.mode)
+
+def choose_backend(mode: str, src_size: tuple[int, int], dst_size: tuple[int, int],
+                   resample: Image.Resampling = Image.Resampling.LANCZOS,
+                   preferred: str = DEFAULT_RESIZE_BACKEND) -> str:
+    """Backend name ('pillow' or 'opencv') for one resize."""
+    if preferred == "pillow" or resample != Image.Resampling.LANCZOS:
+        return "pillow"
+    if mode not in OPENCV_MODES or not opencv_available():
+        return "pillow"
+    if preferred == "opencv":
+        return "opencv"
+    ratio = min(src_size[0] / dst_size[0], src_size[1] / dst_size[1])
+    # From 2 * REDUCING_GAP upwards Pillow's reduce() pre-shrink beats OpenCV; below it cannot kick in
+    return "opencv" if 1 < ratio < 2 * REDUCING_GAP else "pillow"
+
+def resize_image(img: Image.Image, size: tuple[int, int],
+                 resample: Image.Resampling = Image.Resampling.LANCZOS,
+                 backend: str = DEFAULT_RESIZE_BACKEND) -> Image.Image:
+    """Drop-in for img.resize(size, resample) that dispatches to the best backend."""
+    if choose_backend(img.mode, img.size, size, resample, backend) == "opencv":
+        return _resize_opencv(img, size)
+    return _resize_pillow(img, size, resample)
+
+def compare(a: Image.Image, b: Image.Image) -> tuple[float, int]:
+    """(mean, max) absolute per-channel difference between two same-sized images.
+
+    Images with alpha are compared premultiplied, so the colour of invisible pixels does not count.
+    """
+    if a.mode in PREMULTIPLIED_MODES:
+        a, b = a.convert(PREMULTIPLIED_MODES[a.mode]), b.convert(PREMULTIPLIED_MODES[b.mode])
+    diff = ImageChops.difference(a, b)
+    mean = sum(ImageStat.Stat(diff).mean) / len(diff.getbands())
+    extrema = diff.getextrema()
+    if len(diff.getbands()) == 1:
+        extrema = (extrema,)
+    return mean, max(high for _, high in extrema)
+
+def _benchmark_source(size: tuple[int, int], mode: str) -> Image.Image:
+    """Detailed synthetic photo: gradients plus fine noise so resamplers actually differ."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 64)
+    img = Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise))
+    if mode == "RGBA":
+        img.putalpha(Image.radial_gradient("L").resize(size))
+    return img.convert(mode)
+
+def _time_best(func, repeat: int) -> tuple[float, Image.Image]:
+    best, out = float("inf"), None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        out = func()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+def benchmark(source_size: tuple[int, int] = (6000, 4000),
+              targets: tuple[tuple[int, int], ...] = ((500, 500), (2400, 2400)),
+              repeat: int = 3, modes: tuple[str, ...] = ("RGB", "RGBA")) -> list[dict]:
+    """Time each backend against plain img.resize(LANCZOS) and measure how far its output drifts."""
+    results = []
+    for mode in modes:
+        img = _benchmark_source(source_size, mode)
+        img.load()
+        for target in targets:
+            scale = min(target[0] / img.width, target[1] / img.height)
+            size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+            variants = {
+                "lanczos (baseline)": lambda: img.resize(size, Image.Resampling.LANCZOS),
+                "pillow": lambda: _resize_pillow(img, size, Image.Resampling.LANCZOS),
+                "opencv": (lambda: _resize_opencv(img, size)) if opencv_available() else None,
+                "auto": lambda: resize_image(img, size, backend="auto"),
+            }
+            base_seconds, reference = _time_best(variants.pop("lanczos (baseline)"), repeat)
+            row = {"mode": mode, "size": size, "backend": "lanczos (baseline)", "seconds": base_seconds,
+                   "speedup": 1.0, "mean_diff": 0.0, "max_diff": 0}
+            results.append(row)
+            for name, func in variants.items():
+                if func is None:
+                    results.append({"mode": mode, "size": size, "backend": name, "skipped": "OpenCV not installed"})
+                    continue
+                seconds, out = _time_best(func, repeat)
+                mean, peak = compare(reference, out)
+                if name == "auto":
+                    name = f"auto -> {choose_backend(mode, img.size, size, preferred='auto')}"
+                results.append({"mode": mode, "size": size, "backend": name, "seconds": seconds,
+                                "speedup": base_seconds / seconds, "mean_diff": mean, "max_diff": peak})
+    return results
+
+def _parse_size(text: str) -> tuple[int, int]:
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare resize backends on a synthetic source")
+    parser.add_argument("--source", type=_parse_size, default=(6000, 4000), help="Source size, e.g. 6000x4000")
+    parser.add_argument("--target", type=_parse_size, action="append",
+                        help="Output box, e.g. 500x500 (repeatable; default 500x500 and 2400x2400)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    targets = tuple(args.target or ((500, 500), (2400, 2400)))
+    print(f"[RESIZE] Source {args.source[0]}x{args.source[1]}; diff is per channel versus plain LANCZOS (0-255)")
+    for row in benchmark(args.source, targets, args.repeat):
+        label = f"{row['mode']:<5} -> {row['size'][0]}x{row['size'][1]:<5} {row['backend']:<20}"
+        if "skipped" in row:
+            print(f"[RESIZE] {label} skipped ({row['skipped']})")
+            continue
+        print(f"[RESIZE] {label} {row['seconds'] * 1000:8.1f} ms  x{row['speedup']:4.1f}   "
+              f"diff mean {row['mean_diff']:.2f} max {row['max_diff']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
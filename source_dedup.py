@@ -0,0 +1,133 @@
+"""
+SHH Image Converter - Source Deduplication
+Finds byte- or pixel-identical source images so each is converted only once.
+
+Cheap checks run first: file size groups, then a hash of the first 64KB, then a
+full-content hash only for files that still collide. Pixel-level matching (same
+image saved under different names or formats) decodes only files whose headers
+report the same dimensions and mode.
+"""
+
+import hashlib
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+
+from exif_orientation import read_orientation
+
+PREFIX_BYTES = 64 * 1024
+CHUNK_BYTES = 1024 * 1024
+
+@dataclass
+class DedupPlan:
+    """Representative file -> files with identical content, in source order."""
+    duplicates: dict[str, list[str]] = field(default_factory=dict)
+    bytes_skipped: int = 0  # Source bytes that will not be decoded because a twin is converted
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(len(v) for v in self.duplicates.values())
+
+    def skipped_files(self) -> set[str]:
+        return {name for dups in self.duplicates.values() for name in dups}
+
+def _hash_file(path: str, limit: Optional[int] = None) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_BYTES if remaining is None else min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+def _split(groups: list[list[str]], key_func) -> list[list[str]]:
+    """Refine candidate groups by key_func, keeping only groups with more than one member."""
+    refined = []
+    for group in groups:
+        buckets: dict = {}
+        for path in group:
+            try:
+                key = key_func(path)
+            except Exception:
+                continue  # Unreadable files are never treated as duplicates
+            if key is not None:
+                buckets.setdefault(key, []).append(path)
+        refined.extend(b for b in buckets.values() if len(b) > 1)
+    return refined
+
+def _header_key(path: str):
+    with Image.open(path) as img:
+        return (img.size, img.mode, read_orientation(img))
+
+def _pixel_key(path: str):
+    with Image.open(path) as img:
+        img.load()
+        digest = hashlib.blake2b(img.tobytes(), digest_size=20).hexdigest()
+        # Palette transparency changes how the image is flattened and the EXIF orientation how
+        # it is turned, so both are part of the identity
+        return (img.size, img.mode, repr(img.info.get("transparency")), read_orientation(img), digest)
+
+def plan_deduplication(source: str, filenames: list[str], pixel_level: bool = False) -> DedupPlan:
+    """Group identical sources; the first file of each group (in list order) is the representative."""
+    order = {name: i for i, name in enumerate(filenames)}
+    sizes: dict[int, list[str]] = {}
+    for name in filenames:
+        try:
+            sizes.setdefault(os.path.getsize(os.path.join(source, name)), []).append(name)
+        except OSError:
+            continue
+
+    def _path(func):
+        return lambda name: func(os.path.join(source, name))
+
+    same_size = [g for g in sizes.values() if len(g) > 1]
+    same_prefix = _split(same_size, _path(lambda p: _hash_file(p, PREFIX_BYTES)))
+    identical = _split(same_prefix, _path(_hash_file))
+
+    if pixel_level:
+        # Compare one member per byte-identical group plus every unmatched file, then
+        # merge the byte groups back into whichever pixel group their member landed in
+        byte_groups = {group[0]: group for group in identical}
+        matched = {name for group in identical for name in group}
+        candidates = list(byte_groups) + [name for name in filenames if name not in matched]
+        same_header = _split([candidates], _path(_header_key))
+        for pixel_group in _split(same_header, _path(_pixel_key)):
+            merged = []
+            for name in pixel_group:
+                merged.extend(byte_groups.pop(name, [name]))
+            byte_groups[merged[0]] = merged
+        identical = list(byte_groups.values())
+
+    plan = DedupPlan()
+    for group in identical:
+        group.sort(key=order.__getitem__)
+        plan.duplicates[group[0]] = group[1:]
+        for name in group[1:]:
+            plan.bytes_skipped += os.path.getsize(os.path.join(source, name))
+    return plan
+
+def fill_duplicate(existing_output: str, target_output: str, use_hardlink: bool = True) -> str:
+    """Materialise target_output from an already converted file; returns 'hardlink' or 'copy'."""
+    if os.path.abspath(existing_output) == os.path.abspath(target_output):
+        return "same"
+    temp_path = target_output + ".dedup-tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    method = "copy"
+    if use_hardlink:
+        try:
+            os.link(existing_output, temp_path)
+            method = "hardlink"
+        except OSError:
+            pass  # Different volume or filesystem without hardlinks
+    if method == "copy":
+        shutil.copyfile(existing_output, temp_path)
+    os.replace(temp_path, target_output)
+    return method
@@ -0,0 +1,115 @@
+"""Test the shared-memory handoff used by the AI worker processes, slot recovery when one dies and fair timeouts."""
+import multiprocessing
+import pickle
+import threading
+import time
+
+from PIL import Image, ImageChops
+
+from ai_process_pool import (SLOTS_PER_PROCESS, AIProcessPool, FrameDescriptor, _Slot, attach_shared_memory,
+                             read_frame, read_mask, write_frame, write_mask)
+from conversion_pipeline import cutout_from_mask
+
+def _grey_mask_worker(desc):
+    """Child process: read the frame from shared memory and answer with its grey levels as the mask."""
+    shm = attach_shared_memory(desc.shm_name)
+    frame = read_frame(shm, desc)
+    mask = frame.convert("L")
+    del frame
+    write_mask(shm, desc, mask)
+    shm.close()
+
+def test_frame_and_mask_cross_process_boundary():
+    img = Image.linear_gradient("L").resize((300, 200)).convert("RGB")
+    slot = _Slot(0)
+    try:
+        shm = slot.ensure(img.width * img.height * 4)
+        write_frame(shm, img)
+        desc = FrameDescriptor(1, slot.index, shm.name, img.width, img.height, img.mode)
+        assert len(pickle.dumps(desc)) < 512  # Only the descriptor is pickled, never the pixels
+
+        process = multiprocessing.get_context("spawn").Process(target=_grey_mask_worker, args=(desc,))
+        process.start()
+        process.join(60)
+        assert process.exitcode == 0
+
+        mask = read_mask(shm, desc)
+        assert ImageChops.difference(mask, img.convert("L")).getbbox() is None
+        cutout = cutout_from_mask(img, mask)
+        assert cutout.mode == "RGBA" and cutout.getchannel("A").tobytes() == mask.tobytes()
+    finally:
+        slot.close()
+
+def _dying_worker(worker_id, requests, results, threads, providers):
+    """Child process: reports a warm session, takes one request and dies without answering."""
+    import os
+    results.put(("ready", worker_id, True, None))
+    desc = requests.get()
+    results.put(("taken", desc.request_id, worker_id, None))
+    results.close()
+    results.join_thread()  # Flush the message before dying, as a real worker does long before a crash
+    os._exit(3)
+
+class _DyingPool(AIProcessPool):
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(target=_dying_worker, daemon=True,
+                                    args=(worker_id, self._requests, self._results, 0, None))
+        process.start()
+        return process
+
+def test_dead_worker_returns_its_slot():
+    pool = _DyingPool(processes=1)
+    try:
+        img = Image.new("RGB", (64, 48), (10, 20, 30))
+        for _ in range(SLOTS_PER_PROCESS + 1):  # More losses than slots: a leak would block forever
+            start = time.monotonic()
+            assert pool.remove_background_mask(img) is None
+            assert time.monotonic() - start < pool.REMOVAL_TIMEOUT_SEC
+            assert "exited with code 3" in pool.last_error
+        assert pool._free_slots.qsize() == SLOTS_PER_PROCESS
+    finally:
+        pool.release()
+    assert pool._free_slots.qsize() == 0 and not pool._slots
+
+def _slow_worker(worker_id, requests, results, threads, providers):
+    """Child process: answers every request with a grey mask after a fixed inference time."""
+    results.put(("ready", worker_id, True, None))
+    while True:
+        desc = requests.get()
+        if desc is None:
+            break
+        results.put(("taken", desc.request_id, worker_id, None))
+        time.sleep(0.8)
+        shm = attach_shared_memory(desc.shm_name)
+        frame = read_frame(shm, desc)
+        mask = frame.convert("L")
+        del frame
+        write_mask(shm, desc, mask)
+        shm.close()
+        results.put(("done", desc.request_id, True, None))
+
+class _SlowPool(AIProcessPool):
+    REMOVAL_TIMEOUT_SEC = 1.2  # Longer than one removal, shorter than two back to back
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(target=_slow_worker, daemon=True,
+                                    args=(worker_id, self._requests, self._results, 0, None))
+        process.start()
+        return process
+
+def test_queued_request_is_timed_from_when_a_worker_takes_it():
+    pool = _SlowPool(processes=1)
+    try:
+        img = Image.new("RGB", (64, 48), (10, 20, 30))
+        assert pool.get_session() is not None
+        masks = []
+        callers = [threading.Thread(target=lambda: masks.append(pool.remove_background_mask(img)))
+                   for _ in range(SLOTS_PER_PROCESS)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(30)
+        # The second request waited ~0.8s in the queue, then took ~0.8s: both must succeed
+        assert len(masks) == SLOTS_PER_PROCESS and all(mask is not None for mask in masks)
+    finally:
+        pool.release()
@@ -0,0 +1,34 @@
+"""Test animated GIF conversion: frames kept, reduced and merged with timing preserved."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_file
+
+def _durations(path):
+    with Image.open(path) as img:
+        durations = []
+        for index in range(getattr(img, "n_frames", 1)):
+            img.seek(index)
+            img.load()
+            durations.append(img.info.get("duration"))
+        return durations
+
+def test_animated_gif_becomes_animated_output():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        colours = [(0, 0, 0), (200, 0, 0), (200, 0, 0), (0, 0, 200)]  # Frames 2 and 3 are identical
+        frames = [Image.new("RGB", (120, 60), c) for c in colours]
+        gif_path = os.path.join(source, "anim.gif")
+        frames[0].save(gif_path, save_all=True, append_images=frames[1:], duration=50, loop=0)
+
+        output = convert_file(gif_path, dest, ConversionSettings(output_width=32, output_height=32))
+        assert output.endswith(".webp")
+        assert _durations(output) == [50, 100, 50]
+
+        reduced = ConversionSettings(output_width=32, output_height=32, output_format="PNG", animation_max_fps=10)
+        assert sum(_durations(convert_file(gif_path, dest, reduced))) == 200
+
+        still = ConversionSettings(output_width=32, output_height=32, keep_animation=False)
+        with Image.open(convert_file(gif_path, dest, still)) as img:
+            assert getattr(img, "n_frames", 1) == 1
@@ -0,0 +1,90 @@
+"""Test ZIP -> TAR -> folder conversion streams entries without extracting them, and survives bad entries."""
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from PIL import Image
+
+from archive_io import safe_entry_name
+from conversion_pipeline import ConversionSettings, convert_batch
+
+def _png_bytes(colour):
+    buffer = io.BytesIO()
+    Image.new("RGB", (120, 80), colour).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_safe_entry_name_cannot_escape_destination():
+    assert safe_entry_name("../../etc/x.png") == "etc/x.png"
+    assert safe_entry_name("C:\\shots\\a.png") == "shots/a.png"
+    assert safe_entry_name("/abs/./b.png") == "abs/b.png"
+
+def test_zip_to_tar_to_folder_round_trip():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "supplier.zip")
+        with zipfile.ZipFile(source, "w") as zf:
+            for i in range(6):
+                zf.writestr(f"set{i % 2}/img{i}.png", _png_bytes((i * 40, 0, 0)))
+            zf.writestr("set0/img0.jpg", _png_bytes((0, 0, 255)))  # Collides with set0/img0.png
+            zf.writestr("__MACOSX/set0/._img0.png", b"resource fork")
+            zf.writestr("readme.txt", "not an image")
+        settings = ConversionSettings(output_width=32, output_height=32, output_manifest=True)
+
+        tarball = os.path.join(root, "cdn.tar.gz")
+        own_leftover = os.path.join(root, "cdn.tar.gz.shh-partial-crashed.tmp")
+        other_job = os.path.join(root, "other.zip.shh-partial-running.tmp")
+        for path in (own_leftover, other_job):
+            open(path, "wb").close()
+        summary = convert_batch(source, tarball, settings, workers=3)
+        assert not os.path.exists(own_leftover) and os.path.exists(other_job)  # Only this archive's leftovers
+        os.remove(other_job)
+        assert (summary.total, summary.converted) == (7, 7)
+        with tarfile.open(tarball) as tf:
+            names = set(tf.getnames())
+        assert {"set0/img0.webp", "set0/img0.jpg.webp", "set1/img5.webp", "shh_manifest.jsonl"} <= names
+        assert len(names) == 8
+        assert [name for name in os.listdir(root) if ".shh-partial-" in name] == []
+
+        dest = os.path.join(root, "out")
+        png = ConversionSettings(output_width=16, output_height=16, output_format="PNG")
+        assert convert_batch(tarball, dest, png, workers=2).converted == 7
+        with Image.open(os.path.join(dest, "set1", "img3.png")) as img:
+            assert img.size == (16, 16)
+        assert convert_batch(tarball, dest, png, workers=2).resumed == 7
+
+def test_corrupt_zip_member_fails_alone_and_corrupt_tar_fails_the_job():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "supplier.zip")
+        with zipfile.ZipFile(source, "w", zipfile.ZIP_STORED) as zf:
+            for name in ("a.png", "b.png", "c.png"):
+                zf.writestr(name, _png_bytes((200, 0, 0)))
+        with zipfile.ZipFile(source) as zf:
+            info = zf.getinfo("b.png")
+        with open(source, "r+b") as f:
+            f.seek(info.header_offset + 30 + len("b.png") + len(info.extra) + 100)
+            f.write(b"\\xff" * 16)  # Fails b.png's CRC check only
+        settings = ConversionSettings(output_width=16, output_height=16)
+        summary = convert_batch(source, os.path.join(root, "out"), settings, workers=2)
+        assert (summary.converted, summary.skipped, summary.failed_files) == (2, 1, ["b.png"])
+        assert sorted(name for name in os.listdir(os.path.join(root, "out")) if name.endswith(".webp")) == \
+            ["a.webp", "c.webp"]
+
+        tarball = os.path.join(root, "cut.tar.gz")
+        with tarfile.open(tarball, "w:gz") as tf:
+            for i in range(4):
+                buffer = io.BytesIO()
+                Image.effect_noise((200, 200), 60).save(buffer, "PNG")  # Noise keeps the stream long
+                info = tarfile.TarInfo(f"img{i}.png")
+                info.size = len(buffer.getvalue())
+                tf.addfile(info, io.BytesIO(buffer.getvalue()))
+        with open(tarball, "r+b") as f:
+            f.truncate(os.path.getsize(tarball) // 2)
+        target = os.path.join(root, "cdn.zip")
+        try:
+            convert_batch(tarball, target, settings)
+            assert False, "a truncated TAR stream must fail the job"
+        except (tarfile.TarError, EOFError, OSError):
+            pass
+        assert not os.path.exists(target)  # Nothing published
+        assert [name for name in os.listdir(root) if ".shh-partial-" in name] == []
@@ -0,0 +1,43 @@
+"""Test the AI pre-check routes and the colour-key path for flat backdrops."""
+import os
+import random
+import tempfile
+
+from PIL import Image, ImageDraw
+
+from background_precheck import analyze_background, apply_colour_key
+from conversion_pipeline import ConversionSettings, convert_batch
+
+def _studio_shot():
+    img = Image.new("RGB", (300, 200), (250, 250, 250))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((80, 40, 220, 160), fill=(200, 30, 30))
+    draw.rectangle((130, 90, 170, 110), fill=(250, 250, 250))  # Backdrop-coloured, but enclosed by the subject
+    return img
+
+def test_routes_and_colour_key():
+    cut_out = Image.new("RGBA", (200, 200), (0, 0, 0, 0))
+    cut_out.paste((0, 255, 0, 255), (50, 50, 150, 150))
+    assert analyze_background(cut_out).route == "alpha"
+
+    rng = random.Random(0)
+    photo = Image.frombytes("RGB", (120, 120), bytes(rng.randrange(256) for _ in range(120 * 120 * 3)))
+    assert analyze_background(photo).route == "ai"
+
+    shot = _studio_shot()
+    check = analyze_background(shot)
+    assert check.route == "flat" and check.key_colour == (250, 250, 250)
+    keyed = apply_colour_key(shot, check.key_colour)
+    assert keyed.getpixel((5, 5))[3] == 0  # Backdrop removed
+    assert keyed.getpixel((100, 100))[3] == 255  # Subject kept
+    assert keyed.getpixel((150, 100))[3] == 255  # Enclosed backdrop colour is not connected to the border
+
+def test_batch_counts_avoided_inferences():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        _studio_shot().save(os.path.join(source, "shot.png"))
+        settings = ConversionSettings(output_width=64, output_height=64, output_format="PNG",
+                                      remove_background=True)
+        summary = convert_batch(source, dest, settings, resume=False)
+        assert summary.ai_inferences_avoided == 1 and summary.ai_inferences == 0
+        with Image.open(os.path.join(dest, "shot.png")) as out:
+            assert out.convert("RGBA").getpixel((0, 0))[3] == 0
@@ -0,0 +1,59 @@
+"""Test size-aware task planning: header-based costs, largest-first order, chunking and cheap resumes."""
+import os
+import tempfile
+
+from PIL import Image
+
+import batch_planner
+from batch_planner import estimate_cost, plan_batch, plan_tasks, simulate_makespan
+from conversion_pipeline import ConversionSettings, convert_batch
+
+def test_header_cost_without_decoding():
+    with tempfile.TemporaryDirectory() as folder:
+        big, small = os.path.join(folder, "big.png"), os.path.join(folder, "small.png")
+        Image.new("RGB", (3000, 2000)).save(big)  # Compresses to almost nothing; size alone would mislead
+        Image.new("RGB", (50, 50)).save(small)
+        assert estimate_cost(big) > estimate_cost(small) + 5
+
+def test_largest_first_with_chunks_beats_listing_order():
+    # A mixed folder: many thumbnails listed first, a few giant scans at the end
+    costs = {f"thumb{i:03}.jpg": 0.6 for i in range(300)}
+    costs.update({f"scan{i}.tif": 60.0 for i in range(5)})
+    tasks = plan_tasks(costs, workers=4)
+    assert sorted(name for task in tasks for name in task) == sorted(costs)
+    assert tasks[0][0].startswith("scan")
+    assert len(tasks) < len(costs) // 4  # Thumbnails travel in chunks
+
+    ideal = sum(costs.values()) / 4
+    listed = simulate_makespan(list(costs.values()), 4)
+    planned = simulate_makespan([sum(costs[n] for n in task) for task in tasks], 4)
+    assert planned < listed and planned <= ideal * 1.05
+
+def test_planned_batch_converts_everything():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        for i in range(200):
+            Image.new("RGB", (20, 20), (i % 256, 0, 0)).save(os.path.join(source, f"img{i}.png"))
+        Image.new("RGB", (3000, 2000)).save(os.path.join(source, "large.png"))
+        tasks = plan_batch(source, sorted(os.listdir(source)), 3)
+        assert tasks[0] == ["large.png"] and len(tasks) < 100
+        summary = convert_batch(source, dest, ConversionSettings(output_width=16, output_height=16),
+                                resume=False, workers=3)
+        assert summary.converted == 201 and summary.not_processed == 0
+
+def test_resume_skips_header_reads_for_journaled_files():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        for i in range(40):
+            Image.new("RGB", (20, 20), (i, 0, 0)).save(os.path.join(source, f"img{i}.png"))
+        settings = ConversionSettings(output_width=16, output_height=16)
+        assert convert_batch(source, dest, settings, workers=3).converted == 40
+        Image.new("RGB", (30, 30)).save(os.path.join(source, "new.png"))
+
+        costed = []
+        original = batch_planner.estimate_cost
+        batch_planner.estimate_cost = lambda path: costed.append(os.path.basename(path)) or original(path)
+        try:
+            summary = convert_batch(source, dest, settings, workers=3)
+        finally:
+            batch_planner.estimate_cost = original
+        assert costed == ["new.png"]
+        assert (summary.resumed, summary.converted, summary.not_processed) == (40, 1, 0)
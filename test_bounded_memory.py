@@ -0,0 +1,51 @@
+"""Test bounded-memory mode: the budget blocks and releases workers, and reduced decodes keep cut-out edges clean."""
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, MemoryBudget, _decode_for_processing, convert_file
+
+def test_budget_blocks_until_released_and_admits_oversize_alone():
+    budget = MemoryBudget(100)
+    entered = threading.Event()
+
+    def _second():
+        with budget.reserve(50):
+            entered.set()
+
+    with budget.reserve(80):
+        worker = threading.Thread(target=_second)
+        worker.start()
+        assert not entered.wait(0.2)  # 80 + 50 exceeds the budget
+        assert budget.in_use == 80
+    assert entered.wait(5)
+    worker.join(5)
+    assert budget.in_use == 0
+
+    with budget.reserve(10_000):  # Larger than the whole budget: runs once nothing else holds any
+        assert budget.in_use == 100
+    assert budget.in_use == 0
+
+def test_reduced_decode_keeps_transparent_edges_clean():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        # Opaque blue subject on the left; the transparent right half hides pure red
+        cutout = Image.new("RGBA", (2000, 1000), (255, 0, 0, 0))
+        cutout.paste((0, 0, 255, 255), (0, 0, 1003, 1000))  # Edge inside a reduce block
+        path = os.path.join(source, "cutout.png")
+        cutout.save(path, compress_level=1)
+
+        settings = ConversionSettings(output_width=100, output_height=50, output_format="PNG",
+                                      memory_budget_mp=1)
+        with Image.open(path) as img:
+            reduced = _decode_for_processing(img, settings)
+            assert reduced.size == (200, 100) and reduced.mode == "RGBA"  # The reduce() path ran
+            edge = reduced.getpixel((100, 50))
+            assert 0 < edge[3] < 255 and edge[0] == 0  # Partly covered, and no red bled in
+
+        with Image.open(convert_file(path, dest, settings)) as out:
+            out = out.convert("RGBA")
+            for x in range(out.width):
+                r, g, b, a = out.getpixel((x, 25))
+                assert a == 0 or r <= g + 8, (x, r, g, b, a)  # Any red tint would be hidden colour bleeding
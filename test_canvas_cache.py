@@ -0,0 +1,88 @@
+"""Test that format/quality-only re-runs reuse cached canvases and that the cache stays under its cap without rescans."""
+import os
+import tempfile
+from dataclasses import replace
+
+from PIL import Image
+
+from canvas_cache import CanvasCache
+from conversion_pipeline import ConversionSettings, convert_batch, render_file
+
+def _make_source(folder: str, count: int = 3):
+    for i in range(count):
+        img = Image.new("RGB", (120, 80), (40 * i, 90, 200))
+        img.paste((255, 255, 0), (10 + i * 5, 10, 60, 50))
+        img.save(os.path.join(folder, f"img{i}.png"))
+
+def test_encode_only_rerun_hits_cache():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir:
+        _make_source(source)
+        path = os.path.join(source, "img0.png")
+        settings = ConversionSettings(output_width=64, output_height=64, canvas_cache_mb=50,
+                                      canvas_cache_dir=cache_dir)
+        assert settings.fingerprint() == replace(settings, canvas_cache_mb=0).fingerprint()
+
+        first: dict[str, float] = {}
+        render_file(path, settings, timings=first)
+        assert "cache" not in first and "decode" in first
+
+        for changed in (replace(settings, quality=40), replace(settings, output_format="JPEG"),
+                        replace(settings, png_compression="max")):
+            timings: dict[str, float] = {}
+            render_file(path, changed, timings=timings)
+            assert "cache" in timings and "decode" not in timings
+
+        for changed in (replace(settings, output_width=65), replace(settings, output_format="PNG")):
+            timings = {}
+            render_file(path, changed, timings=timings)
+            assert "cache" not in timings  # Geometry or canvas transparency changed
+
+def test_cached_batch_matches_uncached_bytes():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir, \
+            tempfile.TemporaryDirectory() as plain, tempfile.TemporaryDirectory() as cached:
+        _make_source(source)
+        base = ConversionSettings(output_width=50, output_height=70, quality=90)
+        cache_on = replace(base, canvas_cache_mb=50, canvas_cache_dir=cache_dir)
+        convert_batch(source, cached, cache_on)  # Fills the cache
+        assert convert_batch(source, cached, replace(cache_on, quality=50)).converted == 3
+        convert_batch(source, plain, replace(base, quality=50))
+        for name in sorted(os.listdir(plain)):
+            if name.startswith("."):
+                continue
+            with open(os.path.join(plain, name), "rb") as a, open(os.path.join(cached, name), "rb") as b:
+                assert a.read() == b.read()
+
+def test_eviction_keeps_cache_under_cap():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir:
+        _make_source(source, 6)
+        cache = CanvasCache(cache_dir, max_bytes=1)
+        canvas = Image.effect_noise((64, 64), 50).convert("RGB")  # Noise does not compress
+        cache.put(os.path.join(source, "img0.png"), "v", canvas)
+        assert cache.total_bytes == 0  # Larger than the whole cap: never stored
+
+        cache.max_bytes = 10**9
+        cache.put(os.path.join(source, "img0.png"), "v", canvas)
+        entry_size = cache.total_bytes
+        cache.max_bytes = int(entry_size * 5.5)  # Room for five entries
+        for i in range(1, 6):
+            cache.put(os.path.join(source, f"img{i}.png"), "v", canvas)
+        assert 0 < cache.total_bytes <= cache.max_bytes
+        assert cache.get(os.path.join(source, "img5.png"), "v") is not None  # Most recent survives
+        assert cache.get(os.path.join(source, "img0.png"), "v") is None  # Least recently used was evicted
+
+def test_stores_over_the_cap_never_rescan_the_folder():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir:
+        _make_source(source, 6)
+        canvas = Image.effect_noise((64, 64), 50).convert("RGB")
+        CanvasCache(cache_dir).put(os.path.join(source, "img0.png"), "v", canvas)  # An earlier session's entry
+
+        cache = CanvasCache(cache_dir, max_bytes=10**9)
+        entry_size = cache.total_bytes  # First use scans the folder once
+        assert entry_size > 0
+        scans = []
+        cache._scan = lambda: scans.append(1)
+        cache.max_bytes = int(entry_size * 2.5)
+        for i in range(1, 6):
+            cache.put(os.path.join(source, f"img{i}.png"), "v", canvas)
+        assert scans == [] and 0 < cache.total_bytes <= cache.max_bytes
+        assert cache.get(os.path.join(source, "img0.png"), "v") is None  # The scanned entry counted and was evicted
@@ -0,0 +1,48 @@
+"""Test atomic output writes and journal-based resume of an interrupted batch, across repeated crashes."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_journal import JOURNAL_FILENAME, ConversionJournal
+from conversion_pipeline import TEMP_PREFIX, ConversionSettings, convert_batch
+
+def _make_images(folder, count):
+    for i in range(count):
+        Image.new("RGB", (60 + i, 40), (i * 20, 0, 0)).save(os.path.join(folder, f"img{i}.png"))
+
+def test_resume_skips_completed_files_and_cleans_partials():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        _make_images(source, 3)
+        settings = ConversionSettings(output_width=32, output_height=32)
+
+        first = convert_batch(source, dest, settings)
+        assert first.converted == 3 and first.resumed == 0
+
+        # Simulate a crash: a leftover temp file and a torn journal line
+        open(os.path.join(dest, TEMP_PREFIX + "abc.tmp"), "wb").close()
+        with open(os.path.join(dest, JOURNAL_FILENAME), "a") as f:
+            f.write('{"source": "img9.png", "si')
+
+        # One source changed since the first run and must be converted again
+        Image.new("RGB", (90, 40)).save(os.path.join(source, "img1.png"))
+        second = convert_batch(source, dest, settings)
+        assert second.resumed == 2
+        assert second.converted == 1
+        assert not any(name.startswith(TEMP_PREFIX) for name in os.listdir(dest))
+
+        # The record appended after the torn line must survive into the next resume
+        third = convert_batch(source, dest, settings)
+        assert (third.resumed, third.converted) == (3, 0)
+
+def test_journal_ignores_other_settings():
+    with tempfile.TemporaryDirectory() as dest:
+        output = os.path.join(dest, "a.webp")
+        open(output, "wb").close()
+        journal = ConversionJournal(dest, "settings-a")
+        journal.record("a.png", 10, 20, "done", output)
+        journal.close()
+
+        assert ConversionJournal(dest, "settings-a").is_complete("a.png", 10, 20)
+        assert not ConversionJournal(dest, "settings-b").is_complete("a.png", 10, 20)
+        assert not ConversionJournal(dest, "settings-a").is_complete("a.png", 11, 20)
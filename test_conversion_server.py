@@ -0,0 +1,84 @@
+"""Test the HTTP service: query overrides keep config defaults, 422/504/500 error codes, and the concurrency bound."""
+import http.client
+import threading
+import time
+from concurrent.futures import TimeoutError
+from io import BytesIO
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings
+from conversion_server import ConversionService, make_server, settings_from_query
+
+def _png_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (40, 30), (200, 10, 10)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_query_overrides_keep_config_defaults():
+    defaults = ConversionSettings.from_config({"png_compression": "max", "ai_precheck": False,
+                                               "memory_budget_mp": 64, "apply_exif_orientation": False})
+    settings = settings_from_query({"quality": ["60"], "output_width": ["120"]}, defaults)
+    assert (settings.quality, settings.output_width) == (60, 120)
+    assert settings.png_compression == "max" and settings.ai_precheck is False
+    assert settings.memory_budget_mp == 64 and settings.apply_exif_orientation is False
+
+def test_decode_errors_are_422_timeouts_504_and_internal_errors_500():
+    release = threading.Event()
+
+    class BrokenEncoder(ConversionService):
+        def _run(self, data, settings):
+            if settings.quality == 13:
+                raise RuntimeError("encoder exploded")
+            if settings.quality == 14:
+                release.wait(10)
+            return super()._run(data, settings)
+
+    service = BrokenEncoder(ConversionSettings(output_width=20, output_height=20), workers=2,
+                            request_timeout=1.0)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        def _post(query: str, body: bytes) -> int:
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+            conn.request("POST", "/convert" + query, body)
+            status = conn.getresponse().status
+            conn.close()
+            return status
+
+        assert _post("", _png_bytes()) == 200
+        assert _post("", b"<html>not an image</html>") == 422
+        assert _post("", _png_bytes()[:60]) == 422  # Valid header, truncated pixel data
+        assert _post("?quality=13", _png_bytes()) == 500
+        assert _post("?quality=14", _png_bytes()) == 504
+    finally:
+        release.set()
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+def test_timed_out_request_keeps_its_slot():
+    release = threading.Event()
+
+    class Slow(ConversionService):
+        def _run(self, data, settings):
+            release.wait(10)
+            return b"done"
+
+    service = Slow(ConversionSettings(), workers=1, max_queue=0, request_timeout=0.05)
+    try:
+        try:
+            service.try_convert(b"x", service.defaults)
+            assert False, "expected a timeout"
+        except TimeoutError:
+            pass
+        assert service.try_convert(b"x", service.defaults) is None  # Still converting: at capacity
+        assert service.metrics()["in_flight"] == 1
+        release.set()
+        deadline = time.monotonic() + 5
+        while service.metrics()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert service.try_convert(b"x", service.defaults) == b"done"
+    finally:
+        release.set()
+        service.shutdown()
@@ -0,0 +1,45 @@
+"""Test the streaming API keeps input order, reports failures inline, reads items lazily and leaves caller images intact."""
+import io
+
+from PIL import Image
+
+from converter_api import convert_stream
+
+def _jpeg(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (0, 120, 0)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def test_convert_stream_orders_results_and_reports_errors():
+    source = Image.new("RGBA", (300, 200), (200, 0, 0, 255))
+    items = [("big", _jpeg((2400, 1600))), ("pil", source), ("bad", b"not an image"), ("small", _jpeg((40, 30)))]
+    results = list(convert_stream({"output_width": 64, "output_height": 64}, items, workers=3))
+    assert [r.name for r in results] == ["big", "pil", "bad", "small"]
+    assert [r.ok for r in results] == [True, True, False, True]
+    with Image.open(io.BytesIO(results[1].data)) as img:
+        assert (img.format, img.size) == ("WEBP", (64, 64))
+    assert source.size == (300, 200)  # Caller's image is left as it was
+
+    unordered = convert_stream({"output_width": 64, "output_height": 64}, items, workers=3, ordered=False)
+    assert sorted(r.index for r in unordered) == [0, 1, 2, 3]
+
+def test_convert_stream_pulls_items_lazily():
+    pulled = []
+
+    def _items():
+        for i in range(100):
+            pulled.append(i)
+            yield f"img{i}", _jpeg((80, 60))
+
+    stream = convert_stream({"output_width": 16, "output_height": 16}, _items(), workers=2)
+    first = next(stream)
+    stream.close()
+    assert first.index == 0
+    assert len(pulled) <= 5  # Bounded by the in-flight window, not the stream length
+
+def test_unloaded_caller_image_is_not_drafted():
+    with Image.open(io.BytesIO(_jpeg((2400, 1600)))) as img:
+        results = list(convert_stream({"output_width": 64, "output_height": 64, "memory_budget_mp": 64},
+                                      [("opened", img)], workers=1))
+        assert results[0].ok
+        assert img.size == (2400, 1600) and img.load() is not None  # Still full resolution
@@ -0,0 +1,92 @@
+"""Test several local worker processes share one batch, take over an expired lease and convert each file once.
+
+Also that a takeover replaces the lease atomically, fences out the stalled owner and
+is not blocked by a marker left by a crashed taker.
+"""
+import json
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from conversion_pipeline import BatchSummary, ConversionSettings
+from distributed_batch import WORK_DIRNAME, ShardQueue, load_plan, plan_distributed, run_local
+from job_queue import JobSpec
+
+def test_local_workers_convert_every_file_exactly_once():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "src")
+        dest = os.path.join(root, "out")
+        os.makedirs(source)
+        for i in range(24):
+            Image.new("RGB", (120 + i * 10, 90), (i * 10, 0, 0)).save(os.path.join(source, f"img{i:02d}.png"))
+        spec = JobSpec(source, dest, ConversionSettings(output_width=24, output_height=24, output_manifest=True))
+        plan = plan_distributed(spec, shard_files=5, lease_sec=1.5)
+        assert len(plan.shards) == 5
+
+        # A worker that crashed holding the first shard: its lease is never renewed
+        crashed = ShardQueue(load_plan(dest), "crashed-host-1")
+        assert crashed.claim() == plan.shards[0]
+        stale = time.time() - 60
+        os.utime(crashed.lease_path(plan.shards[0]), (stale, stale))
+
+        summary = run_local(spec, processes=3, shard_files=5, lease_sec=1.5)
+        assert (summary.total, summary.converted, summary.not_processed, summary.failed_files) == (24, 24, 0, [])
+        assert sorted(f for f in os.listdir(dest) if f.endswith(".webp")) == [f"img{i:02d}.webp" for i in range(24)]
+
+        done_records = []
+        journal_dir = os.path.join(dest, WORK_DIRNAME, "journals")
+        for name in os.listdir(journal_dir):
+            with open(os.path.join(journal_dir, name)) as f:
+                done_records += [json.loads(line)["source"] for line in f]
+        assert sorted(done_records) == sorted(f"img{i:02d}.png" for i in range(24))  # No double conversion
+        with open(os.path.join(dest, "shh_manifest.jsonl")) as f:
+            assert len(f.readlines()) == 24
+
+def test_takeover_is_atomic_and_fences_the_old_owner():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "src")
+        dest = os.path.join(root, "out")
+        os.makedirs(source)
+        Image.new("RGB", (40, 30)).save(os.path.join(source, "a.png"))
+        plan = plan_distributed(JobSpec(source, dest, ConversionSettings()), shard_files=5, lease_sec=30)
+        shard = plan.shards[0]
+        stalled, first, second = (ShardQueue(load_plan(dest), name) for name in ("stalled", "first", "second"))
+        assert stalled.claim() == shard
+        assert first.claim() is None  # Live lease: left alone
+        assert stalled.renew(shard)
+
+        stale = time.time() - 60
+        os.utime(stalled.lease_path(shard), (stale, stale))
+        assert first.claim() == shard
+        assert second.claim() is None  # The replaced lease is fresh again; only one taker wins
+        assert os.path.exists(first.lease_path(shard))  # Never missing during the takeover
+        assert [f for f in os.listdir(first.lease_dir) if not f.endswith(".lease")] == []
+
+        assert not stalled.renew(shard) and first.renew(shard)
+        assert not stalled.complete(shard, BatchSummary(total=1))  # Fenced: no done record
+        assert not first.is_done(shard) and first.owner(shard) == "first"
+        assert first.complete(shard, BatchSummary(total=1)) and first.is_done(shard)
+
+def test_stale_takeover_marker_does_not_block_the_shard():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "src")
+        dest = os.path.join(root, "out")
+        os.makedirs(source)
+        Image.new("RGB", (40, 30)).save(os.path.join(source, "a.png"))
+        plan = plan_distributed(JobSpec(source, dest, ConversionSettings()), shard_files=5, lease_sec=30)
+        shard = plan.shards[0]
+        stalled, taker = ShardQueue(load_plan(dest), "stalled"), ShardQueue(load_plan(dest), "taker")
+        assert stalled.claim() == shard
+        stale = time.time() - 60
+        lease = stalled.lease_path(shard)
+        os.utime(lease, (stale, stale))
+
+        # A taker that crashed between creating and removing its marker
+        marker = f"{lease}.takeover-{stalled._held[shard][1]}"
+        open(marker, "wb").close()
+        assert taker.claim() is None  # A fresh marker means a takeover is in progress
+        os.utime(marker, (stale, stale))
+        assert taker.claim() == shard and taker.owner(shard) == "taker"
+        assert not os.path.exists(marker)
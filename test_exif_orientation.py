@@ -0,0 +1,59 @@
+"""Test that EXIF-rotated photos come out upright, fitted to the box after rotation, and thumbnails follow the setting."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_file
+from exif_orientation import ORIENTATION_TAG, read_orientation
+from source_dedup import plan_deduplication
+from thumbnail_cache import ThumbnailCache
+
+def _save_rotated_jpeg(path: str, orientation: int):
+    # Stored landscape 200x100: left half red, right half blue
+    img = Image.new("RGB", (200, 100), (255, 0, 0))
+    img.paste((0, 0, 255), (100, 0, 200, 100))
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    img.save(path, quality=95, exif=exif)
+
+def test_orientation_applied_after_resize():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        path = os.path.join(source, "phone.jpg")
+        _save_rotated_jpeg(path, 6)  # Displayed turned 90 degrees clockwise: portrait, red on top
+        with Image.open(path) as img:
+            assert read_orientation(img) == 6
+
+        for budget in (0, 64):  # Plain decode and bounded-memory (draft/reduce) decode
+            settings = ConversionSettings(output_width=50, output_height=100, output_format="PNG",
+                                          memory_budget_mp=budget)
+            with Image.open(convert_file(path, dest, settings)) as out:
+                out = out.convert("RGB")
+                assert out.size == (50, 100)
+                # Upright portrait fills the whole 50x100 box, so there is no letterbox
+                r, g, b = out.getpixel((25, 20))
+                assert r > 200 and b < 60
+                r, g, b = out.getpixel((25, 80))
+                assert b > 200 and r < 60
+
+        settings = ConversionSettings(output_width=50, output_height=100, output_format="PNG",
+                                      apply_exif_orientation=False)
+        with Image.open(convert_file(path, dest, settings)) as out:
+            # Stored order: landscape letterboxed into the portrait box, white above it
+            assert out.convert("RGB").getpixel((25, 5)) == (255, 255, 255)
+
+def test_dedup_keeps_differently_oriented_copies():
+    with tempfile.TemporaryDirectory() as source:
+        _save_rotated_jpeg(os.path.join(source, "a.jpg"), 1)
+        _save_rotated_jpeg(os.path.join(source, "b.jpg"), 8)
+        names = sorted(os.listdir(source))
+        assert plan_deduplication(source, names, pixel_level=True).duplicates == {}
+
+def test_thumbnails_follow_the_orientation_setting():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(source, "phone.jpg")
+        _save_rotated_jpeg(path, 6)
+        cache = ThumbnailCache(cache_dir, size=(64, 64))
+        assert cache.get_or_create(path).size == (32, 64)  # Upright portrait
+        assert cache.get_or_create(path, upright=False).size == (64, 32)  # Stored order, cached separately
+        assert cache.get(path).size == (32, 64)
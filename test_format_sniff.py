@@ -0,0 +1,38 @@
+"""Test header sniffing accepts mislabelled and extension-less images and rejects junk up front."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_batch
+from format_sniff import classify_files, is_candidate_name
+
+def test_candidates_by_name():
+    assert is_candidate_name("SCAN.TIF") and is_candidate_name("photo.Jpeg") and is_candidate_name("IMG_0001")
+    assert not is_candidate_name("notes.txt") and not is_candidate_name("._photo.jpg")
+    assert not is_candidate_name(".shh_convert_journal.jsonl")
+
+def test_batch_sniffs_headers_before_converting():
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "src")
+        os.makedirs(source)
+        Image.new("RGB", (64, 48), "red").save(os.path.join(source, "SCAN.TIF"), "TIFF")
+        Image.new("RGB", (64, 48), "blue").save(os.path.join(source, "dam_export_0001"), "PNG")
+        Image.new("RGB", (64, 48), "green").save(os.path.join(source, "really_jpeg.png"), "JPEG")
+        with open(os.path.join(source, "error_page.jpg"), "w") as f:
+            f.write("<html>404 Not Found</html>")
+        open(os.path.join(source, "empty.png"), "wb").close()
+        with open(os.path.join(source, "README"), "w") as f:
+            f.write("Delivery notes")
+
+        names = sorted(n for n in os.listdir(source) if is_candidate_name(n))
+        accepted, rejected = classify_files(source, names)
+        assert sorted(accepted) == ["SCAN.TIF", "dam_export_0001", "really_jpeg.png"]
+        assert rejected["empty.png"] == "empty file"
+        assert rejected["error_page.jpg"] == "not a supported image"
+
+        dest = os.path.join(root, "out")
+        summary = convert_batch(source, dest, ConversionSettings(output_width=16, output_height=16), resume=False)
+        assert (summary.total, summary.converted, summary.skipped, summary.rejected) == (3, 3, 0, 3)
+        assert sorted(summary.failed_files) == ["README", "empty.png", "error_page.jpg"]
+        assert sorted(os.listdir(dest)) == ["SCAN.webp", "dam_export_0001.webp", "really_jpeg.webp"]
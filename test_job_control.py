@@ -0,0 +1,62 @@
+"""Test that pause and cancel stop a batch at a file boundary and leave no temp files behind."""
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from conversion_pipeline import TEMP_PREFIX, ConversionSettings, JobControl, convert_batch
+
+def _make_images(folder: str, count: int):
+    for i in range(count):
+        Image.new("RGB", (60, 40), (i * 30, 0, 0)).save(os.path.join(folder, f"img{i}.png"))
+
+def _outputs(dest: str) -> list[str]:
+    return sorted(name for name in os.listdir(dest) if name.endswith(".webp"))
+
+def test_pause_holds_the_batch_between_files_until_resumed():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        _make_images(source, 5)
+        control = JobControl()
+        paused = threading.Event()
+
+        def _progress(index, total, name):
+            if index == 1:
+                control.pause()
+                paused.set()
+
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(summary=convert_batch(
+            source, dest, ConversionSettings(output_width=16, output_height=16), resume=False,
+            progress=_progress, control=control)))
+        worker.start()
+        assert paused.wait(10)
+        worker.join(0.5)
+        assert worker.is_alive() and len(_outputs(dest)) == 2  # Held at the file boundary
+        control.resume()
+        worker.join(10)
+        assert result["summary"].converted == 5 and not result["summary"].cancelled
+
+def test_cancel_stops_feeding_files_and_leaves_no_temp_files():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        _make_images(source, 6)
+        control = JobControl()
+
+        def _progress(index, total, name):
+            if index == 1:
+                control.cancel()
+
+        summary = convert_batch(source, dest, ConversionSettings(output_width=16, output_height=16),
+                                progress=_progress, control=control)
+        assert summary.cancelled and summary.converted == 2
+        assert summary.not_processed == 4 and len(_outputs(dest)) == 2
+        assert not any(name.startswith(TEMP_PREFIX) for name in os.listdir(dest))
+
+        # Cancelled while paused: workers wake up and exit without converting anything
+        control = JobControl()
+        control.pause()
+        threading.Timer(0.3, control.cancel, kwargs={"abort_in_flight": True}).start()
+        summary = convert_batch(source, dest, ConversionSettings(output_width=20, output_height=20),
+                                control=control, workers=2)
+        assert summary.cancelled and summary.converted == 0 and summary.not_processed == 6
+        assert not any(name.startswith(TEMP_PREFIX) for name in os.listdir(dest))
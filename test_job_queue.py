@@ -0,0 +1,65 @@
+"""Test job specs round-trip through JSON, that urgent jobs overtake a long batch, and that failures end jobs cleanly."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings
+from job_queue import PRIORITY_HIGH, JobScheduler, JobSpec
+
+def _make_images(folder, count, size):
+    os.makedirs(folder)
+    for i in range(count):
+        Image.new("RGB", size, (i * 10, 0, 0)).save(os.path.join(folder, f"img{i}.png"))
+
+def test_job_spec_round_trip():
+    spec = JobSpec("in", "out", ConversionSettings(output_format="PNG", remove_background=True),
+                   priority=PRIORITY_HIGH, workers=3, label="urgent")
+    assert JobSpec.from_json(spec.to_json()) == spec
+
+def test_high_priority_job_overtakes_running_batch():
+    with tempfile.TemporaryDirectory() as root:
+        _make_images(os.path.join(root, "big"), 20, (600, 400))
+        _make_images(os.path.join(root, "small"), 2, (60, 40))
+        settings = ConversionSettings(output_width=32, output_height=32)
+        scheduler = JobScheduler(workers=1)
+        try:
+            batch = scheduler.submit(JobSpec(os.path.join(root, "big"), os.path.join(root, "out1"), settings))
+            urgent = scheduler.submit(JobSpec(os.path.join(root, "small"), os.path.join(root, "out2"), settings,
+                                              priority=PRIORITY_HIGH))
+            assert scheduler.wait(urgent.id, 30).converted == 2
+            assert batch.is_active
+
+            queued = scheduler.submit(JobSpec(os.path.join(root, "big"), os.path.join(root, "out3"), settings))
+            scheduler.cancel(queued.id)
+            assert scheduler.wait(queued.id, 5).cancelled
+
+            assert scheduler.wait(batch.id, 60).converted == 20
+            assert batch.state == "finished"
+        finally:
+            scheduler.shutdown()
+
+def test_failing_steps_fail_the_job_not_the_scheduler():
+    class Broken(JobScheduler):
+        def _start(self, job):
+            super()._start(job)
+
+            def _raise(*args):
+                raise OSError("disk full")
+            if job.spec.label:  # The label names the step to break
+                setattr(job.run, job.spec.label, _raise)
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_images(os.path.join(root, "src"), 3, (60, 40))
+        settings = ConversionSettings(output_width=32, output_height=32)
+        scheduler = Broken(workers=2)
+        try:
+            for step in ("convert_task", "finish"):
+                job = scheduler.submit(JobSpec(os.path.join(root, "src"), os.path.join(root, step), settings,
+                                               workers=2, label=step))
+                assert job.done.wait(30), step
+                assert job.state == "failed" and job.error == "disk full" and job.in_flight == 0
+            healthy = scheduler.submit(JobSpec(os.path.join(root, "src"), os.path.join(root, "ok"), settings))
+            assert scheduler.wait(healthy.id, 30).converted == 3
+        finally:
+            scheduler.shutdown()
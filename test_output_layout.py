@@ -0,0 +1,33 @@
+"""Test that colliding source names keep separate outputs, and sharded layout with a manifest."""
+import os
+import tempfile
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_batch
+from output_layout import read_manifest
+
+def test_colliding_stems_do_not_overwrite():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        Image.new("RGB", (40, 40), (255, 0, 0)).save(os.path.join(source, "photo.png"))
+        Image.new("RGB", (40, 40), (0, 0, 255)).save(os.path.join(source, "photo.jpg"))
+        summary = convert_batch(source, dest, ConversionSettings(output_width=16, output_height=16), resume=False)
+        assert summary.converted == 2
+        assert sorted(n for n in os.listdir(dest) if n.endswith(".webp")) == ["photo.png.webp", "photo.webp"]
+
+def test_sharded_hash_names_with_manifest():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        for i in range(5):
+            Image.new("RGB", (40, 40), (i * 40, 0, 0)).save(os.path.join(source, f"img{i}.png"))
+        settings = ConversionSettings(output_width=16, output_height=16, output_naming="hash",
+                                      output_shard_depth=2, output_manifest=True)
+        assert convert_batch(source, dest, settings).converted == 5
+        manifest = read_manifest(dest)
+        assert sorted(manifest) == [f"img{i}.png" for i in range(5)]
+        for name, relpath in manifest.items():
+            shard_a, shard_b, output = relpath.split("/")
+            assert len(shard_a) == len(shard_b) == 2
+            assert output.startswith(name[:-4] + "-") and output.endswith(".webp")
+            assert os.path.isfile(os.path.join(dest, relpath))
+        # Resume finds the sharded outputs through the journal
+        assert convert_batch(source, dest, settings).resumed == 5
@@ -0,0 +1,52 @@
+"""Test lossless PNG mode reduction, lossy palettes and opt-in bytes-saved reporting."""
+import os
+import random
+import tempfile
+from dataclasses import replace
+
+from PIL import Image, ImageChops
+
+import conversion_pipeline
+from conversion_pipeline import ConversionSettings, convert_batch
+from png_optimizer import reduce_png
+
+def _noise(mode, size=(64, 64)):
+    rng = random.Random(1)
+    return Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * len(mode))))
+
+def test_reduce_png_picks_exact_smaller_modes():
+    few_colours = Image.new("RGBA", (40, 40), (255, 0, 0, 255))
+    few_colours.paste((0, 0, 255, 0), (0, 0, 20, 40))
+    reduced = reduce_png(few_colours)
+    assert reduced.mode == "P"
+    assert reduced.convert("RGBA").getpixel((30, 5)) == (255, 0, 0, 255)
+    assert reduced.convert("RGBA").getpixel((5, 5))[3] == 0
+
+    grey = _noise("L").convert("RGB")
+    assert reduce_png(grey).mode == "L"
+
+    photo = _noise("RGB")
+    assert reduce_png(photo) is photo  # Nothing exact to gain
+
+    opaque = _noise("RGB").convert("RGBA")
+    assert reduce_png(opaque).mode == "RGB"
+    assert ImageChops.difference(reduce_png(opaque), opaque.convert("RGB")).getbbox() is None
+
+    assert reduce_png(_noise("RGBA"), palette_colors=32).mode == "P"
+
+def test_batch_reports_png_bytes_saved_only_when_asked():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        Image.new("RGB", (80, 80), (10, 200, 30)).save(os.path.join(source, "flat.png"))
+        settings = ConversionSettings(output_width=64, output_height=64, output_format="PNG",
+                                      png_compression="max")
+        baseline_encodes = []
+        original = conversion_pipeline.default_png_size
+        conversion_pipeline.default_png_size = lambda img: baseline_encodes.append(1) or original(img)
+        try:
+            summary = convert_batch(source, dest, settings, resume=False)
+            assert (summary.converted, summary.png_bytes_saved, baseline_encodes) == (1, 0, [])  # One encode per file
+
+            summary = convert_batch(source, dest, replace(settings, png_report_savings=True), resume=False)
+            assert summary.png_bytes_saved > 0 and baseline_encodes == [1]
+        finally:
+            conversion_pipeline.default_png_size = original
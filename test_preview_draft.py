@@ -0,0 +1,26 @@
+"""Test that the instant draft preview has the refined preview's size and layout, so refining only adds detail."""
+import os
+import tempfile
+
+from PIL import Image, ImageChops, ImageStat
+
+from conversion_pipeline import ConversionSettings, render_file, render_preview_draft
+
+def test_draft_matches_refined_layout():
+    with tempfile.TemporaryDirectory() as source:
+        path = os.path.join(source, "wide.png")
+        photo = Image.linear_gradient("L").resize((1600, 600)).convert("RGB")
+        photo.paste((200, 30, 30), (100, 100, 700, 500))
+        photo.save(path)
+        box = (250, 250)
+
+        for output_format in ("WebP", "PNG"):  # Opaque letterbox, then a transparent one
+            settings = ConversionSettings(output_width=400, output_height=400, output_format=output_format)
+            with Image.open(path) as img:
+                img.thumbnail(box, Image.Resampling.BILINEAR)  # What the preview hands to the draft
+                draft = render_preview_draft(img, settings, box)
+            refined = render_file(path, settings)
+            refined.thumbnail(box)
+            assert draft.size == refined.size == (250, 250) and draft.mode == refined.mode
+            diff = ImageStat.Stat(ImageChops.difference(draft, refined)).mean
+            assert max(diff) < 6, diff
@@ -0,0 +1,42 @@
+"""Test that the progress channel delivers worker events in order, drains in capped ticks and feeds the stats."""
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_batch
+from progress_channel import ProgressChannel, ProgressEvent, ProgressStats
+
+def test_events_arrive_in_order_and_drain_in_capped_ticks():
+    channel = ProgressChannel()
+    publishers = [threading.Thread(target=lambda w=w: [channel.publish(ProgressEvent("converted", f"{w}-{i}"))
+                                                       for i in range(500)]) for w in range(4)]
+    for publisher in publishers:
+        publisher.start()
+    for publisher in publishers:
+        publisher.join()
+
+    received = []
+    while batch := channel.drain(max_events=300):
+        assert len(batch) <= 300
+        received += batch
+    assert len(received) == 2000 and channel.drain() == []
+    for w in range(4):  # Each worker's events keep their publish order
+        assert [e.name for e in received if e.name.startswith(f"{w}-")] == [f"{w}-{i}" for i in range(500)]
+
+def test_batch_publishes_start_then_one_event_per_file():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        for i in range(4):
+            Image.new("RGB", (40, 30), (i * 50, 0, 0)).save(os.path.join(source, f"img{i}.png"))
+        channel = ProgressChannel()
+        convert_batch(source, dest, ConversionSettings(output_width=16, output_height=16), channel=channel)
+        events = channel.drain()
+        assert events[0].kind == "started" and events[0].payload == 4
+        assert sorted(e.name for e in events[1:]) == [f"img{i}.png" for i in range(4)]
+
+        stats = ProgressStats()
+        for event in events:
+            stats.add(event)
+        assert (stats.total, stats.done, stats.fraction) == (4, 4, 1.0)
+        assert stats.bytes_in > 0 and "decode" in stats.stage_seconds and stats.eta_seconds == 0.0
@@ -0,0 +1,45 @@
+"""Test that the default resize path stays within a small tolerance of plain LANCZOS, even on fine noise."""
+from PIL import Image, ImageDraw
+
+from resize_backend import (DEFAULT_RESIZE_BACKEND, _benchmark_source, _resize_opencv, _resize_pillow,
+                            choose_backend, compare, opencv_available, resize_image)
+
+def _photo(mode):
+    img = Image.linear_gradient("L").resize((1800, 1200)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 1800, 90):
+        draw.ellipse((i, 200 + i // 4, i + 300, 500 + i // 4), fill=(i % 256, 80, 255 - i % 256))
+    if mode == "RGBA":
+        img.putalpha(Image.radial_gradient("L").resize(img.size))
+    return img.convert(mode)
+
+def test_default_matches_lanczos_on_noisy_source():
+    for mode in ("L", "RGB", "RGBA", "LA"):
+        img = _benchmark_source((1800, 1200), "RGBA" if mode in ("RGBA", "LA") else "RGB").convert(mode)
+        for size in ((150, 100), (700, 466), (1200, 800)):
+            reference = img.resize(size, Image.Resampling.LANCZOS)
+            for out in (_resize_pillow(img, size, Image.Resampling.LANCZOS), resize_image(img, size)):
+                assert out.mode == mode and out.size == size
+                mean, _ = compare(reference, out)
+                assert mean < 1.0, (mode, size, mean)
+
+def test_opencv_close_on_photo_content():
+    if not opencv_available():
+        return
+    for mode in ("L", "RGB", "RGBA"):
+        img = _photo(mode)
+        for size in ((150, 100), (700, 466)):
+            out = _resize_opencv(img, size)
+            assert out.mode == mode and out.size == size
+            mean, _ = compare(img.resize(size, Image.Resampling.LANCZOS), out)
+            assert mean < 1.0, (mode, size, mean)
+
+def test_choose_backend():
+    assert DEFAULT_RESIZE_BACKEND == "pillow"
+    assert choose_backend("RGB", (3000, 2000), (1500, 1000)) == "pillow"  # OpenCV is opt-in only
+    assert choose_backend("RGB", (100, 100), (400, 400), preferred="auto") == "pillow"  # Upscale
+    assert choose_backend("RGB", (6000, 4000), (500, 333), preferred="auto") == "pillow"  # reduce() wins
+    assert choose_backend("RGB", (3000, 2000), (1500, 1000), Image.Resampling.BILINEAR, "auto") == "pillow"
+    assert choose_backend("P", (3000, 2000), (1500, 1000), preferred="auto") == "pillow"
+    assert choose_backend("RGB", (3000, 2000), (1500, 1000), preferred="auto") == (
+        "opencv" if opencv_available() else "pillow")
@@ -0,0 +1,42 @@
+"""Test that identical source images (byte- or, when asked, pixel-identical) are converted once and the rest are filled in."""
+import os
+import shutil
+import tempfile
+from dataclasses import replace
+
+from PIL import Image
+
+from conversion_pipeline import ConversionSettings, convert_batch
+from source_dedup import plan_deduplication
+
+def test_byte_and_pixel_duplicates():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        Image.new("RGB", (30, 20), (10, 20, 30)).save(os.path.join(source, "a.png"))
+        shutil.copyfile(os.path.join(source, "a.png"), os.path.join(source, "b.png"))
+        Image.new("RGB", (30, 20), (10, 20, 30)).save(os.path.join(source, "c.bmp"))  # Same pixels, other format
+        Image.new("RGB", (30, 20), (99, 20, 30)).save(os.path.join(source, "d.png"))
+        names = sorted(os.listdir(source))
+
+        assert plan_deduplication(source, names).duplicates == {"a.png": ["b.png"]}
+        assert plan_deduplication(source, names, pixel_level=True).duplicates == {"a.png": ["b.png", "c.bmp"]}
+
+        settings = ConversionSettings(output_width=16, output_height=16)
+        summary = convert_batch(source, dest, settings, deduplicate=True)
+        assert summary.converted == 3  # Byte-level by default; c.bmp is still converted
+        assert summary.deduplicated == 1
+        assert summary.dedup_bytes_saved == os.path.getsize(os.path.join(source, "b.png"))
+        with open(os.path.join(dest, "a.webp"), "rb") as a, open(os.path.join(dest, "b.webp"), "rb") as b:
+            assert a.read() == b.read()
+
+def test_pixel_level_batch_links_reencoded_copies():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+        original = Image.effect_noise((40, 30), 40).convert("RGB")
+        original.save(os.path.join(source, "a.png"), compress_level=1)
+        original.save(os.path.join(source, "b.png"), compress_level=9)  # Re-encoded: other bytes, same pixels
+        pixel_level = ConversionSettings(output_width=16, output_height=16, dedup_pixel_level=True)
+        assert pixel_level.fingerprint() == replace(pixel_level, dedup_pixel_level=False).fingerprint()
+
+        summary = convert_batch(source, dest, pixel_level, deduplicate=True)
+        assert (summary.converted, summary.deduplicated) == (1, 1)
+        with open(os.path.join(dest, "a.webp"), "rb") as a, open(os.path.join(dest, "b.webp"), "rb") as b:
+            assert a.read() == b.read()
@@ -0,0 +1,37 @@
+"""Test that gallery thumbnails are rendered once, reused from memory and disk, and redone when a source changes."""
+import os
+import tempfile
+
+from PIL import Image
+
+from thumbnail_cache import ThumbnailCache
+
+def test_hits_and_invalidation_on_size_or_mtime_change():
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(source, "a.png")
+        Image.new("RGB", (400, 200), (255, 0, 0)).save(path)
+        renders = []
+
+        def _render(p):
+            renders.append(p)
+            with Image.open(p) as img:
+                return img.convert("RGB")
+
+        cache = ThumbnailCache(cache_dir, size=(64, 64))
+        assert cache.get(path) is None
+        first = cache.get_or_create(path, "after-x", _render)
+        assert first.size == (64, 32) and len(renders) == 1
+        assert cache.get_or_create(path, "after-x", _render) is first  # Memory hit
+        assert ThumbnailCache(cache_dir, size=(64, 64)).get(path, "after-x").size == (64, 32)  # Disk hit
+        assert len(renders) == 1
+
+        Image.new("RGB", (400, 200), (0, 0, 255)).save(path)  # Same size on disk, new mtime
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert cache.get(path, "after-x") is None
+        assert cache.get_or_create(path, "after-x", _render).getpixel((5, 5))[2] > 200 and len(renders) == 2
+
+        Image.new("RGB", (300, 300), (0, 255, 0)).save(path)  # Size change alone also misses
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert cache.get(path, "after-x") is None
+        assert cache.get_or_create(path, "after-x", _render).size == (64, 64) and len(renders) == 3
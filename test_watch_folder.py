@@ -0,0 +1,49 @@
+"""Test watch-folder mode against a temporary folder using the polling fallback."""
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image, ImageChops
+
+from conversion_pipeline import ConversionSettings, render_file
+from watch_folder import FolderWatcher
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_watch_folder_converts_new_files_only():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "src")
+        dest = os.path.join(temp_dir, "dst")
+        os.makedirs(source)
+        Image.new("RGB", (40, 20), (255, 0, 0)).save(os.path.join(source, "existing.png"))
+
+        settings = ConversionSettings(output_width=50, output_height=50, output_format="PNG")
+        watcher = FolderWatcher(source, dest, settings, settle_sec=0.2, poll_interval=0.05, use_native=False)
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            Image.new("RGBA", (100, 40), (0, 0, 255, 128)).save(os.path.join(source, "new.png"))
+            assert _wait_for(lambda: os.path.exists(os.path.join(dest, "new.png")))
+        finally:
+            watcher.stop()
+            thread.join(5)
+
+        assert not os.path.exists(os.path.join(dest, "existing.png"))
+        with Image.open(os.path.join(dest, "new.png")) as out:
+            assert out.size == (50, 50)
+            # Few colours, so the PNG optimizer stores a palette; pixels and alpha must be unchanged
+            expected = render_file(os.path.join(source, "new.png"), settings)
+            black = Image.new("RGBA", expected.size, (0, 0, 0, 255))
+            actual = out.convert("RGBA")
+            assert ImageChops.difference(actual.getchannel("A"), expected.getchannel("A")).getbbox() is None
+            assert ImageChops.difference(Image.alpha_composite(black, actual),
+                                         Image.alpha_composite(black, expected)).getbbox() is None
+        assert watcher.converted_count == 1
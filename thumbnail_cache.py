@@ -0,0 +1,118 @@
+"""
+SHH Image Converter - Thumbnail Cache
+Persistent on-disk thumbnails keyed by path, file size and mtime.
+
+Entries never need invalidating: editing a source changes its size or mtime
+and therefore its key. Old entries are simply never read again.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from PIL import Image
+
+from exif_orientation import apply_orientation, read_orientation
+
+def default_cache_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "SHH_Image_Converter", "thumbnails")
+
+class ThumbnailCache:
+    """Two-level cache: a small in-memory LRU in front of PNG files on disk."""
+
+    def __init__(self, cache_dir: Optional[str] = None, size: tuple[int, int] = (128, 128),
+                 memory_items: int = 512):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.memory_items = memory_items
+        self._memory: OrderedDict[str, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, path: str, variant: str = "before", upright: bool = True) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        orientation = "upright" if upright else "stored"
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.size}|{variant}|{orientation}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _remember(self, key: str, thumb: Image.Image):
+        with self._lock:
+            self._memory[key] = thumb
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, path: str, variant: str = "before", upright: bool = True) -> Optional[Image.Image]:
+        """Return a cached thumbnail without rendering anything."""
+        key = self.key(path, variant, upright)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        disk_path = self._disk_path(key)
+        if not os.path.exists(disk_path):
+            return None
+        try:
+            with Image.open(disk_path) as cached:
+                thumb = cached.copy()
+        except Exception:
+            return None  # Corrupt entry; it will be regenerated
+        self._remember(key, thumb)
+        return thumb
+
+    def _store(self, key: str, thumb: Image.Image):
+        disk_path = self._disk_path(key)
+        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(disk_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                thumb.save(f, "PNG")
+            os.replace(temp_path, disk_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def get_or_create(self, path: str, variant: str = "before",
+                      render: Optional[Callable[[str], Image.Image]] = None, upright: bool = True) -> Image.Image:
+        """Return the cached thumbnail, rendering and storing it on a miss.
+
+        render(path) must return an image of any size; the default decodes the source
+        at reduced size and, if upright, turns it upright from its EXIF orientation
+        (the apply_exif_orientation setting). Disk write failures are ignored (the thumbnail is still returned).
+        """
+        cached = self.get(path, variant, upright)
+        if cached is not None:
+            return cached
+        if render is None:
+            with Image.open(path) as img:
+                orientation = read_orientation(img) if upright else 1
+                img.thumbnail(self.size)  # Uses JPEG draft / reduce, so big sources stay cheap
+                thumb = apply_orientation(img, orientation)
+                thumb = thumb.copy() if thumb is img else thumb
+        else:
+            thumb = render(path)
+            thumb.thumbnail(self.size)
+        if thumb.mode not in ("RGB", "RGBA", "L", "LA"):
+            thumb = thumb.convert("RGBA")
+        key = self.key(path, variant, upright)
+        if key is not None:
+            self._remember(key, thumb)
+            try:
+                self._store(key, thumb)
+            except OSError as e:
+                print(f"Thumbnail cache write failed: {e}")
+        return thumb
@@ -0,0 +1,251 @@
+"""
+SHH Image Converter - Watch Folder Mode
+Long-running daemon that converts new or modified images as they arrive.
+
+Run with:
+    python watch_folder.py SOURCE_DIR DEST_DIR [--config config.json]
+
+Uses native filesystem notifications (inotify / ReadDirectoryChangesW via the
+optional `watchdog` package) when available and falls back to polling.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+from conversion_pipeline import (
+    AIManager,
+    ConversionSettings,
+    convert_file,
+    load_config,
+)
+from format_sniff import is_candidate_name, sniff_file
+from ai_process_pool import ai_backend_from_config
+
+class FolderWatcher:
+    """Converts files in a source folder once they have stopped changing."""
+
+    def __init__(self, source: str, dest: str, settings: ConversionSettings,
+                 ai_manager: Optional[AIManager] = None, settle_sec: float = 2.0,
+                 poll_interval: float = 1.0, use_native: bool = True):
+        self.source = os.path.abspath(source)
+        self.dest = os.path.abspath(dest)
+        self.settings = settings
+        self.ai_manager = ai_manager or AIManager()
+        self.settle_sec = settle_sec
+        self.poll_interval = poll_interval
+        self.use_native = use_native
+
+        # path -> (signature when last seen, monotonic time it was last seen changing)
+        self._pending: dict[str, tuple[Optional[tuple[int, int]], float]] = {}
+        # path -> signature at the time it was converted (or failed)
+        self._handled: dict[str, tuple[int, int]] = {}
+        self._outputs: set[str] = set()
+        self._known: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        self.converted_count = 0
+        self.skipped_count = 0
+
+    def _log(self, msg: str):
+        print(f"[WATCH] {time.strftime('%H:%M:%S')} {msg}")
+
+    @staticmethod
+    def _signature(path: str) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _is_candidate(self, path: str) -> bool:
+        return (os.path.dirname(os.path.abspath(path)) == self.source
+                and is_candidate_name(path)
+                and path not in self._outputs)
+
+    def mark_dirty(self, path: str):
+        """Record that a file was created or modified; it is converted once stable."""
+        path = os.path.abspath(path)
+        if not self._is_candidate(path):
+            return
+        with self._lock:
+            self._pending[path] = (None, time.monotonic())
+        self._wakeup.set()
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        """One scandir pass; stat data comes from the directory listing where the OS provides it."""
+        snapshot = {}
+        try:
+            with os.scandir(self.source) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not is_candidate_name(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            self._log(f"Failed to scan {self.source}: {e}")
+        return snapshot
+
+    def _poll_changes(self):
+        snapshot = self._snapshot()
+        for path, sig in snapshot.items():
+            if self._known.get(path) != sig:
+                self.mark_dirty(path)
+        self._known = snapshot
+
+    def _start_native(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler  # type: ignore
+            from watchdog.observers import Observer  # type: ignore
+        except ImportError:
+            self._log("watchdog not installed; using polling every "
+                      f"{self.poll_interval:.1f}s")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.mark_dirty(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.mark_dirty(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher.mark_dirty(event.dest_path)
+
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(), self.source, recursive=False)
+            observer.start()
+        except Exception as e:
+            self._log(f"Native watcher unavailable ({e}); using polling")
+            return False
+        self._observer = observer
+        self._log(f"Using native filesystem notifications ({type(observer).__name__})")
+        return True
+
+    def _collect_stable(self) -> list[str]:
+        """Return pending files whose size and mtime have not changed for settle_sec."""
+        now = time.monotonic()
+        stable = []
+        with self._lock:
+            for path, (last_sig, since) in list(self._pending.items()):
+                sig = self._signature(path)
+                if sig is None:
+                    del self._pending[path]  # Deleted or replaced by a directory
+                elif sig != last_sig:
+                    self._pending[path] = (sig, now)
+                elif now - since >= self.settle_sec:
+                    del self._pending[path]
+                    if self._handled.get(path) != sig:
+                        stable.append(path)
+        return stable
+
+    def _convert(self, path: str):
+        sig = self._signature(path)
+        name = os.path.basename(path)
+        start = time.time()
+        fmt, reason = sniff_file(path)
+        if fmt is None:
+            self.skipped_count += 1
+            self._log(f"Skipping {name}: {reason}")
+            if sig is not None:
+                self._handled[path] = sig
+            return
+        try:
+            output_path = convert_file(path, self.dest, self.settings, self.ai_manager)
+            self._outputs.add(os.path.abspath(output_path))
+            self.converted_count += 1
+            self._log(f"Converted {name} in {time.time() - start:.2f}s")
+        except Exception as e:
+            # Remember the failing version so it is only retried once the file changes again
+            self.skipped_count += 1
+            self._log(f"Skipping {name}: {e}")
+        if sig is not None:
+            self._handled[path] = sig
+
+    def run(self, convert_existing: bool = False):
+        """Block and convert files as they arrive until stop() is called."""
+        os.makedirs(self.dest, exist_ok=True)
+        if self.settings.remove_background:
+            # Warm the session up front so the first arrival converts within seconds
+            if self.ai_manager.get_session() is None:
+                self._log(f"AI unavailable, continuing without it: {self.ai_manager.last_error}")
+
+        self._known = self._snapshot()
+        if convert_existing:
+            for path in self._known:
+                self.mark_dirty(path)
+
+        native = self.use_native and self._start_native()
+        self._log(f"Watching {self.source} -> {self.dest}")
+        tick = min(self.settle_sec, self.poll_interval) if not native else max(0.1, self.settle_sec / 2)
+        try:
+            while not self._stop.is_set():
+                if not native:
+                    self._poll_changes()
+                for path in self._collect_stable():
+                    if self._stop.is_set():
+                        break
+                    self._convert(path)
+                self._wakeup.wait(tick)
+                self._wakeup.clear()
+        finally:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer.join()
+                self._observer = None
+            self._log(f"Stopped. Converted: {self.converted_count}, Skipped: {self.skipped_count}")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert images continuously as they arrive in a folder.")
+    parser.add_argument("source", help="Folder to watch for new or modified images")
+    parser.add_argument("dest", help="Folder to write converted images to")
+    parser.add_argument("--config", default="config.json", help="Settings file (same keys as the Settings tab)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must stay unchanged before it is converted")
+    parser.add_argument("--poll", type=float, default=1.0, help="Polling interval when native events are unavailable")
+    parser.add_argument("--poll-only", action="store_true", help="Never use native filesystem notifications")
+    parser.add_argument("--existing", action="store_true", help="Also convert images already in the folder at startup")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        print(f"Source folder not found: {args.source}")
+        return 2
+
+    config = load_config(args.config)
+    settings = ConversionSettings.from_config(config)
+    ai_manager = ai_backend_from_config(config)
+    watcher = FolderWatcher(args.source, args.dest, settings, ai_manager=ai_manager,
+                            settle_sec=args.settle,
+                            poll_interval=args.poll, use_native=not args.poll_only)
+    try:
+        watcher.run(convert_existing=args.existing)
+    except KeyboardInterrupt:
+        watcher.stop()
+    finally:
+        ai_manager.release()  # Stops AI worker processes when 'ai_processes' is set
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # AI worker processes in the frozen executable
+    sys.exit(main())